@@ -0,0 +1,157 @@
+import base64
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from config import (
+    ANSWER_CACHE_PATH, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, SEMANTIC_CACHE_THRESHOLD
+)
+from lexical_index import normalize_question
+
+
+def chunks_fingerprint(chunk_ids: Iterable[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(chunk_ids)).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """Двухуровневый кэш ответов LLM.
+
+    Первый уровень — точное совпадение нормализованного вопроса и набора
+    найденных чанков (LRU). Второй — семантический: ответ отдаётся, если
+    эмбеддинг вопроса близок к закэшированному (косинус не ниже порога)
+    и найдены те же чанки.
+    """
+
+    def __init__(self, path: Optional[Path] = ANSWER_CACHE_PATH, max_size: int = ANSWER_CACHE_SIZE,
+                 ttl: float = ANSWER_CACHE_TTL, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.path = Path(path) if path else None
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # ключ -> запись
+        self._matrix = None  # Векторы записей для семантического поиска
+        self._matrix_keys = []
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "puts": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(question: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{normalize_question(question)}\n{fingerprint}".encode("utf-8")).hexdigest()
+
+    def _expired(self, entry: dict) -> bool:
+        return time.time() - entry["created"] > self.ttl
+
+    def _drop(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def _semantic_index(self):
+        """Лениво пересобирает матрицу векторов после изменений"""
+        if self._matrix is None:
+            self._matrix_keys = [key for key, entry in self._entries.items() if entry["vector"] is not None]
+            self._matrix = (np.stack([self._entries[key]["vector"] for key in self._matrix_keys])
+                            if self._matrix_keys else np.empty((0, 0), dtype=np.float32))
+        return self._matrix, self._matrix_keys
+
+    def get(self, question: str, chunk_ids: Iterable[str], vector=None) -> Optional[str]:
+        """Ищет ответ сначала точно, затем по близости эмбеддинга"""
+        fingerprint = chunks_fingerprint(chunk_ids)
+        key = self._key(question, fingerprint)
+
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry):
+            self._drop(key)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats["exact_hits"] += 1
+            return entry["answer"]
+
+        if vector is not None and self._entries:
+            matrix, keys = self._semantic_index()
+            if len(keys):
+                scores = matrix @ np.asarray(vector, dtype=np.float32)
+                for idx in np.argsort(-scores):
+                    if scores[idx] < self.threshold:
+                        break
+                    candidate = self._entries[keys[idx]]
+                    if candidate["fingerprint"] == fingerprint and not self._expired(candidate):
+                        self._entries.move_to_end(keys[idx])
+                        self.stats["semantic_hits"] += 1
+                        return candidate["answer"]
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, question: str, chunk_ids: Iterable[str], answer: str, vector=None) -> None:
+        fingerprint = chunks_fingerprint(chunk_ids)
+        key = self._key(question, fingerprint)
+        self._entries[key] = {
+            "fingerprint": fingerprint,
+            "answer": answer,
+            "vector": np.asarray(vector, dtype=np.float32) if vector is not None else None,
+            "created": time.time(),
+        }
+        self._entries.move_to_end(key)
+        self._matrix = None
+        self.stats["puts"] += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._matrix = None
+
+    def hit_rate(self) -> float:
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def save(self) -> None:
+        """Сохраняет неистёкшие записи на диск (без pickle)"""
+        if self.path is None:
+            return
+        records = []
+        for key, entry in self._entries.items():
+            if self._expired(entry):
+                continue
+            vector = entry["vector"]
+            records.append({
+                "key": key,
+                "fingerprint": entry["fingerprint"],
+                "answer": entry["answer"],
+                "created": entry["created"],
+                "vector": base64.b64encode(vector.tobytes()).decode("ascii") if vector is not None else None,
+            })
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ошибка загрузки кэша ответов: {e}")
+            return
+        for record in records[-self.max_size:]:
+            vector = record.get("vector")
+            entry = {
+                "fingerprint": record["fingerprint"],
+                "answer": record["answer"],
+                "created": record["created"],
+                "vector": np.frombuffer(base64.b64decode(vector), dtype=np.float32) if vector else None,
+            }
+            if not self._expired(entry):
+                self._entries[record["key"]] = entry
+        self._matrix = None
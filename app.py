@@ -1,43 +1,148 @@
-import json
-from telegram import Update, ForceReply
+import asyncio
+from telegram import Update, ForceReply, Message
+from telegram.constants import ChatAction
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-import requests
 import os
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from rag_processor import RAGProcessor
-from config import MAX_CONTEXT_LENGTH, DEEPSEEK_API_URL, DEEPSEEK_MODEL
+from retrieval_service import RetrievalClient
+from llm_client import LLMError
+from llm_router import LLMRouter, create_llm_client
+from telegram_stream import StreamingReply
+from answer_cache import AnswerCache
+from request_log import RequestLogger
+from context_store import create_context_store, estimate_tokens
+from scheduler import RequestScheduler
+from metrics import Metrics
+from profiler import PROFILE_MODES, run_profile
+from config import (
+    STREAM_RESPONSES, ANSWER_CACHE_ENABLED, FAST_START, WARMUP_WAIT,
+    CONTEXT_TOKEN_BUDGET, CONTEXT_SUMMARIZE, RETRIEVAL_SERVICE_URL, BOT_MODE, ALLOWED_UPDATES,
+    UPDATE_CONCURRENCY, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONNECTIONS, METRICS_PORT, METRICS_HOST, ADMIN_IDS, PROFILE_MAX_SECONDS
+)
 load_dotenv()
 
 
 class AIChatBot:
-    def __init__(self):
-        self.rag = RAGProcessor()
-        self.rag.load_and_process_documents()
-        self.user_contexts = {}
-        self.log_file = "logs.txt"  # Перенесено из _init_logging
-        self._init_logging()  # Явный вызов метода инициализации
-
-    def _init_logging(self):
-        """Инициализация системы логирования"""
-        if not os.path.exists(self.log_file):
-            with open(self.log_file, "w", encoding='utf-8') as f:
-                f.write("Timestamp|User ID|Duration|Status|Request|Response\n")
-
-    async def _log_request(self, user_id: int, start_time: float, status: str, request: dict, response: str = ""):
-        """Логирование запроса"""
-        log_entry = (
-            f"{datetime.now().isoformat()}|"
-            f"{user_id}|"
-            f"{time.time() - start_time:.2f}|"
-            f"{status}|"
-            f"{json.dumps(request, ensure_ascii=False)[:500]}|"
-            f"{json.dumps(response, ensure_ascii=False)[:500]}\n"
-        )
-
-        with open(self.log_file, "a", encoding='utf-8') as f:
-            f.write(log_entry)
+    def __init__(self, fast_start: bool = FAST_START):
+        # С RETRIEVAL_SERVICE_URL индекс и модель держит общий для всех процессов
+        # бота retrieval_service.py, иначе поиск идёт в этом процессе
+        self.rag = RetrievalClient(RETRIEVAL_SERVICE_URL) if RETRIEVAL_SERVICE_URL else RAGProcessor()
+        # При быстром старте индекс и модель грузятся в фоне (см. warm_up),
+        # а сообщения ждут готовности поиска не дольше WARMUP_WAIT секунд
+        self.rag_ready = asyncio.Event()
+        if not fast_start and not RETRIEVAL_SERVICE_URL:
+            self.rag.load_and_process_documents()
+            self.rag.load_embeddings()
+            self.rag_ready.set()
+        self.contexts = create_context_store()
+        # Запросы к SQLite и Redis идут по одному в своём потоке: занятая другим процессом
+        # база или медленная сеть не должны останавливать цикл событий
+        self._context_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="contexts")
+        self._background_tasks = set()
+        self.scheduler = RequestScheduler(self._answer)
+        # Один провайдер из LLM_PROVIDERS — сам клиент, несколько — LLMRouter с хеджированием
+        self.llm = create_llm_client()
+        self.answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
+        if self.answer_cache is not None:
+            self.answer_cache.load()
+        self.request_log = RequestLogger()
+        self.metrics = Metrics()
+        self._describe_metrics()
+        self._profiling = False
+
+    def _describe_metrics(self) -> None:
+        """Описания метрик и гейджи, которые читаются из очереди, контекстов и поиска"""
+        self.metrics.describe("yurbot_requests_total", "counter", "Вопросы по итоговому статусу")
+        self.metrics.describe("yurbot_stage_seconds", "histogram", "Длительность этапов обработки вопроса")
+        self.metrics.describe("yurbot_llm_attempts_total", "counter", "Попытки обращения к LLM по статусу")
+        self.metrics.describe("yurbot_llm_retries_total", "counter", "Повторные попытки обращения к LLM")
+        self.metrics.describe("yurbot_tokens_total", "counter", "Токены LLM")
+        self.metrics.register("yurbot_in_flight", "gauge", "Вопросов в обработке",
+                              lambda: self.scheduler.active)
+        self.metrics.register("yurbot_queue_depth", "gauge", "Пользователей в очереди",
+                              lambda: self.scheduler.queue_depth)
+        for event in ("submitted", "coalesced", "cancelled", "rejected"):
+            self.metrics.register(f"yurbot_scheduler_{event}_total", "counter", f"Очередь вопросов: {event}",
+                                  lambda event=event: self.scheduler.stats[event])
+        self.metrics.register("yurbot_dialogs", "gauge", "Диалогов в памяти", lambda: len(self.contexts))
+        self.metrics.register("yurbot_request_log_dropped_total", "counter", "Записей лога, не влезших в очередь",
+                              lambda: self.request_log.dropped)
+        for result, key in (("hits", "embed_hits"), ("misses", "embed_misses")):
+            self.metrics.register(f"yurbot_query_embedding_cache_{result}_total", "counter",
+                                  f"Кэш эмбеддингов вопросов: {result}",
+                                  lambda key=key: getattr(self.rag, "stats", {}).get(key, 0))
+        if isinstance(self.llm, LLMRouter):
+            for event in ("hedged", "hedge_wins", "fallbacks"):
+                self.metrics.register(f"yurbot_llm_{event}_total", "counter", f"Маршрутизация LLM: {event}",
+                                      lambda event=event: self.llm.stats[event])
+            self.metrics.register("yurbot_llm_circuit_open", "gauge", "Провайдеров LLM с разомкнутым предохранителем",
+                                  lambda: sum(p.breaker.state != "closed" for p in self.llm.providers))
+
+    def _log_request(self, user_id: int, trace: dict, total: float) -> None:
+        """Итоговая запись о сообщении: этапы, токены, число попыток"""
+        timings = trace["timings"]
+        timings["total_s"] = total
+        status = trace.get("status", "ERROR")
+        self.metrics.inc("yurbot_requests_total", status=status)
+        for stage, value in timings.items():
+            self.metrics.observe("yurbot_stage_seconds", value, stage=stage.removesuffix("_s"))
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if (trace.get("tokens") or {}).get(kind):
+                self.metrics.inc("yurbot_tokens_total", trace["tokens"][kind], kind=kind.split("_")[0])
+        self.request_log.log({
+            "event": "request",
+            "user_id": user_id,
+            "status": status,
+            "attempts": trace.get("attempts", 0),
+            "stream": STREAM_RESPONSES,
+            "provider": trace.get("provider"),
+            "timings": {stage: round(value, 4) for stage, value in timings.items()},
+            "tokens": trace.get("tokens"),
+            "context_docs": trace.get("context_docs"),
+            "context_tokens": trace.get("context_tokens"),
+            "question": trace.get("question"),
+            "response_chars": trace.get("response_chars", 0),
+            "error": trace.get("error"),
+        })
+
+    async def warm_up(self) -> None:
+        """Фоновая загрузка индекса и модели эмбеддингов"""
+        if isinstance(self.rag, RetrievalClient):
+            while not await self.rag.wait_ready(WARMUP_WAIT):
+                print(f"Сервис поиска {self.rag.url} не отвечает, ждём...")
+            self.rag_ready.set()
+            print(f"Сервис поиска готов: {self.rag.url}")
+            return
+        try:
+            await asyncio.to_thread(self.rag.load_and_process_documents)
+        except Exception as e:
+            print(f"Ошибка загрузки индекса: {e}")
+        finally:
+            # Поиск по BM25 и точным ссылкам доступен сразу после загрузки индекса
+            self.rag_ready.set()
+        try:
+            await asyncio.to_thread(self.rag.load_embeddings)
+        except Exception as e:
+            print(f"Ошибка загрузки модели эмбеддингов: {e}")
+        if self.rag.reranker is not None:
+            await asyncio.to_thread(self.rag.reranker.load)
+        print(f"Поиск готов: {self.rag.startup_report()}")
+
+    async def _wait_until_ready(self, update: Update) -> bool:
+        """Ждёт загрузки индекса; если ждать слишком долго — вежливо откладывает вопрос"""
+        if self.rag_ready.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self.rag_ready.wait(), timeout=WARMUP_WAIT)
+            return True
+        except asyncio.TimeoutError:
+            await update.message.reply_text(
+                "Бот ещё загружает базу законов. Пожалуйста, повторите вопрос через пару минут.")
+            return False
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Отправляет сообщение при получении команды /start"""
@@ -50,33 +155,101 @@ class AIChatBot:
     async def reset_context(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Сбрасывает контекст диалога"""
         user_id = update.message.from_user.id
-        self.user_contexts[user_id] = []
+        await self._context("reset", user_id)
         await update.message.reply_text("Контекст диалога сброшен. Начинаем новый диалог.")
 
-    def _get_user_context(self, user_id: int) -> list:
-        """Возвращает контекст пользователя или создает новый"""
-        if user_id not in self.user_contexts:
-            self.user_contexts[user_id] = []
-        return self.user_contexts[user_id]
-
-    def _update_user_context(self, user_id: int, role: str, message: str) -> None:
-        """Обновляет контекст пользователя"""
-        context = self._get_user_context(user_id)
-        context.append({"role": role, "text": message})
-
-        # Ограничиваем длину контекста
-        if len(context) > MAX_CONTEXT_LENGTH * 2:
-            context = context[-MAX_CONTEXT_LENGTH * 2:]
-            self.user_contexts[user_id] = context
-
-    async def _call_deepseek(self, user_id: int, message: str) -> str:
-        """Вызывает Deepseek API с ретраями и логированием"""
-        relevant_docs = self.rag.search_relevant_documents(message)
-        docs_context = "\n\n".join(relevant_docs)
-
-        context = self._get_user_context(user_id)
-        messages = [{"role": msg["role"], "content": msg["text"]}
-                    for msg in context]
+    async def profile(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Профилирование по команде администратора: /profile [секунды] [sample|cprofile]"""
+        if update.message.from_user.id not in ADMIN_IDS:
+            return
+        args = context.args or []
+        try:
+            seconds = min(float(args[0]), PROFILE_MAX_SECONDS) if args else 30.0
+        except ValueError:
+            seconds = 0
+        mode = args[1] if len(args) > 1 else PROFILE_MODES[0]
+        if seconds <= 0 or mode not in PROFILE_MODES:
+            await update.message.reply_text(f"Формат: /profile [секунды] [{'|'.join(PROFILE_MODES)}]")
+            return
+        if self._profiling:
+            await update.message.reply_text("Профилирование уже идёт.")
+            return
+        self._profiling = True
+        await update.message.reply_text(f"Профилирование {seconds:.0f} с ({mode})...")
+        try:
+            path, summary = await run_profile(seconds, mode)
+        finally:
+            self._profiling = False
+        # Длинная сводка обрезается под лимит сообщения Telegram
+        await update.message.reply_text(f"Дамп: {path}\n\n{summary}"[:4000])
+
+    async def _context(self, method: str, *args):
+        """Вызывает метод хранилища контекстов; блокирующие (SQLite, Redis) — в потоке _context_executor"""
+        call = getattr(self.contexts, method)
+        if self.contexts.blocking:
+            return await asyncio.get_running_loop().run_in_executor(self._context_executor, call, *args)
+        return call(*args)
+
+    async def _update_user_context(self, user_id: int, question: str, answer: str) -> None:
+        """Сохраняет реплики в контекст; при включённой сводке сжимает старые в фоне"""
+        await self._context("append", user_id, "user", question)
+        await self._context("append", user_id, "assistant", answer)
+        if CONTEXT_SUMMARIZE:
+            overflow = await self._context("overflow", user_id, CONTEXT_TOKEN_BUDGET)
+            if overflow:
+                task = asyncio.create_task(self._summarize_context(user_id, overflow))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+
+    async def _summarize_context(self, user_id: int, messages: list) -> None:
+        """Дописывает выпавшие из бюджета реплики в краткую сводку диалога"""
+        summary = await self._context("summary", user_id)
+        dialog = "\n".join(f"{'Пользователь' if role == 'user' else 'Помощник'}: {text}" for role, text in messages)
+        prompt = [
+            {"role": "system", "content": "Кратко (до 5 предложений) перескажите диалог клиента с юридическим "
+                                          "помощником: суть вопросов, важные факты и упомянутые статьи."},
+            {"role": "user", "content": f"Прежняя сводка: {summary or 'нет'}\n\n{dialog}"},
+        ]
+        try:
+            summary = await self.llm.chat(prompt, temperature=0.2, max_tokens=300)
+            await self._context("set_summary", user_id, summary)
+        except LLMError as e:
+            print(f"Не удалось сжать контекст: {e}")
+
+    async def _call_deepseek(self, user_id: int, message: str, on_delta=None, trace: dict = None) -> str:
+        """Вызывает Deepseek API с ретраями и логированием.
+
+        Если передан on_delta, ответ читается потоком и каждый фрагмент
+        передаётся в колбэк по мере получения. В trace собираются данные
+        для лога запроса: длительности этапов, токены, число попыток, статус.
+        """
+        if trace is None:
+            trace = {}
+        timings = trace.setdefault("timings", {})
+        trace["question"] = message
+
+        start = time.perf_counter()
+        relevant_docs, query_vector = await self.rag.aretrieve(message, timings=timings)
+        timings["retrieval_s"] = time.perf_counter() - start
+        chunk_ids = [doc.id for doc in relevant_docs]
+
+        messages = await self._context("history", user_id, CONTEXT_TOKEN_BUDGET)
+        # Ответ зависит от истории диалога: кэш только для вопросов без истории и сводки
+        use_cache = self.answer_cache is not None and not messages
+        if use_cache:
+            cached = self.answer_cache.get(message, chunk_ids, query_vector)
+            if cached is not None:
+                trace["status"] = "CACHE_HIT"
+                trace["response_chars"] = len(cached)
+                if on_delta is not None:
+                    await on_delta(cached)
+                return cached
+
+        start = time.perf_counter()
+        docs_context = "\n\n".join(self.rag.format_snippet(doc) for doc in relevant_docs)
+        trace["context_docs"] = len(relevant_docs)
+        trace["context_tokens"] = estimate_tokens(docs_context) if docs_context else 0
+
         messages.append({"role": "user", "content": message})
 
         system_prompt = """ 
@@ -88,258 +261,185 @@ class AIChatBot:
 
             Контекст: {context}""".format(context=docs_context if docs_context else "нет дополнительного контекста")  # Ваш промпт
         messages.insert(0, {"role": "system", "content": system_prompt})
-
-        headers = {
-            "Authorization": f"Bearer {os.getenv('DEEPSEEK_API_KEY')}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": DEEPSEEK_MODEL,
-            "messages": messages,
-            "temperature": 0.6,
-            "max_tokens": 3000
-        }
-
-        max_retries = 3
-        retry_delay = 5
-        last_error = "Неизвестная ошибка"
-
-        for attempt in range(max_retries):
-            start_time = time.time()
-            try:
-                response = requests.post(
-                    DEEPSEEK_API_URL,
-                    headers=headers,
-                    json=payload,
-                    timeout=30
-                )
-                response_time = time.time() - start_time
-
-                if response.status_code == 200:
-                    result = response.json().get("choices", [{}])[0].get(
-                        "message", {}).get("content", "")
-                    await self._log_request(
-                        user_id,
-                        start_time,
-                        "SUCCESS",
-                        # Логируем только часть данных
-                        {"messages": messages[:3], "model": DEEPSEEK_MODEL},
-                        result  # Логируем только начало ответа
-                    )
-                    return result
-
-                last_error = f"HTTP {response.status_code}"
-                await self._log_request(
-                    user_id,
-                    start_time,
-                    f"ERROR_{response.status_code}",
-                    {"messages": messages[:3], "model": DEEPSEEK_MODEL},
-                    response.text
-                )
-
-            except requests.exceptions.Timeout:
-                last_error = "Timeout"
-                await self._log_request(
-                    user_id,
-                    start_time,
-                    "TIMEOUT",
-                    {"messages": messages[:3], "model": DEEPSEEK_MODEL}
-                )
-            except Exception as e:
-                last_error = str(e)
-                await self._log_request(
-                    user_id,
-                    start_time,
-                    "CONNECTION_ERROR",
-                    {"messages": messages[:3], "model": DEEPSEEK_MODEL},
-                    str(e)
-                )
-
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay * (attempt + 1))
-
-        return f"Ошибка сервиса: {last_error}. Попробуйте позже."
+        timings["prompt_s"] = time.perf_counter() - start
+
+        async def on_attempt(status: str, start_time: float, response: str, attempt: int,
+                             usage: dict = None, provider: str = None) -> None:
+            trace["attempts"] = attempt
+            if status == "SUCCESS":
+                trace["provider"] = provider
+            self.metrics.inc("yurbot_llm_attempts_total", status=status, provider=provider)
+            if attempt > 1:
+                self.metrics.inc("yurbot_llm_retries_total")
+            if usage:
+                trace["tokens"] = {key: usage.get(key) for key in
+                                   ("prompt_tokens", "completion_tokens", "total_tokens")}
+            self.request_log.log({
+                "event": "llm_attempt",
+                "user_id": user_id,
+                "provider": provider,
+                "status": status,
+                "attempt": attempt,
+                "duration_s": round(time.time() - start_time, 4),
+                "tokens": trace.get("tokens") if usage else None,
+                "error": None if status == "SUCCESS" else response[:500],
+            })
+
+        parts = []
+        start = time.perf_counter()
+        try:
+            if on_delta is None:
+                parts.append(await self.llm.chat(messages, on_attempt=on_attempt))
+            else:
+                async for delta in self.llm.stream_chat(messages, on_attempt=on_attempt):
+                    if not parts:
+                        timings["first_token_s"] = time.perf_counter() - start
+                    parts.append(delta)
+                    await on_delta(delta)
+        except LLMError as e:
+            timings["llm_s"] = time.perf_counter() - start
+            trace["status"] = "LLM_ERROR"
+            trace["error"] = str(e)
+            error = f"Ошибка сервиса: {e}. Попробуйте позже."
+            error = f"\n\n{error}" if parts else error
+            parts.append(error)
+            if on_delta is not None:
+                await on_delta(error)
+            return "".join(parts)
+        timings["llm_s"] = time.perf_counter() - start
+
+        result = "".join(parts)
+        trace["status"] = "OK"
+        trace["response_chars"] = len(result)
+        if use_cache and result:
+            self.answer_cache.put(message, chunk_ids, result, query_vector)
+        return result
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Обрабатывает текстовые сообщения"""
         user_id = update.message.from_user.id
         user_message = update.message.text
 
-        self._update_user_context(user_id, "user", user_message)
+        if not await self._wait_until_ready(update):
+            return
 
+        # Очередь склеивает серию сообщений в один вопрос и отменяет устаревшие ответы
+        await self.scheduler.submit(user_id, update.message, user_message)
+
+    async def _answer(self, user_id: int, message: Message, user_message: str) -> None:
+        """Отвечает на вопрос пользователя (вызывается планировщиком)"""
+        start = time.perf_counter()
+        trace = {"timings": {}}
+        reply = None
         try:
-            bot_response = await self._call_deepseek(user_id, user_message)
-            self._update_user_context(user_id, "assistant", bot_response)
-            await update.message.reply_text(bot_response)
+            if STREAM_RESPONSES:
+                reply = StreamingReply(message)
+                await message.chat.send_action(ChatAction.TYPING)
+                bot_response = await self._call_deepseek(user_id, user_message, on_delta=reply.push, trace=trace)
+                await reply.finish()
+                trace["timings"]["telegram_send_s"] = reply.send_time
+            else:
+                bot_response = await self._call_deepseek(user_id, user_message, trace=trace)
+                send_start = time.perf_counter()
+                await message.reply_text(bot_response)
+                trace["timings"]["telegram_send_s"] = time.perf_counter() - send_start
+            if trace.get("status") in ("OK", "CACHE_HIT"):
+                await self._update_user_context(user_id, user_message, bot_response)
+        except asyncio.CancelledError:
+            # Пользователь дописал вопрос — начатый ответ помечаем прерванным
+            trace["status"] = "CANCELLED"
+            if reply is not None and reply.started:
+                await reply.push("\n\n(Ответ прерван: учитываю ваше новое сообщение)")
+                await reply.finish()
+            raise
         except Exception as e:
             print(f"Ошибка: {e}")
-            await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
-
-
-def main() -> None:
-    """Запускает бота"""
-    bot = AIChatBot()
-    application = Application.builder().token(os.getenv('TELEGRAM_TOKEN')).build()
+            trace["status"] = "ERROR"
+            trace["error"] = str(e)
+            await message.reply_text("Произошла ошибка. Попробуйте позже.")
+        finally:
+            self._log_request(user_id, trace, time.perf_counter() - start)
+
+    async def close(self) -> None:
+        """Останавливает очередь и закрывает клиенты и хранилища"""
+        await self.metrics.close()
+        await self.scheduler.close()
+        await self.llm.close()
+        if isinstance(self.rag, RetrievalClient):
+            await self.rag.close()
+        if self.answer_cache is not None:
+            self.answer_cache.save()
+        await asyncio.to_thread(self.request_log.close)
+        self._context_executor.shutdown(wait=True)
+        self.contexts.close()
+
+
+def build_application(bot: AIChatBot, token: str, base_url: str = None) -> Application:
+    """Application с обработчиками бота; base_url заменяет адрес Bot API (нагрузочный тест)"""
+    start_time = time.perf_counter()
+    warm_up_tasks = set()
+
+    async def post_init(_: Application) -> None:
+        if METRICS_PORT:
+            await bot.metrics.serve(METRICS_HOST, METRICS_PORT)
+        if not bot.rag_ready.is_set():
+            task = asyncio.create_task(bot.warm_up())
+            warm_up_tasks.add(task)
+            task.add_done_callback(warm_up_tasks.discard)
+        print(f"Бот принимает сообщения через {time.perf_counter() - start_time:.2f} с после старта")
+
+    async def post_shutdown(_: Application) -> None:
+        await bot.close()
+
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(UPDATE_CONCURRENCY)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
     application.add_handler(CommandHandler("start", bot.start))
     application.add_handler(CommandHandler("reset", bot.reset_context))
+    application.add_handler(CommandHandler("profile", bot.profile))
     application.add_handler(MessageHandler(
         filters.TEXT & ~filters.COMMAND, bot.handle_message))
+    return application
+
+
+def check_webhook_config() -> None:
+    """Webhook только с https и секретом: иначе любой, кто достучится до порта, пришлёт поддельные обновления"""
+    if not WEBHOOK_URL.startswith("https://"):
+        raise SystemExit("BOT_MODE=webhook: задайте WEBHOOK_URL с https://, напр. https://bot.example.com")
+    if not WEBHOOK_SECRET:
+        raise SystemExit("BOT_MODE=webhook: задайте WEBHOOK_SECRET, им Telegram подписывает обновления")
+
+
+def main() -> None:
+    """Запускает бота: long polling или webhook (BOT_MODE)"""
+    if BOT_MODE == "webhook":
+        check_webhook_config()
+    application = build_application(AIChatBot(), os.getenv('TELEGRAM_TOKEN'))
+    if BOT_MODE == "webhook":
+        # Telegram сам доставляет обновления; экземпляров за балансировщиком может быть несколько
+        webhook_url = f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}"
+        print(f"Бот запущен, webhook {webhook_url}...")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=webhook_url,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=ALLOWED_UPDATES,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+        return
 
     print("Бот запущен...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == "__main__":
     main()
-
-
-# from telegram import Update, ForceReply
-# from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-# import requests
-# import json
-# import os
-# from dotenv import load_dotenv
-# from rag_processor import RAGProcessor
-# from config import MAX_CONTEXT_LENGTH, YANDEX_GPT_API_URL, YANDEX_GPT_MODEL
-
-# load_dotenv()
-
-# class AIChatBot:
-#     def __init__(self):
-#         self.rag = RAGProcessor()
-#         self.rag.load_and_process_documents()
-#         self.user_contexts = {}  # Хранит контексты диалогов по user_id
-
-#     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-#         """Отправляет сообщение при получении команды /start"""
-#         user = update.effective_user
-#         await update.message.reply_html(
-#             f"Здравствуйте, {user.mention_html()}! Я ваш юридический помощник. Я могу помочь вам с ответом по следующим законам: Гражданский кодекс, Кодекс РФ об административных нарушениях, Семейный кодекс, Трудовой кодекс, Уголовный кодекс. Чем могу помочь?",
-#             reply_markup=ForceReply(selective=True),
-#         )
-
-#     async def reset_context(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-#         """Сбрасывает контекст диалога"""
-#         user_id = update.message.from_user.id
-#         self.user_contexts[user_id] = []
-#         await update.message.reply_text("Контекст диалога сброшен. Начинаем новый диалог.")
-
-#     def _get_user_context(self, user_id: int) -> list:
-#         """Возвращает контекст пользователя или создает новый"""
-#         if user_id not in self.user_contexts:
-#             self.user_contexts[user_id] = []
-#         return self.user_contexts[user_id]
-
-#     def _update_user_context(self, user_id: int, role: str, message: str) -> None:
-#         """Обновляет контекст пользователя"""
-#         context = self._get_user_context(user_id)
-#         context.append({"role": role, "text": message})
-
-#         # Ограничиваем длину контекста
-#         if len(context) > MAX_CONTEXT_LENGTH * 2:  # Умножаем на 2, так как храним и user и assistant сообщения
-#             context = context[-MAX_CONTEXT_LENGTH * 2:]
-#             self.user_contexts[user_id] = context
-
-#     async def _call_yandex_gpt(self, user_id: int, message: str) -> str:
-#         """Вызывает YandexGPT API с улучшенным промптом для юридических вопросов"""
-#         # Получаем релевантные документы
-#         relevant_docs = self.rag.search_relevant_documents(message)
-#         docs_context = "\n\n".join(relevant_docs)
-
-#         # Формируем контекст диалога
-#         context = self._get_user_context(user_id)
-#         messages = [{"role": msg["role"], "text": msg["text"]} for msg in context]
-#         messages.append({"role": "user", "text": message})
-
-#         # Создаем системный промпт для юридического помощника
-#         system_prompt = """
-#         ###ВАША РОЛЬ###
-#             Вы высококвалифицированный юридический помощник. Вас зовут "Yur-bot”.
-#             Вы разговариваете с людьми 14-70 лет и помогаете им с юридическими вопросами.
-
-#         ###ПРАВИЛА ВЫВОДА###
-#             1. Пишите только на русском языке, пишите формально, как юрист, но помните, что вы -
-#             профессионал, объясняющий пользователю сложную тему простым языком;
-#             2. Ответ должен быть развернутым и давать полную картину пользователю по заданному вопросу.
-#             3. Ответ должен содержать ссылки на конкретные статьи и законы, на основе которых он сформулирован
-#             нормативные акты, на которых основан ответ.
-#             4. Ответ обязательно должен содержать дисклеймер: В конце каждого ответа добавляйте фразу:
-#             "Данные ответы не заменяют необходимость консультироваться с профессиональными юристами"
-
-#             ###ЗАПРЕЩЕНО###
-#             1. Использовать "**" и "##" для форматирования вашего ответа;
-#             2. Ссылаться на любые сайты в интернете;
-
-#             ###КОНТЕКСТ ОТВЕТА###
-#             {context}""".format(context=docs_context if docs_context else "нет дополнительного контекста")
-
-#         messages.insert(0, {"role": "system", "text": system_prompt})
-
-#         payload = {
-#             "modelUri": f"gpt://{os.getenv('YANDEX_FOLDER_ID')}/yandexgpt-lite",
-#             "completionOptions": {
-#                 "stream": False,
-#                 "temperature": 0.6,  # Чуть меньше креативности для юридических ответов
-#                 "maxTokens": 3000
-#             },
-#             "messages": messages
-#         }
-
-#         headers = {
-#             "Authorization": f"Api-Key {os.getenv('YANDEX_API_KEY')}",
-#             "Content-Type": "application/json"
-#         }
-
-#         try:
-#             response = requests.post(
-#                 "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
-#                 headers=headers,
-#                 json=payload
-#             )
-#             response.raise_for_status()
-#             return response.json()["result"]["alternatives"][0]["message"]["text"]
-#         except Exception as e:
-#             print(f"Error calling YandexGPT: {str(e)}")
-#             return "Произошла ошибка при обработке вашего запроса. Пожалуйста, попробуйте позже."
-
-#     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-#         """Обрабатывает текстовые сообщения"""
-#         user_id = update.message.from_user.id
-#         user_message = update.message.text
-
-#         # Обновляем контекст
-#         self._update_user_context(user_id, "user", user_message)
-
-#         try:
-#             # Получаем ответ от YandexGPT
-#             bot_response = await self._call_yandex_gpt(user_id, user_message)
-
-#             # Обновляем контекст ответом
-#             self._update_user_context(user_id, "assistant", bot_response)
-
-#             await update.message.reply_text(bot_response)
-#         except Exception as e:
-#             print(f"Ошибка: {e}")
-#             await update.message.reply_text("Произошла ошибка при обработке запроса. Попробуйте позже.")
-
-# def main() -> None:
-#     """Запускает бота"""
-#     bot = AIChatBot()
-
-#     # Создаем Application и передаем токен бота
-#     application = Application.builder().token(os.getenv('TELEGRAM_TOKEN')).build()
-
-#     # Регистрируем обработчики команд
-#     application.add_handler(CommandHandler("start", bot.start))
-#     application.add_handler(CommandHandler("reset", bot.reset_context))
-
-#     # Регистрируем обработчик текстовых сообщений
-#     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_message))
-
-#     # Запускаем бота
-#     print("Бот запущен...")
-#     application.run_polling(allowed_updates=Update.ALL_TYPES)
-
-# if __name__ == "__main__":
-#     main()
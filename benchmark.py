@@ -0,0 +1,523 @@
+"""Бенчмарк поиска и полного цикла ответа с сравнением с базовой линией.
+
+    python benchmark.py [--queries вопросы.txt|logs/requests.jsonl] [--build] [--users 4]
+                        [--output отчёт.json] [--baseline база.json] [--save-baseline база.json]
+
+Разбор документов (--ingest-workers N): последовательно, в пуле из N процессов
+и, если установлен unstructured, прежним UnstructuredMarkdownLoader.
+Поиск: сборка индекса (--build, во временную папку), загрузка индекса и модели,
+эмбеддинг вопросов, задержки гибридного поиска по этапам, память.
+Полный цикл: AIChatBot отвечает на вопросы через фейковый Telegram, а вместо
+DeepSeek работает локальный HTTP-сервер с настраиваемой задержкой.
+Маршрутизация LLM (--router): время до первого токена с одним провайдером
+и с хеджированием на второй, когда у основного хвост задержек или он лежит.
+С --baseline метрики сравниваются с сохранённым отчётом; при регрессии код выхода 1.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from config import BASE_DIR, DATA_DIR, VECTOR_DB_PATH, RETRIEVAL_MAX_DOCS, RETRIEVAL_TOKEN_BUDGET
+from embedding_pipeline import _peak_rss_mb
+
+SYNTHETIC_QUESTIONS = [
+    "ст. 81 ТК РФ",
+    "Что говорит статья 158 УК РФ?",
+    "Как уволить работника за прогул?",
+    "Какой срок исковой давности по договору займа?",
+    "Можно ли расторгнуть брак без согласия супруга?",
+    "Как рассчитываются алименты на одного ребёнка?",
+    "Какая ответственность за кражу в крупном размере?",
+    "Сколько дней ежегодного оплачиваемого отпуска положено работнику?",
+    "Можно ли вернуть товар надлежащего качества?",
+    "Какой штраф за проезд на красный свет?",
+    "Как оспорить завещание?",
+    "Кто наследует при отсутствии завещания?",
+    "Какие документы нужны для регистрации брака?",
+    "Что такое необходимая оборона?",
+    "Можно ли работодателю не выплачивать премию?",
+    "Какая ответственность за оскорбление в интернете?",
+    "Как подать жалобу на постановление об административном правонарушении?",
+    "Каков порядок раздела совместно нажитого имущества супругов?",
+    "Как оформить договор дарения квартиры?",
+    "Какие права у задержанного в полиции?",
+]
+
+# Метрики, которые должны расти; у остальных *_s, *_ms, *_mb рост — регрессия
+HIGHER_IS_BETTER = ("rps", "recall", "hit_rate")
+# Разница меньше этого не считается регрессией (шум измерений)
+ABSOLUTE_NOISE = {"_s": 0.005, "_ms": 5.0, "_mb": 20.0, "error_rate": 0.01}
+
+
+def load_questions(path: str = None) -> list:
+    """Вопросы из текстового файла, из лога запросов (JSONL) или синтетические"""
+    if not path:
+        return list(SYNTHETIC_QUESTIONS)
+    questions = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                if record.get("event") == "request" and record.get("question"):
+                    questions.append(record["question"])
+            else:
+                questions.append(line)
+    return questions
+
+
+def stats(values: list, unit: float = 1000.0) -> dict:
+    """p50/p95/max в миллисекундах"""
+    if not values:
+        return {}
+    values = np.array(values) * unit
+    return {"p50_ms": round(float(np.percentile(values, 50)), 3),
+            "p95_ms": round(float(np.percentile(values, 95)), 3),
+            "max_ms": round(float(values.max()), 3)}
+
+
+def bench_ingestion(workers: int) -> dict:
+    """Время разбора всех файлов DATA_DIR на чанки"""
+    from document_loaders import split_files
+
+    files = sorted((path.relative_to(DATA_DIR).as_posix(), path) for path in DATA_DIR.rglob("*") if path.is_file())
+    report = {"files": len(files), "mb": round(sum(path.stat().st_size for _, path in files) / 2 ** 20, 2)}
+    for name, count in (("serial", 1), ("pool", workers)):
+        start = time.perf_counter()
+        results = list(split_files(files, count))
+        report[f"{name}_s"] = round(time.perf_counter() - start, 3)
+    report["workers"] = workers
+    report["chunks"] = sum(len(chunks) for _, _, chunks in results if not isinstance(chunks, Exception))
+    report["errors"] = sum(isinstance(chunks, Exception) for _, _, chunks in results)
+    try:
+        from langchain_community.document_loaders import UnstructuredMarkdownLoader
+
+        start = time.perf_counter()
+        for _, path in files:
+            if path.suffix == ".md":
+                UnstructuredMarkdownLoader(str(path)).load()
+        report["unstructured_s"] = round(time.perf_counter() - start, 3)
+    except ImportError:
+        report["unstructured"] = "не установлен"
+    return report
+
+
+@contextmanager
+def index_dir(build: bool):
+    """Папка индекса для замеров: рабочая или временная для --build (удаляется после всех этапов)"""
+    if not build:
+        yield VECTOR_DB_PATH
+        return
+    db_path = Path(tempfile.mkdtemp(prefix="yurbot-bench-"))
+    try:
+        yield db_path
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+
+def bench_retrieval(questions: list, repeat: int, db_path: Path, build: bool) -> tuple:
+    """Замеры RAGProcessor; возвращает (отчёт, загруженный процессор)"""
+    from rag_processor import RAGProcessor
+
+    report = {}
+    if build:
+        rag = RAGProcessor(db_path)
+        start = time.perf_counter()
+        rag.load_and_process_documents()
+        report["build_s"] = round(time.perf_counter() - start, 3)
+        if rag.store:
+            rag.store.close()
+
+    rag = RAGProcessor(db_path)
+    start = time.perf_counter()
+    rag.load_and_process_documents()
+    report["index_load_s"] = round(time.perf_counter() - start, 4)
+    if rag.store is None:
+        raise SystemExit(f"Индекс в {db_path} не найден. Соберите его: python rag_processor.py или --build")
+    report["chunks"] = len(rag.store)
+    report["vectors_mb"] = round(rag.store.vectors.nbytes / 2 ** 20, 2)
+
+    try:
+        rag.load_embeddings()
+        report["model_load_s"] = round(rag.startup_timings["model_load_s"], 3)
+        cold = []
+        for question in questions:
+            start = time.perf_counter()
+            rag.embed_query(question)
+            cold.append(time.perf_counter() - start)
+        report["embed_cold"] = stats(cold)
+    except Exception as e:
+        report["embeddings"] = f"недоступны ({e}); поиск только по BM25"
+
+    totals = []
+    stages = {}
+    for _ in range(repeat):
+        for question in questions:
+            timings = {}
+            start = time.perf_counter()
+            rag.retrieve(question, RETRIEVAL_MAX_DOCS, timings, RETRIEVAL_TOKEN_BUDGET)
+            totals.append(time.perf_counter() - start)
+            for stage, value in timings.items():
+                stages.setdefault(stage, []).append(value)
+    report["retrieve"] = stats(totals)
+    report["stages"] = {stage: stats(values) for stage, values in sorted(stages.items())}
+    report["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    return report, rag
+
+
+class MockDeepSeek:
+    """Локальный HTTP-сервер с API DeepSeek: JSON и SSE-поток с keep-alive.
+
+    slow_fraction запросов получают дополнительную задержку slow_delay
+    (хвост задержек), error_fraction — ответ 503.
+    """
+
+    def __init__(self, first_token_delay: float, tokens: int, token_interval: float,
+                 slow_fraction: float = 0.0, slow_delay: float = 0.0, error_fraction: float = 0.0, seed: int = 0):
+        self.first_token_delay = first_token_delay
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.slow_fraction = slow_fraction
+        self.slow_delay = slow_delay
+        self.error_fraction = error_fraction
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+
+    async def close(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                headers = dict(line.lower().split(": ", 1) for line in head.decode().split("\r\n")[1:] if ": " in line)
+                length = int(headers.get("content-length", 0))
+                payload = json.loads(await reader.readexactly(length)) if length else {}
+                self.requests += 1
+                await self._respond(writer, payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, payload: dict) -> None:
+        words = [f"слово{i} " for i in range(self.tokens)]
+        prompt_tokens = sum(len(message["content"]) for message in payload.get("messages", [])) // 3
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": self.tokens,
+                 "total_tokens": prompt_tokens + self.tokens}
+        if self._random.random() < self.error_fraction:
+            body = b'{"error": {"message": "overloaded"}}'
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+            return
+        slow = self._random.random() < self.slow_fraction
+        await asyncio.sleep(self.first_token_delay + (self.slow_delay if slow else 0.0))
+        if not payload.get("stream"):
+            await asyncio.sleep(self.token_interval * self.tokens)
+            body = json.dumps({"choices": [{"message": {"content": "".join(words)}}], "usage": usage}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+
+        def chunk(data: dict) -> bytes:
+            event = f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+            return b"%x\r\n%s\r\n" % (len(event), event)
+
+        for word in words:
+            writer.write(chunk({"choices": [{"delta": {"content": word}}]}))
+            await writer.drain()
+            await asyncio.sleep(self.token_interval)
+        writer.write(chunk({"choices": [], "usage": usage}))
+        done = b"data: [DONE]\n\n"
+        writer.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(done), done))
+        await writer.drain()
+
+
+class FakeChat:
+    async def send_action(self, action) -> None:
+        pass
+
+
+class FakeMessage:
+    """Минимальная замена telegram.Message: фиксирует время ответов бота"""
+
+    def __init__(self, user_id: int, text: str):
+        self.text = text
+        self.from_user = type("User", (), {"id": user_id})()
+        self.chat = FakeChat()
+        self.created = time.perf_counter()
+        self.first_reply = None
+        self.replies = []
+
+    async def reply_text(self, text: str, **kwargs) -> "FakeMessage":
+        if self.first_reply is None and not text.startswith("Бот сейчас занят"):
+            self.first_reply = time.perf_counter()
+        self.replies.append(text)
+        return self
+
+    async def edit_text(self, text: str, **kwargs) -> "FakeMessage":
+        if self.replies:
+            self.replies[-1] = text
+        return self
+
+
+class FakeUpdate:
+    def __init__(self, user_id: int, text: str):
+        self.message = FakeMessage(user_id, text)
+        self.effective_user = self.message.from_user
+
+
+async def bench_end_to_end(rag, questions: list, users: int, args) -> dict:
+    """Полный цикл AIChatBot: планировщик, поиск, LLM (мок), стриминг в фейковый Telegram"""
+    import app
+    from context_store import MemoryContextStore
+    from llm_client import DeepSeekClient
+    from log_analyzer import analyze, read_records
+    from request_log import RequestLogger
+
+    mock = MockDeepSeek(args.llm_first_token, args.llm_tokens, args.llm_token_interval)
+    await mock.start()
+    log_dir = Path(tempfile.mkdtemp(prefix="yurbot-bench-log-"))
+
+    bot = app.AIChatBot(fast_start=True)
+    bot.rag = rag
+    bot.rag_ready.set()
+    bot.answer_cache = None  # Иначе повторы вопросов измеряют кэш, а не конвейер
+    bot.contexts = MemoryContextStore()  # Не трогаем сохранённые диалоги
+    bot.llm = DeepSeekClient(api_url=mock.url)
+    bot.request_log.close()
+    bot.request_log = RequestLogger(log_dir / "requests.jsonl")
+    if args.debounce is not None:
+        bot.scheduler.debounce = args.debounce
+
+    done = {}
+    answer = bot.scheduler.handler
+
+    async def timed_answer(user_id, message, text):
+        try:
+            await answer(user_id, message, text)
+        finally:
+            done[id(message)].set()
+
+    bot.scheduler.handler = timed_answer
+    first_reply = []
+    completed = []
+
+    async def user_session(user_id: int, own_questions: list) -> None:
+        for question in own_questions:
+            update = FakeUpdate(user_id, question)
+            done[id(update.message)] = asyncio.Event()
+            await bot.handle_message(update, None)
+            await done[id(update.message)].wait()
+            if update.message.first_reply is not None:
+                first_reply.append(update.message.first_reply - update.message.created)
+            completed.append(time.perf_counter() - update.message.created)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user_session(1000 + n, questions[n::users]) for n in range(users)))
+    wall = time.perf_counter() - start
+
+    await bot.scheduler.close()
+    await bot.llm.close()
+    await mock.close()
+    bot.request_log.close()
+    bot.contexts.close()
+    logged = analyze(read_records([log_dir / "requests.jsonl"])).get("requests", {})
+    shutil.rmtree(log_dir, ignore_errors=True)
+    return {
+        "questions": len(completed),
+        "users": users,
+        "wall_s": round(wall, 3),
+        "rps": round(len(completed) / wall, 3) if wall else 0.0,
+        "first_reply": stats(first_reply),
+        "completed": stats(completed),
+        "llm_requests": mock.requests,
+        "error_rate": logged.get("error_rate"),
+        "stages": {stage: {"p50_ms": round(value["p50"] * 1000, 3), "p95_ms": round(value["p95"] * 1000, 3)}
+                   for stage, value in logged.get("timings", {}).items() if value.get("count")},
+        "context_tokens_p50": logged.get("context_tokens", {}).get("p50"),
+    }
+
+
+async def bench_router(questions: list, args) -> dict:
+    """Хеджирование между двумя провайдерами-моками против одного основного.
+
+    У основного мока хвост задержек (--llm-slow-fraction, --llm-slow-delay),
+    запасной отвечает ровно. Замеряется время до первого токена; в сценарии
+    primary_down основной отвечает только ошибками и должен отключиться предохранителем.
+    """
+    from config import LLM_LATENCY_MIN_SAMPLES
+    from llm_client import DeepSeekClient, LLMError
+    from llm_router import LLMRouter
+
+    async def run(llm, count: int) -> dict:
+        first_token, errors = [], 0
+        semaphore = asyncio.Semaphore(args.users)
+
+        async def one(question: str) -> None:
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    async for _ in llm.stream_chat([{"role": "user", "content": question}]):
+                        first_token.append(time.perf_counter() - start)
+                        break
+                except LLMError:
+                    errors += 1
+
+        await asyncio.gather(*(one(questions[i % len(questions)]) for i in range(count)))
+        return {"first_token": stats(first_token), "errors": errors}
+
+    async def scenario(name: str, hedge: bool, primary_errors: float = 0.0) -> dict:
+        primary = MockDeepSeek(args.llm_first_token, args.llm_tokens, args.llm_token_interval,
+                               args.llm_slow_fraction, args.llm_slow_delay, primary_errors, seed=1)
+        secondary = MockDeepSeek(args.llm_first_token, args.llm_tokens, args.llm_token_interval, seed=2)
+        await primary.start()
+        await secondary.start()
+        clients = [DeepSeekClient(api_url=primary.url, name="primary"),
+                   DeepSeekClient(api_url=secondary.url, name="secondary")]
+        for client in clients:
+            client.retry_delay = 0.05  # Ретраи не должны заслонять переключение провайдеров
+        llm = LLMRouter(clients if name != "primary_only" else clients[:1], hedge=hedge)
+        await run(llm, LLM_LATENCY_MIN_SAMPLES)  # Прогрев окна задержек, в отчёт не идёт
+        llm.stats = dict.fromkeys(llm.stats, 0)
+        primary.requests = secondary.requests = 0
+        result = await run(llm, args.router_requests)
+        await llm.close()
+        await primary.close()
+        await secondary.close()
+        result.update(llm.stats)
+        result["primary_requests"] = primary.requests
+        result["secondary_requests"] = secondary.requests
+        result["circuit_trips"] = llm.providers[0].breaker.trips
+        return result
+
+    return {
+        "primary_only": await scenario("primary_only", hedge=False),
+        "hedged": await scenario("hedged", hedge=True),
+        "primary_down": await scenario("primary_down", hedge=True, primary_errors=1.0),
+    }
+
+
+def flatten(report: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Список регрессий относительно базовой линии"""
+    regressions = []
+    current, base = flatten(report), flatten(baseline)
+    for name, value in current.items():
+        old = base.get(name)
+        if old is None or name.startswith("meta."):
+            continue
+        if any(marker in name for marker in HIGHER_IS_BETTER):
+            if value < old * (1 - tolerance):
+                regressions.append({"metric": name, "baseline": old, "current": value})
+            continue
+        suffix = next((suffix for suffix in ABSOLUTE_NOISE if name.endswith(suffix)), None)
+        if suffix and value > old * (1 + tolerance) and value - old > ABSOLUTE_NOISE[suffix]:
+            regressions.append({"metric": name, "baseline": old, "current": value})
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", help="Вопросы: текстовый файл или лог запросов JSONL")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов поиска по каждому вопросу")
+    parser.add_argument("--build", action="store_true", help="Замерить полную сборку индекса")
+    parser.add_argument("--ingest-workers", type=int, help="Замерить разбор документов в пуле из N процессов")
+    parser.add_argument("--skip-e2e", action="store_true", help="Только поиск, без полного цикла")
+    parser.add_argument("--users", type=int, default=4, help="Одновременных пользователей в полном цикле")
+    parser.add_argument("--debounce", type=float, help="Переопределить SCHEDULER_DEBOUNCE")
+    parser.add_argument("--llm-first-token", type=float, default=0.5, help="Задержка мока до первого токена, с")
+    parser.add_argument("--llm-tokens", type=int, default=100, help="Токенов в ответе мока")
+    parser.add_argument("--llm-token-interval", type=float, default=0.01, help="Интервал между токенами, с")
+    parser.add_argument("--router", action="store_true", help="Замерить хеджирование между двумя провайдерами-моками")
+    parser.add_argument("--router-requests", type=int, default=200, help="Запросов в каждом сценарии --router")
+    parser.add_argument("--llm-slow-fraction", type=float, default=0.03, help="Доля медленных ответов основного мока")
+    parser.add_argument("--llm-slow-delay", type=float, default=2.0, help="Добавка к задержке медленного ответа, с")
+    parser.add_argument("--output", type=Path, help="Сохранить отчёт в файл")
+    parser.add_argument("--baseline", type=Path, help="Сравнить с сохранённым отчётом")
+    parser.add_argument("--save-baseline", type=Path, help="Сохранить отчёт как базовую линию")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение, доля")
+    args = parser.parse_args()
+
+    questions = load_questions(args.queries)
+    report = {"meta": {"revision": git_revision(), "python": platform.python_version(),
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "questions": len(questions)}}
+    if args.ingest_workers:
+        report["ingestion"] = bench_ingestion(args.ingest_workers)
+    with index_dir(args.build) as db_path:
+        report["retrieval"], rag = bench_retrieval(questions, args.repeat, db_path, args.build)
+        try:
+            if not args.skip_e2e:
+                report["end_to_end"] = asyncio.run(bench_end_to_end(rag, questions, args.users, args))
+        finally:
+            if rag.store:
+                rag.store.close()
+            rag.lexical_index.close()
+    if args.router:
+        report["llm_router"] = asyncio.run(bench_router(questions, args))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    for path in (args.output, args.save_baseline):
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding='utf-8')
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        regressions = compare(report, baseline, args.tolerance)
+        for item in regressions:
+            print(f"РЕГРЕССИЯ {item['metric']}: {item['baseline']} -> {item['current']}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"Регрессий относительно {args.baseline} нет", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
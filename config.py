@@ -6,17 +6,131 @@ BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
 
 # Настройки YandexGPT
-# YANDEX_GPT_API_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
-# YANDEX_GPT_MODEL = "yandexgpt-lite"  # Или "yandexgpt-pro" для Pro версии
+YANDEX_GPT_API_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+YANDEX_GPT_MODEL = "yandexgpt-lite"  # Или "yandexgpt-pro" для Pro версии
 
 # Настройки Deepseek
 DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
 DEEPSEEK_MODEL = "deepseek-chat"  # Или "deepseek-coder"
+
+# Настройки HTTP-клиента LLM
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))  # Одновременных запросов к API
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 16))  # Keep-alive соединений в пуле
+LLM_REQUEST_TIMEOUT = 30  # Таймаут одной попытки, сек
+LLM_DEADLINE = 75  # Общий дедлайн запроса со всеми ретраями, сек
+LLM_MAX_RETRIES = 3  # Количество попыток
+LLM_RETRY_DELAY = 2  # Базовая задержка между попытками, сек
+
+# Настройки маршрутизации между провайдерами LLM (llm_router.py)
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "deepseek").split(",") if name.strip()]  # deepseek, yandex; первый — основной
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"  # Дублировать запрос запасному провайдеру, если основной отвечает дольше обычного
+LLM_HEDGE_QUANTILE = 95  # Перцентиль задержки основного провайдера, после которого уходит дубль
+LLM_HEDGE_DEFAULT_DELAY = 8.0  # Задержка дубля, пока замеров мало, сек
+LLM_HEDGE_MIN_DELAY = 0.5  # Дубль не раньше, чем через столько секунд
+LLM_LATENCY_WINDOW = 200  # Последних замеров задержки на провайдера
+LLM_LATENCY_MIN_SAMPLES = 20  # Замеров до перехода с LLM_HEDGE_DEFAULT_DELAY на перцентиль
+CIRCUIT_FAILURE_THRESHOLD = 5  # Сбоев подряд (таймауты, ошибки соединения, 429, 5xx), после которых провайдер отключается
+CIRCUIT_RESET_TIMEOUT = 30  # Через сколько секунд отключённому провайдеру даётся пробный запрос
+
+# Настройки потоковой выдачи ответа в Telegram
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "1") == "1"  # Показывать ответ по мере генерации
+STREAM_EDIT_INTERVAL = 1.5  # Минимальный интервал между правками сообщения, сек
+STREAM_EMPTY_ANSWER = "Не удалось получить ответ. Попробуйте переформулировать вопрос."  # Если модель ничего не вернула
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096  # Лимит длины сообщения Telegram
 # Настройки RAG
-CHUNK_SIZE = 1000  # Размер чанков для разделения документов
+ARTICLE_MAX_CHARS = 1500  # Макс. размер чанка статьи; длинные статьи делятся по пунктам
+CHUNK_SIZE = 1000  # Размер чанков для документов без статей
 CHUNK_OVERLAP = 200  # Перекрытие между чанками
 EMBEDDINGS_MODEL = "all-MiniLM-L12-v2"  # Модель для эмбеддингов
 VECTOR_DB_PATH = BASE_DIR / "vector_db"  # Путь к векторной БД
+# Векторный индекс: "Flat" — точный перебор; иначе строка фабрики FAISS, например
+# "HNSW32", "IVF{nlist},Flat", "IVF{nlist},SQ8", "IVF{nlist},PQ48" ({nlist} подбирается по корпусу).
+# Сравнить варианты по полноте, скорости и размеру: python index_eval.py
+VECTOR_INDEX_FACTORY = os.getenv("VECTOR_INDEX_FACTORY", "Flat")
+VECTOR_INDEX_NPROBE = 16  # Сколько кластеров IVF просматривать при поиске
+VECTOR_INDEX_EF_SEARCH = 64  # Ширина поиска HNSW
+
+# Настройки гибридного поиска
+HYBRID_FETCH_K = 20  # Кандидатов из каждого движка (FAISS и BM25) перед слиянием
+RRF_K = 60  # Константа reciprocal rank fusion
+BM25_K1 = 1.5
+BM25_B = 0.75
+QUERY_EMBEDDING_CACHE_SIZE = 2048  # Размер LRU-кэша эмбеддингов запросов
+
+# Настройки отбора фрагментов в промпт
+RETRIEVAL_FETCH_K = 12  # Кандидатов после слияния — до дедупликации и переранжирования
+RETRIEVAL_MAX_DOCS = 4  # Максимум фрагментов в промпте
+RETRIEVAL_TOKEN_BUDGET = 1000  # Бюджет токенов на фрагменты законов в промпте
+DEDUP_OVERLAP = 0.6  # Доля общих шинглов, при которой чанк считается дублем
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")  # Cross-encoder, напр. cross-encoder/mmarco-mMiniLMv2-L12-H384-v1; пусто — выкл.
+RERANK_BATCH_SIZE = 16  # Пар (вопрос, фрагмент) в батче cross-encoder
+
+# Настройки сервиса поиска (retrieval_service.py)
+RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL", "")  # http://127.0.0.1:8765 или unix:///путь/к/сокету; пусто — поиск в процессе бота
+RETRIEVAL_SERVICE_TIMEOUT = 10  # Таймаут запроса к сервису, сек
+RETRIEVAL_BATCH_SIZE = 32  # Максимум вопросов в одном проходе модели эмбеддингов
+RETRIEVAL_BATCH_WINDOW = 0.005  # Сколько ждать соседних вопросов для батча, сек
+
+# Настройки сборки индекса
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 256))  # Чанков в одном батче (и в одном чекпоинте)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 1))  # >1 — пул процессов, каждый со своей моделью
+EMBED_TORCH_THREADS = int(os.getenv("EMBED_TORCH_THREADS", os.cpu_count() or 1))  # Потоков torch на сборку
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 1))  # >1 — разбор файлов на чанки в пуле процессов
+
+# Настройки очереди вопросов
+SCHEDULER_DEBOUNCE = float(os.getenv("SCHEDULER_DEBOUNCE", 1.0))  # Пауза для склейки серии сообщений, сек
+SCHEDULER_MAX_ACTIVE = LLM_MAX_CONCURRENCY  # Вопросов в обработке одновременно
+SCHEDULER_MAX_QUEUE = 100  # Пользователей в очереди; сверх этого вопрос отклоняется
+
+# Настройки метрик и профилирования
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # Порт /metrics в формате Prometheus; 0 — выкл.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # Границы гистограмм, сек
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}  # Кому доступна /profile
+PROFILE_DIR = BASE_DIR / "logs" / "profiles"
+PROFILE_MAX_SECONDS = 300  # Самое долгое профилирование по команде, сек
+PROFILE_INTERVAL = 0.01  # Период сэмплирования стеков, сек
+
+# Настройки приёма обновлений Telegram
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # polling или webhook
+ALLOWED_UPDATES = ["message"]  # Бот отвечает только на сообщения и команды, остальные обновления не запрашиваем
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 256))  # Обновлений в обработке одновременно
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Публичный адрес балансировщика, напр. https://bot.example.com
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # Telegram присылает его в X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_MAX_CONNECTIONS = 100  # Одновременных соединений Telegram к webhook (до 100)
+
+# Настройки запуска
+FAST_START = os.getenv("FAST_START", "1") == "1"  # Начинать опрос сразу, индекс и модель грузить в фоне
+WARMUP_WAIT = 30  # Сколько сообщение может ждать загрузки индекса, сек
+
+# Настройки кэша ответов
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_PATH = BASE_DIR / "cache" / "answers.json"  # Сохраняется при остановке бота
+ANSWER_CACHE_SIZE = 1000  # Максимум записей (LRU)
+ANSWER_CACHE_TTL = 24 * 3600  # Время жизни ответа, сек
+SEMANTIC_CACHE_THRESHOLD = 0.95  # Минимальный косинус для семантического совпадения
+
+# Настройки лога запросов
+REQUEST_LOG_PATH = BASE_DIR / "logs" / "requests.jsonl"  # Структурированный лог (JSONL), разбор: log_analyzer.py
+LOG_BATCH_SIZE = 50  # Записей в одной пачке
+LOG_FLUSH_INTERVAL = 2.0  # Максимальная задержка записи пачки, сек
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Размер файла, после которого он ротируется
+LOG_BACKUP_COUNT = 5  # Сколько старых файлов хранить (requests.jsonl.1 ... .5)
+LOG_QUEUE_SIZE = 10000  # Лимит очереди; сверх него записи отбрасываются, а не тормозят бота
 
 # Настройки контекста
 MAX_CONTEXT_LENGTH = 10  # Максимальное количество сообщений в контексте
+CONTEXT_STORE = os.getenv("CONTEXT_STORE", "memory")  # memory, sqlite (переживает перезапуск), shared (SQLite для процессов одного хоста) или redis (для нескольких машин)
+CONTEXT_DB_PATH = Path(os.getenv("CONTEXT_DB_PATH", BASE_DIR / "cache" / "contexts.sqlite"))
+CONTEXT_DB_TIMEOUT = 5  # Сколько ждать блокировку базы, занятой другим процессом (или ответа Redis), сек
+CONTEXT_REDIS_URL = os.getenv("CONTEXT_REDIS_URL", "redis://localhost:6379/0")  # Для CONTEXT_STORE=redis
+CONTEXT_REDIS_PREFIX = "yurbot:"  # Префикс ключей в Redis
+CONTEXT_MAX_USERS = 10000  # Диалогов в памяти (LRU)
+CONTEXT_IDLE_TTL = 7 * 24 * 3600  # Контекст неактивного пользователя забывается, сек
+CONTEXT_TOKEN_BUDGET = 2000  # Токенов истории в промпте
+CONTEXT_MESSAGE_MAX_TOKENS = 700  # Длинные реплики (ответы) хранятся обрезанными
+CONTEXT_SUMMARIZE = os.getenv("CONTEXT_SUMMARIZE", "0") == "1"  # Сжимать не влезающие в бюджет реплики в сводку
+CHARS_PER_TOKEN = 3  # Оценка длины токена для русского текста
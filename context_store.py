@@ -0,0 +1,350 @@
+import json
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from config import (
+    MAX_CONTEXT_LENGTH, CONTEXT_STORE, CONTEXT_DB_PATH, CONTEXT_DB_TIMEOUT, CONTEXT_MAX_USERS, CONTEXT_IDLE_TTL,
+    CONTEXT_MESSAGE_MAX_TOKENS, CONTEXT_REDIS_URL, CONTEXT_REDIS_PREFIX, CHARS_PER_TOKEN
+)
+
+SWEEP_INTERVAL = 3600  # Как часто чистить базу от неактивных пользователей, сек
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов без токенизатора модели"""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class Dialog:
+    """Контекст одного пользователя: кольцевой буфер (роль, текст, токены) и сводка старых реплик"""
+
+    __slots__ = ("messages", "summary", "last_seen")
+
+    def __init__(self, max_messages: int):
+        self.messages = deque(maxlen=max_messages)
+        self.summary = ""
+        self.last_seen = time.time()
+
+
+class MemoryContextStore:
+    """Контексты диалогов в памяти процесса.
+
+    На пользователя хранится не больше max_messages последних реплик,
+    длинные реплики обрезаются до CONTEXT_MESSAGE_MAX_TOKENS. Пользователи
+    вытесняются по LRU сверх max_users и по простою дольше idle_ttl.
+    В промпт попадают только последние реплики, укладывающиеся в бюджет токенов.
+    """
+
+    blocking = False  # True — методы ходят в базу, и AIChatBot вызывает их в отдельном потоке
+
+    def __init__(self, max_messages: int = MAX_CONTEXT_LENGTH * 2, max_users: int = CONTEXT_MAX_USERS,
+                 idle_ttl: float = CONTEXT_IDLE_TTL, message_max_tokens: int = CONTEXT_MESSAGE_MAX_TOKENS):
+        self.max_messages = max_messages
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self.message_max_tokens = message_max_tokens
+        self._dialogs = OrderedDict()  # user_id -> Dialog, от давно активных к недавним
+
+    def __len__(self) -> int:
+        return len(self._dialogs)
+
+    def _load(self, user_id: int) -> Optional[Dialog]:
+        """Диалог, которого нет в памяти (переопределяется постоянным хранилищем)"""
+        return None
+
+    def _dialog(self, user_id: int, create: bool = False) -> Optional[Dialog]:
+        dialog = self._dialogs.get(user_id)
+        if dialog is not None and time.time() - dialog.last_seen > self.idle_ttl:
+            self._forget(user_id)
+            dialog = None
+        if dialog is None:
+            dialog = self._load(user_id)
+            if dialog is None and not create:
+                return None
+            if dialog is None:
+                dialog = Dialog(self.max_messages)
+            self._dialogs[user_id] = dialog
+            self._evict()
+        self._dialogs.move_to_end(user_id)
+        return dialog
+
+    def _forget(self, user_id: int) -> None:
+        self._dialogs.pop(user_id, None)
+
+    def _evict(self) -> None:
+        """Вытесняет самых давно активных: сверх лимита и простаивающих дольше TTL"""
+        cutoff = time.time() - self.idle_ttl
+        while self._dialogs:
+            user_id, dialog = next(iter(self._dialogs.items()))
+            if len(self._dialogs) <= self.max_users and dialog.last_seen >= cutoff:
+                break
+            self._dialogs.pop(user_id)
+
+    def _clip(self, text: str) -> Tuple[str, int]:
+        tokens = estimate_tokens(text)
+        if tokens > self.message_max_tokens:
+            text = text[:self.message_max_tokens * CHARS_PER_TOKEN].rstrip() + "…"
+            tokens = self.message_max_tokens
+        return text, tokens
+
+    def append(self, user_id: int, role: str, text: str) -> None:
+        dialog = self._dialog(user_id, create=True)
+        dialog.messages.append((role, *self._clip(text)))
+        dialog.last_seen = time.time()
+
+    def history(self, user_id: int, budget: int) -> List[dict]:
+        """Сводка и последние реплики, укладывающиеся в бюджет токенов, в формате API"""
+        dialog = self._dialog(user_id)
+        if dialog is None:
+            return []
+        result = []
+        if dialog.summary:
+            budget -= estimate_tokens(dialog.summary)
+        for role, text, tokens in reversed(dialog.messages):
+            budget -= tokens
+            if budget < 0:
+                break
+            result.append({"role": role, "content": text})
+        result.reverse()
+        if dialog.summary:
+            result.insert(0, {"role": "system", "content": f"Краткое содержание предыдущего диалога: {dialog.summary}"})
+        return result
+
+    def overflow(self, user_id: int, budget: int) -> List[Tuple[str, str]]:
+        """Убирает из буфера старые реплики, не влезающие в бюджет, и возвращает их для сводки"""
+        dialog = self._dialog(user_id)
+        if dialog is None:
+            return []
+        budget -= estimate_tokens(dialog.summary) if dialog.summary else 0
+        kept = 0
+        for _, _, tokens in reversed(dialog.messages):
+            if budget - tokens < 0:
+                break
+            budget -= tokens
+            kept += 1
+        removed = [dialog.messages.popleft()[:2] for _ in range(len(dialog.messages) - kept)]
+        return removed
+
+    def summary(self, user_id: int) -> str:
+        dialog = self._dialog(user_id)
+        return dialog.summary if dialog is not None else ""
+
+    def set_summary(self, user_id: int, summary: str) -> None:
+        self._dialog(user_id, create=True).summary = summary
+
+    def reset(self, user_id: int) -> None:
+        self._forget(user_id)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteContextStore(MemoryContextStore):
+    """Контексты в SQLite: переживают перезапуск, в памяти — LRU-кэш активных диалогов.
+
+    Запись сквозная: каждая реплика сразу попадает в базу (локальный WAL,
+    доли миллисекунды), диалоги неактивных пользователей удаляются по TTL.
+    С shared=True база общая для нескольких процессов бота на одном хосте (webhook
+    за балансировщиком на той же машине): диалог каждый раз читается из базы, а не из кэша.
+    Вызовы блокирующие: AIChatBot выполняет их в отдельном потоке.
+    Экземплярам бота на разных машинах нужен RedisContextStore.
+    """
+
+    blocking = True
+
+    def __init__(self, path: Path = CONTEXT_DB_PATH, shared: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.shared = shared
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=CONTEXT_DB_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS dialogs (user_id INTEGER PRIMARY KEY, summary TEXT NOT NULL, "
+            "last_seen REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS messages (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id INTEGER NOT NULL, role TEXT NOT NULL, text TEXT NOT NULL, tokens INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS messages_user ON messages (user_id, seq);"
+        )
+        self._next_sweep = 0.0
+        self._sweep()
+
+    def _sweep(self) -> None:
+        """Удаляет из базы диалоги, простаивающие дольше TTL"""
+        now = time.time()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + SWEEP_INTERVAL
+        with self._conn:
+            stale = "SELECT user_id FROM dialogs WHERE last_seen < ?"
+            self._conn.execute(f"DELETE FROM messages WHERE user_id IN ({stale})", (now - self.idle_ttl,))
+            self._conn.execute("DELETE FROM dialogs WHERE last_seen < ?", (now - self.idle_ttl,))
+
+    def _dialog(self, user_id: int, create: bool = False) -> Optional[Dialog]:
+        if self.shared:
+            # Реплики могли добавить другие процессы — кэш в памяти не используем
+            self._dialogs.pop(user_id, None)
+        return super()._dialog(user_id, create)
+
+    def _load(self, user_id: int) -> Optional[Dialog]:
+        row = self._conn.execute(
+            "SELECT summary, last_seen FROM dialogs WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None or time.time() - row[1] > self.idle_ttl:
+            return None
+        dialog = Dialog(self.max_messages)
+        dialog.summary, dialog.last_seen = row
+        dialog.messages.extend(self._conn.execute(
+            "SELECT role, text, tokens FROM (SELECT seq, role, text, tokens FROM messages WHERE user_id = ? "
+            "ORDER BY seq DESC LIMIT ?) ORDER BY seq", (user_id, self.max_messages)))
+        return dialog
+
+    def _forget(self, user_id: int) -> None:
+        super()._forget(user_id)
+        with self._conn:
+            self._conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM dialogs WHERE user_id = ?", (user_id,))
+
+    def _evict(self) -> None:
+        # Из памяти вытесняются только по LRU: в базе диалог остаётся до истечения TTL
+        while len(self._dialogs) > self.max_users:
+            self._dialogs.popitem(last=False)
+
+    def _save_dialog(self, user_id: int, dialog: Dialog) -> None:
+        self._conn.execute(
+            "INSERT INTO dialogs VALUES (?, ?, ?) ON CONFLICT(user_id) DO UPDATE "
+            "SET summary = excluded.summary, last_seen = excluded.last_seen",
+            (user_id, dialog.summary, dialog.last_seen))
+
+    def append(self, user_id: int, role: str, text: str) -> None:
+        super().append(user_id, role, text)
+        dialog = self._dialogs[user_id]
+        with self._conn:
+            self._save_dialog(user_id, dialog)
+            self._conn.execute("INSERT INTO messages (user_id, role, text, tokens) VALUES (?, ?, ?, ?)",
+                               (user_id, *dialog.messages[-1]))
+            # Кольцевой буфер: в базе храним столько же реплик, сколько в памяти
+            self._conn.execute(
+                "DELETE FROM messages WHERE user_id = ? AND seq <= (SELECT seq FROM messages "
+                "WHERE user_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                (user_id, user_id, self.max_messages))
+        self._sweep()
+
+    def overflow(self, user_id: int, budget: int) -> List[Tuple[str, str]]:
+        removed = super().overflow(user_id, budget)
+        if removed:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM messages WHERE seq IN (SELECT seq FROM messages WHERE user_id = ? "
+                    "ORDER BY seq LIMIT ?)", (user_id, len(removed)))
+        return removed
+
+    def set_summary(self, user_id: int, summary: str) -> None:
+        super().set_summary(user_id, summary)
+        with self._conn:
+            self._save_dialog(user_id, self._dialogs[user_id])
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class RedisContextStore(MemoryContextStore):
+    """Контексты в Redis: общие для экземпляров бота на разных машинах.
+
+    На пользователя — хеш {prefix}dialog:{id} (сводка, last_seen) и список
+    {prefix}messages:{id} с репликами в JSON. Оба ключа живут idle_ttl секунд
+    с последней активности, неактивных пользователей удаляет сам Redis.
+    Диалог каждый раз читается из Redis; вызовы блокирующие, AIChatBot
+    выполняет их в отдельном потоке. Нужен пакет redis.
+    """
+
+    blocking = True
+
+    def __init__(self, url: str = CONTEXT_REDIS_URL, prefix: str = CONTEXT_REDIS_PREFIX, client=None, **kwargs):
+        super().__init__(**kwargs)
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("для CONTEXT_STORE=redis установите redis") from e
+            client = redis.Redis.from_url(url, socket_timeout=CONTEXT_DB_TIMEOUT, decode_responses=True)
+        self._redis = client
+        self.prefix = prefix
+
+    def _keys(self, user_id: int) -> Tuple[str, str]:
+        return f"{self.prefix}dialog:{user_id}", f"{self.prefix}messages:{user_id}"
+
+    def _dialog(self, user_id: int, create: bool = False) -> Optional[Dialog]:
+        # Реплики могли добавить другие экземпляры — кэш в памяти не используем
+        self._dialogs.pop(user_id, None)
+        return super()._dialog(user_id, create)
+
+    def _load(self, user_id: int) -> Optional[Dialog]:
+        dialog_key, messages_key = self._keys(user_id)
+        pipe = self._redis.pipeline()
+        pipe.hgetall(dialog_key)
+        pipe.lrange(messages_key, -self.max_messages, -1)
+        row, messages = pipe.execute()
+        if not row:
+            return None
+        dialog = Dialog(self.max_messages)
+        dialog.summary = row.get("summary", "")
+        dialog.last_seen = float(row.get("last_seen", time.time()))
+        dialog.messages.extend(tuple(json.loads(message)) for message in messages)
+        return dialog
+
+    def _forget(self, user_id: int) -> None:
+        super()._forget(user_id)
+        self._redis.delete(*self._keys(user_id))
+
+    def _evict(self) -> None:
+        # В памяти держится только диалог текущего вызова, истечение по TTL — на стороне Redis
+        while len(self._dialogs) > self.max_users:
+            self._dialogs.popitem(last=False)
+
+    def _save_dialog(self, pipe, user_id: int, dialog: Dialog) -> None:
+        dialog_key, messages_key = self._keys(user_id)
+        pipe.hset(dialog_key, mapping={"summary": dialog.summary, "last_seen": dialog.last_seen})
+        pipe.expire(dialog_key, int(self.idle_ttl))
+        pipe.expire(messages_key, int(self.idle_ttl))
+
+    def append(self, user_id: int, role: str, text: str) -> None:
+        super().append(user_id, role, text)
+        dialog = self._dialogs[user_id]
+        _, messages_key = self._keys(user_id)
+        pipe = self._redis.pipeline()
+        pipe.rpush(messages_key, json.dumps(dialog.messages[-1], ensure_ascii=False))
+        # Кольцевой буфер: в Redis храним столько же реплик, сколько в памяти
+        pipe.ltrim(messages_key, -self.max_messages, -1)
+        self._save_dialog(pipe, user_id, dialog)
+        pipe.execute()
+
+    def overflow(self, user_id: int, budget: int) -> List[Tuple[str, str]]:
+        removed = super().overflow(user_id, budget)
+        if removed:
+            _, messages_key = self._keys(user_id)
+            self._redis.ltrim(messages_key, len(removed), -1)
+        return removed
+
+    def set_summary(self, user_id: int, summary: str) -> None:
+        super().set_summary(user_id, summary)
+        pipe = self._redis.pipeline()
+        self._save_dialog(pipe, user_id, self._dialogs[user_id])
+        pipe.execute()
+
+    def close(self) -> None:
+        self._redis.close()
+
+
+def create_context_store(backend: str = CONTEXT_STORE) -> MemoryContextStore:
+    """Хранилище контекстов по настройке CONTEXT_STORE: memory, sqlite, shared или redis"""
+    if backend in ("sqlite", "shared"):
+        return SQLiteContextStore(shared=backend == "shared")
+    if backend == "redis":
+        return RedisContextStore()
+    if backend != "memory":
+        raise ValueError(f"Неизвестное хранилище контекстов: {backend}")
+    return MemoryContextStore()
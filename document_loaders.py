@@ -0,0 +1,111 @@
+"""Загрузка и разбиение документов из DATA_DIR на чанки для индекса.
+
+Текст файла достаётся загрузчиком по расширению: markdown и txt читаются
+напрямую, PDF — через pypdf, DOCX — через python-docx (если пакеты установлены).
+Новый формат добавляется декоратором @register_loader(".ext").
+Файлы разбираются в пуле процессов, ошибка одного файла не мешает остальным.
+"""
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from law_text_processor import LawTextProcessor
+from config import CHUNK_SIZE, CHUNK_OVERLAP, INGEST_WORKERS
+
+LOADERS: Dict[str, Callable[[Path], str]] = {}
+
+_text_splitter = None
+
+
+def register_loader(*suffixes: str):
+    """Регистрирует функцию path -> текст для расширений файлов"""
+    def decorator(loader):
+        for suffix in suffixes:
+            LOADERS[suffix.lower()] = loader
+        return loader
+    return decorator
+
+
+@register_loader(".md", ".txt")
+def load_plain_text(path: Path) -> str:
+    return path.read_text(encoding='utf-8')
+
+
+@register_loader(".pdf")
+def load_pdf(path: Path) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError("для PDF установите pypdf") from e
+    return "\n".join(page.extract_text() or "" for page in PdfReader(str(path)).pages)
+
+
+@register_loader(".docx")
+def load_docx(path: Path) -> str:
+    try:
+        import docx
+    except ImportError as e:
+        raise ImportError("для DOCX установите python-docx") from e
+    return "\n".join(paragraph.text for paragraph in docx.Document(str(path)).paragraphs)
+
+
+def load_text(path: Path) -> str:
+    """Текст файла; неизвестные расширения читаются как UTF-8"""
+    return LOADERS.get(path.suffix.lower(), load_plain_text)(path)
+
+
+def chunk_id(rel_path: str, text: str) -> str:
+    return hashlib.sha256(f"{rel_path}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _fallback_splitter():
+    """Запасной сплиттер для документов без статей"""
+    global _text_splitter
+    if _text_splitter is None:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        _text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return _text_splitter
+
+
+def split_file(rel_path: str, file_path: Path) -> dict:
+    """Делит файл на чанки, возвращает {id чанка: Document}"""
+    text = load_text(file_path)
+    # Законы режем по статьям прямо по исходному тексту
+    docs = LawTextProcessor.split_by_articles(
+        text,
+        LawTextProcessor.law_name_from_file(file_path.name),
+        source=str(file_path)
+    )
+    if not docs:
+        docs = _fallback_splitter().create_documents([text], metadatas=[{"source": str(file_path)}])
+
+    chunks = {}
+    for chunk in docs:
+        # Одинаковые чанки внутри файла дают одинаковый id и хранятся один раз
+        chunks.setdefault(chunk_id(rel_path, chunk.page_content), chunk)
+    return chunks
+
+
+def split_files(files: List[Tuple[str, Path]], workers: int = INGEST_WORKERS) -> Iterator[tuple]:
+    """(относительный путь, путь, чанки или исключение) по каждому файлу в исходном порядке.
+
+    При workers > 1 и нескольких файлах разбор идёт в пуле процессов.
+    """
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(split_file, rel_path, file_path) for rel_path, file_path in files]
+            for (rel_path, file_path), future in zip(files, futures):
+                try:
+                    yield rel_path, file_path, future.result()
+                except Exception as e:
+                    yield rel_path, file_path, e
+        return
+    for rel_path, file_path in files:
+        try:
+            yield rel_path, file_path, split_file(rel_path, file_path)
+        except Exception as e:
+            yield rel_path, file_path, e
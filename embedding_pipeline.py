@@ -0,0 +1,163 @@
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator, List, Tuple
+
+import numpy as np
+
+from config import EMBED_BATCH_SIZE, EMBED_TORCH_THREADS, EMBED_WORKERS, EMBEDDINGS_MODEL
+
+try:
+    import resource  # Нет в Windows
+except ImportError:
+    resource = None
+
+CHECKPOINT_DIR = ".checkpoint"
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int) -> None:
+    """Загружает модель один раз на процесс пула"""
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    return _worker_model.encode(
+        texts, batch_size=len(texts), normalize_embeddings=True,
+        convert_to_numpy=True, show_progress_bar=False
+    ).astype(np.float32)
+
+
+def _peak_rss_mb() -> float:
+    """Пиковый RSS процесса и дочерних воркеров, МБ"""
+    if resource is None:
+        return 0.0
+    usage = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+             + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return usage / 1024  # В Linux ru_maxrss в килобайтах
+
+
+class EmbeddingPipeline:
+    """Пакетный расчёт эмбеддингов с чекпоинтами для возобновления сборки.
+
+    При EMBED_WORKERS > 1 батчи кодируются в пуле процессов, каждый со своей
+    копией модели; иначе — в текущем процессе на EMBED_TORCH_THREADS потоках torch.
+    Готовые батчи сохраняются в vector_db/.checkpoint, поэтому прерванная
+    сборка продолжается с места остановки.
+    """
+
+    def __init__(self, get_embeddings: Callable[[], object], db_path: Path, settings: dict,
+                 batch_size: int = EMBED_BATCH_SIZE, workers: int = EMBED_WORKERS):
+        self.get_embeddings = get_embeddings  # Вызывается только при кодировании в этом процессе
+        self.batch_size = batch_size
+        self.workers = workers
+        self.checkpoint_path = Path(db_path) / CHECKPOINT_DIR
+        self.settings = settings
+        self.stats = {}
+
+    def _open_checkpoint(self) -> dict:
+        """Читает готовые векторы {id чанка: вектор} из чекпоинта"""
+        settings_file = self.checkpoint_path / "settings.json"
+        try:
+            with open(settings_file, encoding='utf-8') as f:
+                valid = json.load(f) == self.settings
+        except (OSError, ValueError):
+            valid = False
+
+        if not valid:
+            shutil.rmtree(self.checkpoint_path, ignore_errors=True)
+            self.checkpoint_path.mkdir(parents=True, exist_ok=True)
+            with open(settings_file, "w", encoding='utf-8') as f:
+                json.dump(self.settings, f)
+            return {}
+
+        done = {}
+        for batch_file in sorted(self.checkpoint_path.glob("batch_*.npz")):
+            try:
+                with np.load(batch_file) as batch:
+                    done.update(zip(batch["ids"].tolist(), batch["vectors"]))
+            except (OSError, ValueError, KeyError):
+                print(f"Повреждённый чекпоинт {batch_file.name} пропущен")
+        return done
+
+    def _save_batch(self, ids: List[str], vectors: np.ndarray) -> None:
+        name = f"batch_{time.time_ns()}.npz"
+        tmp_file = self.checkpoint_path / (name + ".tmp")
+        with open(tmp_file, "wb") as f:
+            np.savez(f, ids=np.array(ids), vectors=vectors)
+        os.replace(tmp_file, self.checkpoint_path / name)
+
+    def clear_checkpoint(self) -> None:
+        """Удаляет чекпоинт после успешного сохранения индекса"""
+        shutil.rmtree(self.checkpoint_path, ignore_errors=True)
+
+    def _batches(self, ids: List[str], texts: List[str]) -> Iterator[Tuple[List[str], List[str]]]:
+        for start in range(0, len(ids), self.batch_size):
+            yield ids[start:start + self.batch_size], texts[start:start + self.batch_size]
+
+    def _encode_local(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.get_embeddings().embed_documents(texts), dtype=np.float32)
+
+    def run(self, ids: List[str], texts: List[str]) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """Отдаёт батчи (ids, векторы): сначала из чекпоинта, затем новые"""
+        start_time = time.perf_counter()
+        done = self._open_checkpoint()
+        resumed = [cid for cid in ids if cid in done]
+        if resumed:
+            print(f"Продолжение сборки: {len(resumed)} чанков из чекпоинта")
+            for batch_ids, _ in self._batches(resumed, resumed):
+                yield batch_ids, np.stack([done[cid] for cid in batch_ids])
+
+        pending = [(cid, text) for cid, text in zip(ids, texts) if cid not in done]
+        pending_ids = [cid for cid, _ in pending]
+        pending_texts = [text for _, text in pending]
+        batches = list(self._batches(pending_ids, pending_texts))
+
+        if self.workers > 1 and len(batches) > 1:
+            threads = max(1, EMBED_TORCH_THREADS // self.workers)
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(EMBEDDINGS_MODEL, threads)
+            ) as pool:
+                results = pool.map(_encode_batch, [batch_texts for _, batch_texts in batches])
+                for (batch_ids, _), vectors in zip(batches, results):
+                    self._save_batch(batch_ids, vectors)
+                    yield batch_ids, vectors
+        else:
+            try:
+                import torch
+                torch.set_num_threads(EMBED_TORCH_THREADS)
+            except ImportError:
+                pass
+            for batch_ids, batch_texts in batches:
+                vectors = self._encode_local(batch_texts)
+                self._save_batch(batch_ids, vectors)
+                yield batch_ids, vectors
+
+        wall = time.perf_counter() - start_time
+        self.stats = {
+            "chunks": len(ids),
+            "embedded": len(pending_ids),
+            "resumed": len(resumed),
+            "wall_s": round(wall, 2),
+            "chunks_per_s": round(len(pending_ids) / wall, 1) if wall > 0 else 0.0,
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+        }
+
+    def report(self) -> str:
+        s = self.stats
+        return (f"Эмбеддинги: {s['embedded']} новых + {s['resumed']} из чекпоинта "
+                f"за {s['wall_s']} с ({s['chunks_per_s']} чанков/с), "
+                f"пиковый RSS {s['peak_rss_mb']} МБ")
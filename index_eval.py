@@ -0,0 +1,134 @@
+"""Сравнение векторных индексов: полнота recall@k относительно точного поиска, задержка и размер.
+
+    python index_eval.py [--factories HNSW32 "IVF{nlist},PQ48"] [--k 10] [--queries вопросы.txt] [--json]
+
+Берёт векторы из собранного индекса (vector_db). Запросы — строки файла --queries
+(нужна модель эмбеддингов) или синтетические: нормированные средние пар случайных чанков.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from config import VECTOR_DB_PATH, VECTOR_INDEX_NPROBE, VECTOR_INDEX_EF_SEARCH
+from index_store import FLAT, IndexStore, ann_factory_string, build_ann, tune_ann
+
+DEFAULT_FACTORIES = [FLAT, "HNSW32", "IVF{nlist},Flat", "IVF{nlist},SQ8", "IVF{nlist},PQ48"]
+NPROBE_SWEEP = [1, 4, 8, 16, 32, 64]
+EF_SEARCH_SWEEP = [16, 32, 64, 128, 256]
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def synthetic_queries(vectors: np.ndarray, count: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    pairs = rng.integers(0, len(vectors), size=(count, 2))
+    queries = vectors[pairs[:, 0]] + vectors[pairs[:, 1]]
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+
+def embedded_queries(path: str) -> np.ndarray:
+    from rag_processor import RAGProcessor
+
+    with open(path, encoding='utf-8') as f:
+        questions = [line.strip() for line in f if line.strip()]
+    rag = RAGProcessor()
+    return np.array([rag.embed_query(question) for question in questions], dtype=np.float32)
+
+
+def measure(search, queries: np.ndarray, truth: list, k: int) -> dict:
+    """Полнота и задержка одиночных запросов (как в боте — по одному)"""
+    latencies = []
+    recalls = []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(set(found.tolist()) & set(expected.tolist())) / k)
+    latencies = np.array(latencies) * 1000
+    return {
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+    }
+
+
+def evaluate(vectors: np.ndarray, queries: np.ndarray, factories: list, k: int) -> list:
+    import faiss
+
+    truth = [exact_top_k(vectors, query, k) for query in queries]
+    results = []
+    for factory in factories:
+        if factory == FLAT:
+            row = {"factory": FLAT, "build_s": 0.0, "size_mb": round(vectors.nbytes / 2 ** 20, 2)}
+            row.update(measure(lambda query: exact_top_k(vectors, query, k), queries, truth, k))
+            results.append(row)
+            continue
+
+        start = time.perf_counter()
+        index = build_ann(vectors, factory)
+        build_s = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / 2 ** 20
+
+        if "IVF" in factory:
+            sweep = [("nprobe", value) for value in NPROBE_SWEEP]
+        elif "HNSW" in factory:
+            sweep = [("efSearch", value) for value in EF_SEARCH_SWEEP]
+        else:
+            sweep = [(None, None)]
+        for param, value in sweep:
+            tune_ann(index, nprobe=value if param == "nprobe" else None,
+                     ef_search=value if param == "efSearch" else None)
+            row = {"factory": ann_factory_string(factory, len(vectors)), "build_s": round(build_s, 2),
+                   "size_mb": round(size_mb, 2)}
+            if param:
+                row[param] = value
+
+            def search(query):
+                _, found = index.search(query[None, :], k)
+                return found[0][found[0] >= 0]
+
+            row.update(measure(search, queries, truth, k))
+            results.append(row)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--factories", nargs="+", default=DEFAULT_FACTORIES, help="Строки фабрики FAISS")
+    parser.add_argument("--k", type=int, default=10, help="Глубина поиска для recall@k")
+    parser.add_argument("--queries", help="Файл с вопросами, по одному в строке")
+    parser.add_argument("--num-queries", type=int, default=200, help="Число синтетических запросов")
+    parser.add_argument("--json", action="store_true", help="Вывести результаты в JSON")
+    args = parser.parse_args()
+
+    store = IndexStore.open(VECTOR_DB_PATH)
+    if store is None or not len(store):
+        print(f"Индекс в {VECTOR_DB_PATH} не найден. Соберите его: python rag_processor.py")
+        return
+    vectors = np.ascontiguousarray(store.vectors, dtype=np.float32)
+    queries = embedded_queries(args.queries) if args.queries else synthetic_queries(vectors, args.num_queries)
+    results = evaluate(vectors, queries, args.factories, min(args.k, len(vectors)))
+
+    if args.json:
+        print(json.dumps({"vectors": len(vectors), "dim": vectors.shape[1], "queries": len(queries),
+                          "results": results}, ensure_ascii=False, indent=2))
+        return
+    print(f"Векторов: {len(vectors)} x {vectors.shape[1]}, запросов: {len(queries)}; "
+          f"текущие настройки: nprobe={VECTOR_INDEX_NPROBE}, efSearch={VECTOR_INDEX_EF_SEARCH}")
+    recall_key = f"recall@{min(args.k, len(vectors))}"
+    print(f"{'индекс':<20}{'параметр':<14}{recall_key:>10}{'p50, мс':>10}{'p95, мс':>10}"
+          f"{'МБ':>9}{'сборка, с':>11}")
+    for row in results:
+        param = next((f"{name}={row[name]}" for name in ("nprobe", "efSearch") if name in row), "")
+        print(f"{row['factory']:<20}{param:<14}{row[recall_key]:>10.3f}{row['p50_ms']:>10.3f}"
+              f"{row['p95_ms']:>10.3f}{row['size_mb']:>9.2f}{row['build_s']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+INDEX_FORMAT = "yurbot-index"
+INDEX_FORMAT_VERSION = 1
+HEADER_FILE = "index.json"
+FLAT = "Flat"
+
+
+def ann_factory_string(factory: str, count: int) -> str:
+    """Подставляет в строку фабрики FAISS число кластеров {nlist} под размер корпуса"""
+    nlist = max(1, min(int(4 * count ** 0.5), count // 39))  # FAISS просит ~39 точек на кластер
+    return factory.format(nlist=nlist)
+
+
+def build_ann(vectors: np.ndarray, factory: str):
+    """Обучает и заполняет индекс FAISS по строке фабрики (HNSW32, IVF{nlist},PQ48 ...)"""
+    import faiss
+
+    index = faiss.index_factory(vectors.shape[1], ann_factory_string(factory, len(vectors)),
+                                faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def tune_ann(index, nprobe: int = None, ef_search: int = None) -> None:
+    """Параметры поиска: nprobe для IVF, efSearch для HNSW (неподходящие игнорируются)"""
+    import faiss
+
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is not None:
+            try:
+                params.set_index_parameter(index, name, value)
+            except RuntimeError:
+                pass
+
+
+def _write_chunks(conn: sqlite3.Connection, docs: Iterable[Tuple[str, str, dict]], expected: int) -> None:
+    """Создаёт таблицу чанков и проверяет, что их столько же, сколько векторов"""
+    conn.execute(
+        "CREATE TABLE chunks (pos INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+        "text TEXT NOT NULL, metadata TEXT NOT NULL)"
+    )
+    conn.executemany(
+        "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+        ((pos, doc_id, text, json.dumps(metadata, ensure_ascii=False))
+         for pos, (doc_id, text, metadata) in enumerate(docs))
+    )
+    count = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    conn.commit()
+    if count != expected:
+        raise ValueError(f"Число чанков ({count}) не совпадает с числом векторов ({expected})")
+
+
+class IndexStore:
+    """Векторный индекс в собственном формате без pickle.
+
+    - index.json — версионированный заголовок: размерность, число векторов,
+      имена файлов текущего поколения и настройки сборки;
+    - vectors-<поколение>.npy — матрица float32, открывается через mmap;
+    - chunks-<поколение>.sqlite — тексты и метаданные чанков, читаются по позиции;
+    - ann-<метка>.faiss — необязательный приближённый индекс FAISS (HNSW, IVF,
+      PQ, SQ8) по тем же векторам. Без него поиск точный перебором по mmap.
+
+    Новое поколение пишется рядом со старым, затем атомарно подменяется
+    заголовок, поэтому прерванная запись не портит рабочий индекс.
+    """
+
+    def __init__(self, path: Path, header: dict):
+        self.path = Path(path)
+        self.header = header
+        self.vectors = np.load(self.path / header["vectors_file"], mmap_mode="r")
+        self.ann = None
+        if header.get("ann_file"):
+            import faiss
+            self.ann = faiss.read_index(str(self.path / header["ann_file"]))
+        self._local = threading.local()
+        self._conns = []  # Соединения всех потоков, чтобы close() закрыл и их
+        self._conns_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: Path) -> Optional["IndexStore"]:
+        """Открывает индекс; None, если его нет или формат не подходит"""
+        try:
+            with open(Path(path) / HEADER_FILE, encoding='utf-8') as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if header.get("format") != INDEX_FORMAT or header.get("version") != INDEX_FORMAT_VERSION:
+            return None
+        try:
+            store = cls(path, header)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"Ошибка открытия индекса: {e}")
+            return None
+        if store.vectors.shape != (header["count"], header["dim"]):
+            print("Размер векторов не совпадает с заголовком индекса")
+            return None
+        return store
+
+    def __len__(self) -> int:
+        return self.header["count"]
+
+    @property
+    def settings(self) -> dict:
+        return self.header.get("settings", {})
+
+    @property
+    def ann_factory(self) -> str:
+        return self.header.get("ann_factory", FLAT)
+
+    def tune(self, nprobe: int = None, ef_search: int = None) -> None:
+        if self.ann is not None:
+            tune_ann(self.ann, nprobe, ef_search)
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = (self.path / self.header["chunks_file"]).resolve().as_uri() + "?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def _db(self) -> sqlite3.Connection:
+        """Своё read-only соединение на каждый поток"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            with self._conns_lock:
+                self._conns.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def search(self, vector, k: int) -> List[Tuple[str, float]]:
+        """Поиск по скалярному произведению (эмбеддинги нормализованы).
+
+        С приближённым индексом кандидаты пересчитываются по точным векторам
+        из mmap, поэтому сжатие (PQ, SQ8) влияет на полноту, но не на оценки.
+        """
+        if not len(self):
+            return []
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.ann is not None:
+            _, found = self.ann.search(vector[None, :], k)
+            top = np.sort(found[0][found[0] >= 0])
+            scores = self.vectors[top] @ vector
+            order = np.argsort(-scores)
+            top, top_scores = top[order], scores[order]
+        else:
+            scores = self.vectors @ vector
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            top_scores = scores[top]
+        return list(zip(self.ids_at(top.tolist()), top_scores.tolist()))
+
+    def ids_at(self, positions: List[int]) -> List[str]:
+        rows = dict(self._query_in("SELECT pos, id FROM chunks WHERE pos IN ({})", positions))
+        return [rows[pos] for pos in positions]
+
+    def _query_in(self, sql: str, values: list) -> list:
+        if not values:
+            return []
+        placeholders = ",".join("?" * len(values))
+        return self._db().execute(sql.format(placeholders), values).fetchall()
+
+    def get(self, ids: List[str]) -> List[Document]:
+        """Документы по id в порядке запроса"""
+        rows = self._query_in("SELECT id, text, metadata FROM chunks WHERE id IN ({})", list(ids))
+        docs = {doc_id: Document(id=doc_id, page_content=text, metadata=json.loads(metadata))
+                for doc_id, text, metadata in rows}
+        return [docs[doc_id] for doc_id in ids if doc_id in docs]
+
+    def positions(self) -> dict:
+        """{id: позиция} для всех чанков"""
+        return dict(self._db().execute("SELECT id, pos FROM chunks"))
+
+    def iter_documents(self) -> Iterator[Tuple[str, str, dict]]:
+        """(id, текст, метаданные) всех чанков в порядке позиций"""
+        for doc_id, text, metadata in self._db().execute(
+                "SELECT id, text, metadata FROM chunks ORDER BY pos"):
+            yield doc_id, text, json.loads(metadata)
+
+    def close(self) -> None:
+        """Закрывает соединения всех потоков, в том числе рабочих asyncio.to_thread"""
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+        for conn in conns:
+            conn.close()
+
+    @classmethod
+    def write(cls, path: Path, vectors: np.ndarray, docs: Iterable[Tuple[str, str, dict]],
+              settings: dict, ann_factory: str = FLAT) -> "IndexStore":
+        """Записывает новое поколение индекса и переключает на него заголовок"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        generation = time.time_ns()
+        vectors_file = f"vectors-{generation}.npy"
+        chunks_file = f"chunks-{generation}.sqlite"
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+        np.save(path / vectors_file, vectors)
+
+        conn = sqlite3.connect(path / chunks_file)
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            _write_chunks(conn, docs, len(vectors))
+        finally:
+            conn.close()
+
+        ann_file = cls._write_ann(path, vectors, ann_factory, generation)
+
+        header = {
+            "format": INDEX_FORMAT,
+            "version": INDEX_FORMAT_VERSION,
+            "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            "count": int(len(vectors)),
+            "vectors_file": vectors_file,
+            "chunks_file": chunks_file,
+            "ann_file": ann_file,
+            "ann_factory": ann_factory,
+            "settings": settings,
+            "created": time.time(),
+        }
+        cls._write_header(path, header)
+        cls._remove_stale(path, {vectors_file, chunks_file, ann_file})
+        return cls(path, header)
+
+    def with_ann(self, ann_factory: str) -> "IndexStore":
+        """Перестраивает приближённый индекс текущего поколения под новую фабрику"""
+        vectors = np.ascontiguousarray(self.vectors, dtype=np.float32)
+        header = dict(self.header, ann_file=self._write_ann(self.path, vectors, ann_factory, time.time_ns()),
+                      ann_factory=ann_factory)
+        self._write_header(self.path, header)
+        self._remove_stale(self.path, {header["vectors_file"], header["chunks_file"], header["ann_file"]})
+        return type(self)(self.path, header)
+
+    @staticmethod
+    def _write_ann(path: Path, vectors: np.ndarray, ann_factory: str, generation: int) -> Optional[str]:
+        if ann_factory == FLAT or not len(vectors):
+            return None
+        import faiss
+
+        ann_file = f"ann-{generation}.faiss"
+        faiss.write_index(build_ann(vectors, ann_factory), str(path / ann_file))
+        return ann_file
+
+    @staticmethod
+    def _write_header(path: Path, header: dict) -> None:
+        tmp_path = path / (HEADER_FILE + ".tmp")
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(header, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path / HEADER_FILE)
+
+    @staticmethod
+    def _remove_stale(path: Path, keep: set) -> None:
+        """Удаляет файлы прошлых поколений (в Windows открытые файлы удалятся позже)"""
+        for pattern in ("vectors-*.npy", "chunks-*.sqlite", "ann-*.faiss"):
+            for old_file in path.glob(pattern):
+                if old_file.name not in keep:
+                    try:
+                        old_file.unlink()
+                    except OSError:
+                        pass
+
+
+class MemoryIndexStore(IndexStore):
+    """Поколение индекса, которое не удалось записать на диск.
+
+    Векторы лежат в памяти, чанки — в SQLite в памяти (общий кэш, чтобы у каждого
+    потока было своё соединение), поиск точный перебором. Живёт до перезапуска.
+    """
+
+    def __init__(self, vectors: np.ndarray, docs: Iterable[Tuple[str, str, dict]], settings: dict):
+        generation = time.time_ns()
+        self.path = None
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.ann = None
+        self.header = {
+            "format": INDEX_FORMAT,
+            "version": INDEX_FORMAT_VERSION,
+            "dim": int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0,
+            "count": int(len(self.vectors)),
+            "vectors_file": None,
+            "chunks_file": f"memory-{generation}",
+            "ann_file": None,
+            "ann_factory": FLAT,
+            "settings": settings,
+            "created": time.time(),
+        }
+        self._uri = f"file:yurbot-index-{generation}?mode=memory&cache=shared"
+        # База в памяти существует, пока открыто хотя бы одно соединение
+        self._owner = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        _write_chunks(self._owner, docs, len(self.vectors))
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+
+    def with_ann(self, ann_factory: str) -> "IndexStore":
+        return self
+
+    def close(self) -> None:
+        super().close()
+        self._owner.close()
@@ -0,0 +1,187 @@
+import re
+from typing import List
+
+from langchain_core.documents import Document
+
+from config import ARTICLE_MAX_CHARS
+
+# Заголовок статьи: "### Статья 20.3.1. Название" или "Статья 1"
+ARTICLE_RE = re.compile(r"^(?:#+\s*)?Статья\s+(\d+(?:\.\d+)*)(?:\.\s*(.*?))?\s*$")
+# Структурные заголовки: "# Раздел ..." и "## Глава ..."
+SECTION_RE = re.compile(r"^(#{1,2})\s+(.+?)\s*$")
+# Начало пункта/части статьи: "1. ", "2.1. "
+PART_RE = re.compile(r"^(\d+(?:\.\d+)*)\.\s")
+# Хвост имени файла: " от 30.12.2001 N 197-ФЗ"
+FILE_SUFFIX_RE = re.compile(r"\s+от\s+[\d.]+.*$")
+SENTENCE_END_RE = re.compile(r"(?<=[.;:!?])\s+")
+
+# Сокращения кодексов для ссылок вида "ст. 158 УК РФ"
+LAW_CODES = [
+    (re.compile(r"^Гражданский процессуальный", re.I), "ГПК"),
+    (re.compile(r"^Гражданский кодекс", re.I), "ГК"),
+    (re.compile(r"административных правонарушен", re.I), "КоАП"),
+    (re.compile(r"^Семейный кодекс", re.I), "СК"),
+    (re.compile(r"^Трудовой кодекс", re.I), "ТК"),
+    (re.compile(r"^Уголовно-исполнительный", re.I), "УИК"),
+    (re.compile(r"^Уголовно-процессуальный", re.I), "УПК"),
+    (re.compile(r"^Уголовный кодекс", re.I), "УК"),
+    (re.compile(r"^Налоговый кодекс", re.I), "НК"),
+    (re.compile(r"^Жилищный кодекс", re.I), "ЖК"),
+    (re.compile(r"^Земельный кодекс", re.I), "ЗК"),
+    (re.compile(r"^Арбитражный процессуальный", re.I), "АПК"),
+    (re.compile(r"^Конституция", re.I), "Конституция"),
+]
+
+# Короче этого текст вне статей считается продолжением заголовка
+PREAMBLE_MIN_CHARS = 300
+
+
+class LawTextProcessor:
+    """Разбивает текст закона на статьи за один проход по строкам"""
+
+    @staticmethod
+    def law_name_from_file(file_name: str) -> str:
+        """Название закона из имени файла без даты и номера"""
+        return FILE_SUFFIX_RE.sub("", file_name.rsplit(".", 1)[0]).strip()
+
+    @staticmethod
+    def law_code(law_name: str) -> str:
+        """Сокращение кодекса ("ГК", "КоАП"...) или пустая строка"""
+        for pattern, code in LAW_CODES:
+            if pattern.search(law_name):
+                return code
+        return ""
+
+    @staticmethod
+    def citation(law_name: str, code: str, article: str, parts: str = "") -> str:
+        """Краткая ссылка: "ГК РФ, ст. 454, ч. 1-3" """
+        law = f"{code} РФ" if code and code != "Конституция" else (
+            "Конституция РФ" if code else law_name)
+        if not article:
+            return law
+        return f"{law}, ст. {article}" + (f", ч. {parts}" if parts else "")
+
+    @staticmethod
+    def _hard_split(line: str, max_chars: int) -> List[str]:
+        """Режет слишком длинную строку по предложениям, затем по пробелам"""
+        pieces, current = [], ""
+        for sentence in SENTENCE_END_RE.split(line):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                pieces.append(current)
+                current = ""
+            current = f"{current} {sentence}" if current else sentence
+        if current:
+            pieces.append(current)
+        return pieces
+
+    @classmethod
+    def _pack_parts(cls, lines: List[str], max_chars: int) -> List[tuple]:
+        """Группирует пункты статьи в куски не длиннее max_chars.
+
+        Возвращает [(текст, номера пунктов)], разрывы по возможности
+        делаются на границах пунктов.
+        """
+        parts = []  # [(номер пункта, [строки])]
+        for line in lines:
+            m = PART_RE.match(line)
+            if m or not parts:
+                parts.append((m.group(1) if m else "", [line]))
+            else:
+                parts[-1][1].append(line)
+
+        chunks, buf, numbers, size = [], [], [], 0
+        for number, part_lines in parts:
+            part_len = sum(len(line) + 1 for line in part_lines)
+            if buf and size + part_len > max_chars:
+                chunks.append(("\n".join(buf), numbers))
+                buf, numbers, size = [], [], 0
+            for line in part_lines:
+                for piece in (cls._hard_split(line, max_chars) if len(line) > max_chars else [line]):
+                    if buf and size + len(piece) + 1 > max_chars:
+                        chunks.append(("\n".join(buf), numbers))
+                        buf, numbers, size = [], [], 0
+                    buf.append(piece)
+                    size += len(piece) + 1
+            if number:
+                numbers.append(number)
+        if buf:
+            chunks.append(("\n".join(buf), numbers))
+
+        return [(text, (nums[0] if len(nums) == 1 else f"{nums[0]}-{nums[-1]}") if nums else "")
+                for text, nums in chunks]
+
+    @classmethod
+    def split_by_articles(cls, text: str, law_name: str, source: str = "",
+                          max_chars: int = ARTICLE_MAX_CHARS) -> List[Document]:
+        """Разбивает текст закона на статьи с сохранением метаданных.
+
+        Одна статья — один чанк; длинные статьи делятся по пунктам.
+        Если в тексте нет ни одной статьи, возвращает пустой список.
+        """
+        code = cls.law_code(law_name)
+        result = []
+        found_articles = False
+        section = chapter = ""
+        article, title, body = "", "", []
+
+        def flush():
+            nonlocal chapter
+            if not body:
+                return
+            if not article and sum(map(len, body)) < PREAMBLE_MIN_CHARS:
+                # Короткий текст вне статей — продолжение заголовка главы ("§ 1...")
+                if chapter:
+                    chapter = f"{chapter} {' '.join(body)}"
+                return
+
+            header = f"Статья {article}. {title}".rstrip(". ") if article else law_name
+            packed = cls._pack_parts(body, max_chars - len(header) - 1)
+            for part_text, parts in packed:
+                result.append(Document(
+                    page_content=f"{header}\n{part_text}",
+                    metadata={
+                        "source": source,
+                        "law": law_name,
+                        "code": code,
+                        "article": article,
+                        "title": title,
+                        "parts": parts if len(packed) > 1 else "",
+                        "section": section,
+                        "chapter": chapter,
+                        "citation": cls.citation(law_name, code, article,
+                                                 parts if len(packed) > 1 else ""),
+                    }
+                ))
+
+        for raw_line in text.splitlines():
+            line = raw_line.strip()
+            if not line:
+                continue
+
+            m = ARTICLE_RE.match(line)
+            if m:
+                flush()
+                found_articles = True
+                article, title = m.group(1), (m.group(2) or "").rstrip(".")
+                body = []
+                continue
+
+            m = SECTION_RE.match(line)
+            if m:
+                flush()
+                if len(m.group(1)) == 1:
+                    section, chapter = m.group(2), ""
+                else:
+                    chapter = m.group(2)
+                article, title, body = "", "", []
+                continue
+
+            body.append(line)
+        flush()
+
+        return result if found_articles else []
@@ -0,0 +1,281 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import BM25_B, BM25_K1, RRF_K
+
+try:
+    import snowballstemmer
+    _stemmer = snowballstemmer.stemmer("russian")
+except ImportError:
+    _stemmer = None
+
+LEXICAL_INDEX_FILE = "lexical.sqlite"
+LEXICAL_INDEX_VERSION = 2
+
+TOKEN_RE = re.compile(r"\w+")
+WHITESPACE_RE = re.compile(r"\s+")
+PUNCT_RE = re.compile(r"[^\w\s.]")
+# Грубый стеммер на случай, если snowballstemmer не установлен
+SUFFIX_RE = re.compile(
+    r"(иями|ями|ами|ого|его|ому|ему|ыми|ими|ой|ей|ий|ый|ая|яя|ое|ее|ые|ие|ов|ев|ах|ях|ам|ям|ом|ем|"
+    r"а|я|о|е|ы|и|у|ю|ь)$"
+)
+STOP_WORDS = frozenset(
+    "и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне "
+    "было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него "
+    "до вас нибудь опять уж вам ведь там потом себя ничего ей может они тут где есть надо ней для мы "
+    "тебя их чем была сам чтоб без будто чего раз тоже себе под будет ж тогда кто этот того потому "
+    "этого какой совсем ним здесь этом один почти мой тем чтобы нее были куда зачем всех никогда "
+    "можно при об другой хоть после над больше тот через эти нас про всего них какая много разве "
+    "три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой им более всегда "
+    "конечно всю между либо также настоящего настоящей настоящим".split()
+)
+
+# Ссылка на статью в вопросе: "ст. 158", "статья 20.3.1", "статьи 81"
+ARTICLE_REF_RE = re.compile(r"(?<!\w)(?:ст\.?|стать[а-яё]*)\s*(\d+(?:\.\d+)*)", re.I)
+# Упоминания кодексов: (сокращение, полная форма) -> код из LawTextProcessor.LAW_CODES
+CODE_REFS = [
+    (re.compile(r"\bУПК\b"), re.compile(r"уголовно-процессуальн", re.I), "УПК"),
+    (re.compile(r"\bУИК\b"), re.compile(r"уголовно-исполнительн", re.I), "УИК"),
+    (re.compile(r"\bГПК\b"), re.compile(r"гражданск\w*\s+процессуальн", re.I), "ГПК"),
+    (re.compile(r"\bАПК\b"), re.compile(r"арбитражн\w*\s+процессуальн", re.I), "АПК"),
+    (re.compile(r"\bКоАП\b", re.I), re.compile(r"административн\w*\s+(?:правонарушен|кодекс)", re.I), "КоАП"),
+    (re.compile(r"\bУК\b"), re.compile(r"уголовн\w*\s+кодекс", re.I), "УК"),
+    (re.compile(r"\bГК\b"), re.compile(r"гражданск\w*\s+кодекс", re.I), "ГК"),
+    (re.compile(r"\bТК\b"), re.compile(r"трудов\w*\s+кодекс", re.I), "ТК"),
+    (re.compile(r"\bСК\b"), re.compile(r"семейн\w*\s+кодекс", re.I), "СК"),
+    (re.compile(r"\bНК\b"), re.compile(r"налогов\w*\s+кодекс", re.I), "НК"),
+    (re.compile(r"\bЖК\b"), re.compile(r"жилищн\w*\s+кодекс", re.I), "ЖК"),
+    (re.compile(r"\bЗК\b"), re.compile(r"земельн\w*\s+кодекс", re.I), "ЗК"),
+    (re.compile(r"\bКонституци", re.I), re.compile(r"\bконституци", re.I), "Конституция"),
+]
+# Максимальное расстояние между номером статьи и названием кодекса, символов
+REF_WINDOW = 60
+
+
+@lru_cache(maxsize=200_000)
+def stem(word: str) -> str:
+    if _stemmer is not None:
+        return _stemmer.stemWord(word)
+    return SUFFIX_RE.sub("", word) if len(word) > 4 else word
+
+
+def normalize_question(text: str) -> str:
+    """Приводит вопрос к каноническому виду для точного совпадения"""
+    text = PUNCT_RE.sub(" ", text.lower().replace("ё", "е"))
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    """Токены в нижнем регистре со стеммингом, без стоп-слов"""
+    return [stem(token) for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def article_key(code: str, article: str) -> str:
+    return f"{code}:{article}"
+
+
+def parse_article_refs(query: str) -> List[Tuple[str, str]]:
+    """Находит в вопросе явные ссылки вида "ст. 158 УК РФ" -> [("УК", "158")]"""
+    articles = [(m.start(), m.end(), m.group(1)) for m in ARTICLE_REF_RE.finditer(query)]
+    if not articles:
+        return []
+
+    codes = []
+    for short_re, long_re, code in CODE_REFS:
+        for pattern in (short_re, long_re):
+            codes.extend((m.start(), code) for m in pattern.finditer(query))
+    if not codes:
+        return []
+
+    refs = []
+    for start, end, number in articles:
+        # Сначала ищем кодекс после номера ("ст. 158 УК"), затем перед ним ("УК, ст. 158")
+        after = [(pos - end, code) for pos, code in codes if 0 <= pos - end <= REF_WINDOW]
+        before = [(start - pos, code) for pos, code in codes if 0 < start - pos <= REF_WINDOW]
+        if after:
+            code = min(after)[1]
+        elif before:
+            code = min(before)[1]
+        elif len({code for _, code in codes}) == 1:
+            code = codes[0][1]
+        else:
+            continue
+        if (code, number) not in refs:
+            refs.append((code, number))
+    return refs
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[str]:
+    """Объединяет несколько ранжированных списков id методом RRF"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class LexicalIndex:
+    """Инвертированный BM25-индекс и словарь (кодекс, статья) -> чанки.
+
+    После build() данные лежат в памяти; загруженный с диска индекс читает
+    постинги и статьи из SQLite по требованию, поэтому открывается мгновенно.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.doc_len = np.zeros(0, dtype=np.int32)
+        self.avgdl = 0.0
+        self.postings: Dict[str, List[int]] = {}  # термин -> [idx, tf, idx, tf, ...]
+        self.articles: Dict[str, List[str]] = {}
+        self.generation = ""
+        self._path = None  # SQLite-файл загруженного индекса
+        self._local = threading.local()
+        self._conns = []  # Соединения всех потоков, чтобы close() закрыл и их
+        self._conns_lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.ids)
+
+    @classmethod
+    def build(cls, docs: Iterable[Tuple[str, str, dict]], generation: str = "") -> "LexicalIndex":
+        """Строит индекс по списку (id, текст, метаданные)"""
+        index = cls()
+        index.generation = generation
+        postings = defaultdict(list)
+        doc_len = []
+        for idx, (doc_id, text, metadata) in enumerate(docs):
+            tokens = tokenize(text)
+            index.ids.append(doc_id)
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].extend((idx, tf))
+
+            code, article = metadata.get("code"), metadata.get("article")
+            if code and article:
+                index.articles.setdefault(article_key(code, article), []).append(doc_id)
+
+        index.postings = dict(postings)
+        index.doc_len = np.asarray(doc_len, dtype=np.int32)
+        index.avgdl = float(index.doc_len.mean()) if len(doc_len) else 0.0
+        return index
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path.resolve().as_uri() + "?mode=ro", uri=True,
+                                   check_same_thread=False)
+            with self._conns_lock:
+                self._conns.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def _get_postings(self, term: str) -> Optional[np.ndarray]:
+        if self._path is None:
+            postings = self.postings.get(term)
+            return np.asarray(postings, dtype=np.int32) if postings else None
+        row = self._db().execute("SELECT postings FROM terms WHERE term = ?", (term,)).fetchone()
+        return np.frombuffer(row[0], dtype=np.int32) if row else None
+
+    def _get_article(self, key: str) -> List[str]:
+        if self._path is None:
+            return self.articles.get(key, [])
+        row = self._db().execute("SELECT chunk_ids FROM articles WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def lookup_articles(self, refs: List[Tuple[str, str]]) -> List[str]:
+        """Чанки статей по точным ссылкам: сначала первые части всех статей, затем остальные"""
+        groups = [self._get_article(article_key(code, article)) for code, article in refs]
+        result = []
+        for depth in range(max(map(len, groups), default=0)):
+            result.extend(group[depth] for group in groups if depth < len(group))
+        return result
+
+    def search(self, query: str, k: int) -> List[str]:
+        """Возвращает id k лучших чанков по BM25"""
+        if not self.ids:
+            return []
+        n_docs = len(self.ids)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self._get_postings(term)
+            if postings is None:
+                continue
+            idx, tf = postings[0::2], postings[1::2].astype(np.float32)
+            idf = math.log(1 + (n_docs - len(idx) + 0.5) / (len(idx) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[idx] / self.avgdl)
+            scores[idx] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [self.ids[i] for i in top[np.argsort(-scores[top])]]
+
+    def save(self, db_path: Path) -> None:
+        """Сохраняет индекс в lexical.sqlite (без pickle)"""
+        path = Path(db_path) / LEXICAL_INDEX_FILE
+        tmp_path = path.with_name(path.name + ".tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value BLOB)")
+            conn.execute("CREATE TABLE terms (term TEXT PRIMARY KEY, postings BLOB)")
+            conn.execute("CREATE TABLE articles (key TEXT PRIMARY KEY, chunk_ids TEXT)")
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("version", str(LEXICAL_INDEX_VERSION)),
+                ("generation", self.generation),
+                ("ids", "\n".join(self.ids)),
+                ("doc_len", self.doc_len.astype(np.int32).tobytes()),
+            ])
+            conn.executemany("INSERT INTO terms VALUES (?, ?)", (
+                (term, np.asarray(postings, dtype=np.int32).tobytes())
+                for term, postings in self.postings.items()
+            ))
+            conn.executemany("INSERT INTO articles VALUES (?, ?)", (
+                (key, json.dumps(chunk_ids)) for key, chunk_ids in self.articles.items()
+            ))
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, db_path: Path, generation: str = "") -> Optional["LexicalIndex"]:
+        """Открывает сохранённый индекс, если он построен для того же поколения чанков"""
+        path = Path(db_path) / LEXICAL_INDEX_FILE
+        if not path.exists():
+            return None
+        index = cls()
+        index._path = path
+        try:
+            meta = dict(index._db().execute("SELECT key, value FROM meta"))
+        except sqlite3.Error:
+            return None
+        if meta.get("version") != str(LEXICAL_INDEX_VERSION) or meta.get("generation") != generation:
+            index.close()
+            return None
+        index.generation = generation
+        index.ids = meta["ids"].split("\n") if meta["ids"] else []
+        index.doc_len = np.frombuffer(meta["doc_len"], dtype=np.int32)
+        index.avgdl = float(index.doc_len.mean()) if len(index.doc_len) else 0.0
+        return index
+
+    def close(self) -> None:
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+        for conn in conns:
+            conn.close()
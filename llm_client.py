@@ -0,0 +1,294 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
+
+import httpx
+
+from config import (
+    DEEPSEEK_API_URL, DEEPSEEK_MODEL, YANDEX_GPT_API_URL, YANDEX_GPT_MODEL, LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES, LLM_POOL_SIZE, LLM_REQUEST_TIMEOUT, LLM_RETRY_DELAY, LLM_DEADLINE
+)
+
+# Колбэк на каждую попытку: (статус, время начала, тело ответа/ошибки,
+# номер попытки с 1, расход токенов из поля usage или None, имя провайдера)
+AttemptCallback = Callable[[str, float, str, int, Optional[dict], str], Awaitable[None]]
+
+
+class LLMError(Exception):
+    """Все попытки обращения к LLM завершились ошибкой"""
+
+
+class LLMClient:
+    """Асинхронный HTTP-клиент LLM с общим пулом соединений, ретраями и потоковым ответом.
+
+    Провайдеры отличаются только форматом запроса и ответа: см. _headers,
+    _payload, _parse_response и _iter_stream в подклассах.
+    """
+
+    name = "llm"
+
+    def __init__(self, api_url: str, model: str, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 name: str = None):
+        self.api_url = api_url
+        self.model = model
+        if name:
+            self.name = name
+        self.max_retries = LLM_MAX_RETRIES
+        self.retry_delay = LLM_RETRY_DELAY
+        self.deadline = LLM_DEADLINE
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Лениво создаёт общий httpx-клиент с keep-alive пулом"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=LLM_POOL_SIZE,
+                    max_keepalive_connections=LLM_POOL_SIZE
+                ),
+                headers=self._headers()
+            )
+        return self._client
+
+    def _headers(self) -> dict:
+        raise NotImplementedError
+
+    def _payload(self, messages: list, temperature: float, max_tokens: int, stream: bool = False) -> dict:
+        raise NotImplementedError
+
+    def _parse_response(self, body: dict) -> Tuple[str, Optional[dict]]:
+        """(текст ответа, usage) из JSON-ответа без потока"""
+        raise NotImplementedError
+
+    def _iter_stream(self, response: httpx.Response) -> AsyncIterator[Tuple[str, Optional[dict]]]:
+        """(новый фрагмент текста, usage или None) из потокового ответа"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Закрывает пул соединений"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int) -> float:
+        """Экспоненциальная задержка с полным джиттером"""
+        return random.uniform(0, self.retry_delay * (2 ** attempt))
+
+    async def chat(self, messages: list, on_attempt: Optional[AttemptCallback] = None,
+                   temperature: float = 0.6, max_tokens: int = 3000) -> str:
+        """Отправляет запрос с ретраями, не блокируя цикл событий"""
+        payload = self._payload(messages, temperature, max_tokens)
+        deadline = time.monotonic() + self.deadline
+        last_error = "Неизвестная ошибка"
+
+        for attempt in range(self.max_retries):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                last_error = "Deadline"
+                break
+
+            start_time = time.time()
+            try:
+                async with self._semaphore:
+                    response = await asyncio.wait_for(
+                        self._get_client().post(self.api_url, json=payload),
+                        timeout=remaining
+                    )
+
+                if response.status_code == 200:
+                    result, usage = self._parse_response(response.json())
+                    if on_attempt:
+                        await on_attempt("SUCCESS", start_time, result, attempt + 1, usage, self.name)
+                    return result
+
+                last_error = f"HTTP {response.status_code}"
+                if on_attempt:
+                    await on_attempt(f"ERROR_{response.status_code}", start_time, response.text, attempt + 1,
+                                     None, self.name)
+
+            except (httpx.TimeoutException, asyncio.TimeoutError):
+                last_error = "Timeout"
+                if on_attempt:
+                    await on_attempt("TIMEOUT", start_time, "", attempt + 1, None, self.name)
+            except (httpx.HTTPError, ValueError, LookupError) as e:
+                last_error = str(e) or type(e).__name__
+                if on_attempt:
+                    await on_attempt("CONNECTION_ERROR", start_time, last_error, attempt + 1, None, self.name)
+
+            if attempt < self.max_retries - 1:
+                delay = min(self._backoff(attempt), max(0.0, deadline - time.monotonic()))
+                await asyncio.sleep(delay)
+
+        raise LLMError(last_error)
+
+    async def stream_chat(self, messages: list, on_attempt: Optional[AttemptCallback] = None,
+                          temperature: float = 0.6, max_tokens: int = 3000) -> AsyncIterator[str]:
+        """Потоково получает ответ (SSE) и отдаёт его по фрагментам.
+
+        Ретраи выполняются только до первого полученного токена: после этого
+        обрыв потока приводит к LLMError, чтобы не дублировать уже показанный текст.
+        Дедлайн ограничивает и саму попытку: поток, который медленно течёт или
+        подвисает чуть меньше таймаута чтения, обрывается по LLM_DEADLINE.
+        """
+        payload = self._payload(messages, temperature, max_tokens, stream=True)
+        deadline = time.monotonic() + self.deadline
+        last_error = "Неизвестная ошибка"
+
+        for attempt in range(self.max_retries):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                last_error = "Deadline"
+                break
+
+            start_time = time.time()
+            parts = []
+            usage = None
+            timeout = httpx.Timeout(min(LLM_REQUEST_TIMEOUT, remaining), connect=min(10.0, remaining))
+            try:
+                async with self._semaphore:
+                    async with self._get_client().stream("POST", self.api_url, json=payload,
+                                                         timeout=timeout) as response:
+                        if response.status_code != 200:
+                            body = (await response.aread()).decode("utf-8", errors="replace")
+                            last_error = f"HTTP {response.status_code}"
+                            if on_attempt:
+                                await on_attempt(f"ERROR_{response.status_code}", start_time, body,
+                                                 attempt + 1, None, self.name)
+                        else:
+                            chunks = self._iter_stream(response).__aiter__()
+                            while True:
+                                try:
+                                    delta, chunk_usage = await asyncio.wait_for(
+                                        chunks.__anext__(), max(0.0, deadline - time.monotonic()))
+                                except StopAsyncIteration:
+                                    break
+                                usage = chunk_usage or usage
+                                if delta:
+                                    parts.append(delta)
+                                    yield delta
+                            if on_attempt:
+                                await on_attempt("SUCCESS", start_time, "".join(parts), attempt + 1, usage,
+                                                 self.name)
+                            return
+
+            except (httpx.TimeoutException, asyncio.TimeoutError):
+                last_error = "Timeout"
+                if on_attempt:
+                    await on_attempt("TIMEOUT", start_time, "".join(parts), attempt + 1, None, self.name)
+            except (httpx.HTTPError, ValueError, LookupError) as e:
+                last_error = str(e) or type(e).__name__
+                if on_attempt:
+                    await on_attempt("CONNECTION_ERROR", start_time, last_error, attempt + 1, None, self.name)
+
+            if parts:
+                raise LLMError(f"обрыв потока: {last_error}")
+
+            if attempt < self.max_retries - 1:
+                delay = min(self._backoff(attempt), max(0.0, deadline - time.monotonic()))
+                await asyncio.sleep(delay)
+
+        raise LLMError(last_error)
+
+
+class DeepSeekClient(LLMClient):
+    """Клиент Deepseek (OpenAI-совместимый chat/completions, поток в SSE)"""
+
+    name = "deepseek"
+
+    def __init__(self, api_url: str = DEEPSEEK_API_URL, model: str = DEEPSEEK_MODEL,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, name: str = None):
+        super().__init__(api_url, model, max_concurrency, name)
+
+    def _headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {os.getenv('DEEPSEEK_API_KEY')}",
+            "Content-Type": "application/json"
+        }
+
+    def _payload(self, messages: list, temperature: float, max_tokens: int, stream: bool = False) -> dict:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}  # usage придёт последним чанком
+        return payload
+
+    def _parse_response(self, body: dict) -> Tuple[str, Optional[dict]]:
+        return body.get("choices", [{}])[0].get("message", {}).get("content", ""), body.get("usage")
+
+    async def _iter_stream(self, response: httpx.Response) -> AsyncIterator[Tuple[str, Optional[dict]]]:
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            choices = chunk.get("choices") or [{}]
+            yield choices[0].get("delta", {}).get("content"), chunk.get("usage")
+
+
+class YandexGPTClient(LLMClient):
+    """Клиент YandexGPT (Foundation Models, REST completion).
+
+    В потоковом режиме API присылает JSON-строки с накопленным текстом,
+    новые фрагменты получаются как разница с предыдущей строкой.
+    """
+
+    name = "yandex"
+
+    def __init__(self, api_url: str = YANDEX_GPT_API_URL, model: str = YANDEX_GPT_MODEL,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, name: str = None):
+        super().__init__(api_url, model, max_concurrency, name)
+
+    def _headers(self) -> dict:
+        return {
+            "Authorization": f"Api-Key {os.getenv('YANDEX_API_KEY')}",
+            "Content-Type": "application/json"
+        }
+
+    def _payload(self, messages: list, temperature: float, max_tokens: int, stream: bool = False) -> dict:
+        return {
+            "modelUri": f"gpt://{os.getenv('YANDEX_FOLDER_ID')}/{self.model}",
+            "completionOptions": {
+                "stream": stream,
+                "temperature": temperature,
+                "maxTokens": str(max_tokens)
+            },
+            "messages": [{"role": message["role"], "text": message["content"]} for message in messages]
+        }
+
+    @staticmethod
+    def _usage(result: dict) -> Optional[dict]:
+        """usage в формате Deepseek (prompt_tokens, completion_tokens, total_tokens)"""
+        usage = result.get("usage")
+        if not usage:
+            return None
+        return {
+            "prompt_tokens": int(usage.get("inputTextTokens", 0)),
+            "completion_tokens": int(usage.get("completionTokens", 0)),
+            "total_tokens": int(usage.get("totalTokens", 0)),
+        }
+
+    def _parse_response(self, body: dict) -> Tuple[str, Optional[dict]]:
+        result = body["result"]
+        return result["alternatives"][0]["message"]["text"], self._usage(result)
+
+    async def _iter_stream(self, response: httpx.Response) -> AsyncIterator[Tuple[str, Optional[dict]]]:
+        text = ""
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            result = json.loads(line)["result"]
+            full = result["alternatives"][0]["message"]["text"]
+            delta, text = full[len(text):], full
+            yield delta, self._usage(result)
@@ -0,0 +1,246 @@
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+
+from config import (
+    LLM_PROVIDERS, LLM_HEDGE, LLM_HEDGE_QUANTILE, LLM_HEDGE_DEFAULT_DELAY, LLM_HEDGE_MIN_DELAY,
+    LLM_LATENCY_WINDOW, LLM_LATENCY_MIN_SAMPLES, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+)
+from llm_client import AttemptCallback, DeepSeekClient, LLMClient, LLMError, YandexGPTClient
+
+PROVIDERS = {
+    "deepseek": DeepSeekClient,
+    "yandex": YandexGPTClient,
+}
+
+
+class LatencyTracker:
+    """Скользящее окно последних задержек провайдера"""
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW, min_samples: int = LLM_LATENCY_MIN_SAMPLES):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q-й перцентиль (nearest rank) или None, пока замеров меньше min_samples"""
+        if len(self.samples) < max(1, self.min_samples):
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+class CircuitBreaker:
+    """Отключает провайдера после серии ошибок подряд.
+
+    closed — запросы идут; open — после threshold сбоев подряд (таймауты,
+    ошибки соединения, 429 и 5xx) запросы не отправляются; half_open — прошло reset_timeout секунд, allow()
+    пропускает один пробный запрос (и снова отсчитывает reset_timeout до
+    следующей пробы). Успех пробы закрывает цепь, ошибка — оставляет открытой.
+    """
+
+    def __init__(self, name: str = "llm", threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "half_open":
+            self._opened_at = time.monotonic()
+        return state != "open"
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self._opened_at is None:
+                self.trips += 1
+                print(f"Провайдер LLM {self.name} отключён после {self.failures} ошибок подряд")
+            self._opened_at = time.monotonic()
+
+
+def is_provider_failure(status: str) -> bool:
+    """Сбой провайдера, а не запроса: таймаут, ошибка соединения, 429 или 5xx.
+
+    Ошибки 4xx (неверный ключ, некорректный запрос) повторятся у провайдера
+    при любой нагрузке и предохранитель не размыкают.
+    """
+    if status in ("TIMEOUT", "CONNECTION_ERROR"):
+        return True
+    code = status.removeprefix("ERROR_")
+    return code.isdigit() and (code == "429" or code.startswith("5"))
+
+
+class Provider:
+    """Клиент провайдера с его задержками и предохранителем"""
+
+    def __init__(self, client: LLMClient):
+        self.client = client
+        self.name = client.name
+        self.breaker = CircuitBreaker(self.name)
+        self.latency = {"chat": LatencyTracker(), "first_token": LatencyTracker()}
+
+
+class LLMRouter:
+    """Маршрутизация запросов между провайдерами LLM с хеджированием и предохранителями.
+
+    Запрос уходит первому доступному провайдеру (по порядку LLM_PROVIDERS).
+    Если ответа (при потоке — первого токена) нет дольше, чем
+    LLM_HEDGE_QUANTILE-й перцентиль задержки этого провайдера, тот же запрос
+    дублируется следующему; берётся первый успешный ответ, второй запрос
+    отменяется. Если провайдер исчерпал ретраи с ошибкой, запрос сразу
+    переходит к следующему. Интерфейс совпадает с DeepSeekClient.
+    """
+
+    def __init__(self, clients: List[LLMClient], hedge: bool = LLM_HEDGE):
+        if not clients:
+            raise ValueError("Не задан ни один провайдер LLM")
+        self.providers = [Provider(client) for client in clients]
+        self.hedge = hedge
+        self.stats = {"hedged": 0, "hedge_wins": 0, "fallbacks": 0}
+
+    def _hedge_delay(self, provider: Provider, kind: str) -> float:
+        p = provider.latency[kind].percentile(LLM_HEDGE_QUANTILE)
+        return LLM_HEDGE_DEFAULT_DELAY if p is None else max(LLM_HEDGE_MIN_DELAY, p)
+
+    @staticmethod
+    def _tracked(provider: Provider, on_attempt: Optional[AttemptCallback], kind: str) -> AttemptCallback:
+        """Колбэк попыток, который ведёт предохранитель провайдера.
+
+        Время попытки, закончившейся таймаутом до первого токена, тоже идёт в
+        задержки kind: иначе перцентиль для хеджирования не видит медленных сбоев.
+        """
+        async def callback(status: str, start_time: float, response: str, attempt: int,
+                           usage: dict = None, name: str = None) -> None:
+            if status == "SUCCESS":
+                provider.breaker.record_success()
+            elif is_provider_failure(status):
+                provider.breaker.record_failure()
+            if status == "TIMEOUT" and not response:
+                provider.latency[kind].add(time.time() - start_time)
+            if on_attempt:
+                await on_attempt(status, start_time, response, attempt, usage, provider.name)
+        return callback
+
+    async def _race(self, kind: str, start) -> tuple:
+        """Запускает start(provider) по кандидатам с хеджированием; (провайдер, результат) первого успешного.
+
+        start возвращает корутину; незавершённые задачи проигравших отменяются.
+        """
+        candidates = list(self.providers)
+        pending: Dict[asyncio.Task, Provider] = {}
+        errors = []
+
+        def launch(provider: Provider = None) -> Optional[Provider]:
+            """Запускает следующего провайдера с незапертым предохранителем"""
+            while provider is None and candidates:
+                provider = candidates.pop(0)
+                if not provider.breaker.allow():
+                    provider = None
+            if provider is not None:
+                pending[asyncio.create_task(start(provider))] = provider
+            return provider
+
+        # Если отключены все, основной всё равно получает запрос: иначе бот только отвечал бы ошибкой
+        primary = launch() or launch(self.providers[0])
+        hedge_at = time.monotonic() + self._hedge_delay(primary, kind) if self.hedge else None
+        try:
+            while pending:
+                timeout = None
+                if hedge_at is not None and candidates:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge_at = None
+                    if launch():
+                        self.stats["hedged"] += 1
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except LLMError as e:
+                        errors.append(f"{provider.name}: {e}")
+                        continue
+                    if provider is not primary and not errors:
+                        self.stats["hedge_wins"] += 1
+                    return provider, result
+                if not pending and launch():
+                    self.stats["fallbacks"] += 1
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        raise LLMError("; ".join(errors) or "нет доступных провайдеров")
+
+    async def chat(self, messages: list, on_attempt: Optional[AttemptCallback] = None,
+                   temperature: float = 0.6, max_tokens: int = 3000) -> str:
+        async def start(provider: Provider) -> str:
+            began = time.perf_counter()
+            result = await provider.client.chat(messages, self._tracked(provider, on_attempt, "chat"),
+                                                temperature, max_tokens)
+            provider.latency["chat"].add(time.perf_counter() - began)
+            return result
+
+        _, result = await self._race("chat", start)
+        return result
+
+    async def stream_chat(self, messages: list, on_attempt: Optional[AttemptCallback] = None,
+                          temperature: float = 0.6, max_tokens: int = 3000) -> AsyncIterator[str]:
+        """Хеджирование до первого токена: дальше ответ идёт только от победившего провайдера"""
+        streams = {}
+
+        async def start(provider: Provider) -> str:
+            began = time.perf_counter()
+            stream = streams[provider] = provider.client.stream_chat(
+                messages, self._tracked(provider, on_attempt, "first_token"), temperature, max_tokens)
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                first = ""
+            provider.latency["first_token"].add(time.perf_counter() - began)
+            return first
+
+        try:
+            winner, first = await self._race("first_token", start)
+            stream = streams[winner]
+            if first:
+                yield first
+            async for delta in stream:
+                yield delta
+        finally:
+            for stream in streams.values():
+                await stream.aclose()
+
+    async def close(self) -> None:
+        for provider in self.providers:
+            await provider.client.close()
+
+
+def create_llm_client(providers: List[str] = LLM_PROVIDERS):
+    """Клиент LLM по списку провайдеров: один — сам клиент, несколько — LLMRouter"""
+    unknown = [name for name in providers if name not in PROVIDERS]
+    if unknown:
+        raise ValueError(f"Неизвестные провайдеры LLM: {', '.join(unknown)}; доступны: {', '.join(PROVIDERS)}")
+    clients = [PROVIDERS[name]() for name in providers]
+    return clients[0] if len(clients) == 1 else LLMRouter(clients)
@@ -0,0 +1,287 @@
+"""Нагрузочный тест приёма обновлений: синтетические Update через webhook python-telegram-bot.
+
+    python load_test.py [--instances 2] [--users 50] [--messages 3] [--contexts shared|redis] [--no-webhook]
+
+Вместо Telegram Bot API работает локальный сервер MockTelegram, вместо DeepSeek —
+MockDeepSeek из benchmark.py. Экземпляры бота (--instances) получают обновления
+по очереди, как за балансировщиком, и делят хранилище контекстов: SQLite одного
+хоста (--contexts shared) или Redis из CONTEXT_REDIS_URL (--contexts redis).
+Без webhook (--no-webhook или нет python-telegram-bot[webhooks]) обновления
+кладутся прямо в очередь Application.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import shutil
+import socket
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+import httpx
+from telegram import Update
+
+from benchmark import MockDeepSeek, load_questions, stats
+from config import ALLOWED_UPDATES, WEBHOOK_PATH, MAX_CONTEXT_LENGTH
+
+TOKEN = "123456:LOAD-TEST"
+SECRET = "load-test-secret"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MockTelegram:
+    """Локальная замена Bot API: отвечает на вызовы бота, считает их и время первого ответа"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = Counter()
+        self.first_reply = {}  # chat_id -> время первого сообщения бота на текущий вопрос
+        self._message_ids = itertools.count(1_000_000)
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/bot"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+
+    async def close(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode().split("\r\n")
+                headers = dict(line.lower().split(": ", 1) for line in lines[1:] if ": " in line)
+                length = int(headers.get("content-length", 0))
+                body = (await reader.readexactly(length)).decode() if length else ""
+                if headers.get("content-type", "").startswith("application/json"):
+                    params = json.loads(body) if body else {}
+                else:
+                    params = dict(parse_qsl(body))
+                result = self._result(lines[0].split(" ")[1].rsplit("/", 1)[-1], params)
+                await asyncio.sleep(self.latency)
+                payload = json.dumps({"ok": True, "result": result}, ensure_ascii=False).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n%s" % (len(payload), payload))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _result(self, method: str, params: dict):
+        self.calls[method] += 1
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Yur-bot", "username": "yur_bot"}
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(params["chat_id"])
+            text = params.get("text", "")
+            if method == "sendMessage" and not text.startswith("Бот сейчас занят"):
+                self.first_reply.setdefault(chat_id, time.perf_counter())
+            return {"message_id": int(params.get("message_id") or next(self._message_ids)),
+                    "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}, "text": text}
+        return True
+
+
+def synthetic_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        },
+    }
+
+
+def make_store(kind: str, tmp: Path):
+    """Хранилище контекстов экземпляра; ключи Redis — под префиксом этого прогона"""
+    from context_store import MemoryContextStore, RedisContextStore, SQLiteContextStore
+
+    if kind == "shared":
+        return SQLiteContextStore(tmp / "contexts.sqlite", shared=True)
+    if kind == "redis":
+        return RedisContextStore(prefix=f"{tmp.name}:")
+    return MemoryContextStore()
+
+
+async def run(args) -> dict:
+    import app
+    from llm_client import DeepSeekClient
+    from log_analyzer import analyze, read_records
+    from rag_processor import RAGProcessor
+    from request_log import RequestLogger
+
+    telegram = MockTelegram(args.telegram_latency)
+    llm = MockDeepSeek(args.llm_first_token, args.llm_tokens, args.llm_token_interval)
+    await telegram.start()
+    await llm.start()
+    tmp = Path(tempfile.mkdtemp(prefix="yurbot-load-"))
+
+    # Один загруженный индекс на все экземпляры — как с общим retrieval_service.py
+    rag = RAGProcessor()
+    await asyncio.to_thread(rag.load_and_process_documents)
+    try:
+        await asyncio.to_thread(rag.load_embeddings)
+    except Exception as e:
+        print(f"Модель эмбеддингов недоступна ({e}); поиск только по BM25")
+
+    done = {}  # message_id -> событие «ответ готов»
+    instances = []
+    for n in range(args.instances):
+        bot = app.AIChatBot(fast_start=True)
+        bot.rag = rag
+        bot.rag_ready.set()
+        bot.answer_cache = None
+        bot.contexts = make_store(args.contexts, tmp)
+        bot.llm = DeepSeekClient(api_url=llm.url)
+        bot.request_log.close()
+        bot.request_log = RequestLogger(tmp / f"requests-{n}.jsonl")
+        bot.scheduler.debounce = args.debounce
+
+        async def timed_answer(user_id, message, text, answer=bot.scheduler.handler):
+            try:
+                await answer(user_id, message, text)
+            finally:
+                done[message.message_id].set()
+
+        bot.scheduler.handler = timed_answer
+        application = app.build_application(bot, TOKEN, base_url=telegram.base_url)
+        await application.initialize()
+        await application.start()
+        url = None
+        if args.webhook:
+            port = free_port()
+            url = f"http://127.0.0.1:{port}/{WEBHOOK_PATH}"
+            await application.updater.start_webhook(listen="127.0.0.1", port=port, url_path=WEBHOOK_PATH,
+                                                    webhook_url=url, secret_token=SECRET,
+                                                    allowed_updates=ALLOWED_UPDATES)
+        instances.append((application, bot, url))
+
+    balancer = itertools.cycle(instances)
+    update_ids = itertools.count(1)
+    client = httpx.AsyncClient(timeout=30)
+    webhook_errors = 0
+    first_reply = []
+    completed = []
+
+    async def deliver(payload: dict) -> None:
+        nonlocal webhook_errors
+        application, _, url = next(balancer)
+        if url:
+            response = await client.post(url, json=payload, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+            webhook_errors += response.status_code != 200
+        else:
+            await application.update_queue.put(Update.de_json(payload, application.bot))
+
+    async def user_session(user_id: int, own_questions: list) -> None:
+        for question in own_questions:
+            update_id = next(update_ids)
+            done[update_id] = asyncio.Event()
+            telegram.first_reply.pop(user_id, None)
+            start = time.perf_counter()
+            await deliver(synthetic_update(update_id, user_id, question))
+            await done[update_id].wait()
+            if user_id in telegram.first_reply:
+                first_reply.append(telegram.first_reply[user_id] - start)
+            completed.append(time.perf_counter() - start)
+            await asyncio.sleep(args.think_time)
+
+    questions = load_questions(args.queries)
+    sessions = [[questions[(n * args.messages + i) % len(questions)] for i in range(args.messages)]
+                for n in range(args.users)]
+    start = time.perf_counter()
+    await asyncio.gather(*(user_session(1000 + n, own) for n, own in enumerate(sessions)))
+    wall = time.perf_counter() - start
+
+    await client.aclose()
+    for application, bot, url in instances:
+        if url:
+            await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await bot.close()
+
+    # Полнота диалогов: при общем хранилище каждый видит все свои реплики, с какого бы экземпляра они ни пришли
+    expected = min(args.messages * 2, MAX_CONTEXT_LENGTH * 2)
+    if args.contexts != "memory":
+        store = make_store(args.contexts, tmp)
+        full = sum(len(store.history(1000 + n, 10 ** 9)) >= expected for n in range(args.users))
+        for n in range(args.users):
+            store.reset(1000 + n)
+        store.close()
+    else:
+        full = sum(max(len(bot.contexts.history(1000 + n, 10 ** 9)) for _, bot, _ in instances) >= expected
+                   for n in range(args.users))
+    await telegram.close()
+    await llm.close()
+    logged = analyze(read_records(sorted(tmp.glob("requests-*.jsonl")))).get("requests", {})
+    shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        "instances": args.instances,
+        "webhook": args.webhook,
+        "contexts": args.contexts,
+        "users": args.users,
+        "updates": len(completed),
+        "wall_s": round(wall, 3),
+        "updates_per_s": round(len(completed) / wall, 3) if wall else 0.0,
+        "first_reply": stats(first_reply),
+        "completed": stats(completed),
+        "webhook_errors": webhook_errors,
+        "error_rate": logged.get("error_rate"),
+        "telegram_calls": dict(telegram.calls),
+        "llm_requests": llm.requests,
+        "full_contexts_rate": round(full / args.users, 3) if args.users else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--instances", type=int, default=2, help="Экземпляров бота за «балансировщиком»")
+    parser.add_argument("--users", type=int, default=20, help="Одновременных пользователей")
+    parser.add_argument("--messages", type=int, default=3, help="Вопросов от каждого пользователя")
+    parser.add_argument("--queries", help="Вопросы: текстовый файл или лог запросов JSONL")
+    parser.add_argument("--contexts", choices=["shared", "redis", "memory"], default="shared",
+                        help="Хранилище контекстов экземпляров")
+    parser.add_argument("--no-webhook", dest="webhook", action="store_false",
+                        help="Класть обновления прямо в очередь, без HTTP")
+    parser.add_argument("--think-time", type=float, default=0.2, help="Пауза пользователя между вопросами, с")
+    parser.add_argument("--debounce", type=float, default=0.0, help="SCHEDULER_DEBOUNCE экземпляров")
+    parser.add_argument("--telegram-latency", type=float, default=0.02, help="Задержка ответа мока Bot API, с")
+    parser.add_argument("--llm-first-token", type=float, default=0.5, help="Задержка мока до первого токена, с")
+    parser.add_argument("--llm-tokens", type=int, default=100, help="Токенов в ответе мока")
+    parser.add_argument("--llm-token-interval", type=float, default=0.01, help="Интервал между токенами, с")
+    parser.add_argument("--output", type=Path, help="Сохранить отчёт в файл")
+    args = parser.parse_args()
+
+    if args.webhook:
+        try:
+            import tornado  # noqa: F401 — webhook-сервер python-telegram-bot
+        except ImportError:
+            print("tornado не установлен (pip install 'python-telegram-bot[webhooks]'), обновления пойдут в очередь")
+            args.webhook = False
+
+    text = json.dumps(asyncio.run(run(args)), ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text, encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Отчёт по логу запросов: перцентили задержек по этапам и доля ошибок.
+
+    python log_analyzer.py [файлы ...] [--since 2025-05-01] [--json]
+
+Без аргументов читает REQUEST_LOG_PATH вместе с ротированными файлами.
+Понимает и старый формат logs.txt (строки через «|»).
+"""
+import argparse
+import json
+import math
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterator, List
+
+from config import REQUEST_LOG_PATH
+
+OK_STATUSES = {"OK", "CACHE_HIT", "SUCCESS", "CANCELLED"}  # CANCELLED — вопрос дополнен пользователем
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4),
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def default_files() -> List[Path]:
+    """Текущий лог и ротированные файлы, от старых к новым"""
+    rotated = sorted(REQUEST_LOG_PATH.parent.glob(REQUEST_LOG_PATH.name + ".*"),
+                     key=lambda path: -int(path.suffix[1:]) if path.suffix[1:].isdigit() else 0)
+    return [path for path in rotated + [REQUEST_LOG_PATH] if path.exists()]
+
+
+def parse_legacy(line: str) -> dict:
+    """Строка старого logs.txt: Timestamp|User ID|Duration|Status|Request|Response"""
+    ts, user_id, duration, status = line.split("|", 4)[:4]
+    return {"event": "llm_attempt", "ts": ts, "user_id": user_id,
+            "duration_s": float(duration), "status": status}
+
+
+def read_records(paths: List[Path]) -> Iterator[dict]:
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("Timestamp|"):
+                    continue
+                try:
+                    yield json.loads(line) if line.startswith("{") else parse_legacy(line)
+                except ValueError:
+                    continue  # Обрезанная или чужая строка
+
+
+def analyze(records: Iterator[dict], since: str = None) -> dict:
+    requests = []
+    attempts = []
+    for record in records:
+        if since and record.get("ts", "") < since:
+            continue
+        if record.get("event") == "request":
+            requests.append(record)
+        elif record.get("event") == "llm_attempt":
+            attempts.append(record)
+
+    report = {}
+    if requests:
+        stages = defaultdict(list)
+        for record in requests:
+            for stage, value in (record.get("timings") or {}).items():
+                stages[stage].append(value)
+        statuses = Counter(record.get("status") for record in requests)
+        errors = sum(count for status, count in statuses.items() if status not in OK_STATUSES)
+        tokens = [record["tokens"].get("total_tokens") or 0 for record in requests if record.get("tokens")]
+        report["requests"] = {
+            "count": len(requests),
+            "statuses": dict(statuses),
+            "error_rate": round(errors / len(requests), 4),
+            "cache_hit_rate": round(statuses.get("CACHE_HIT", 0) / len(requests), 4),
+            "retried_rate": round(sum(record.get("attempts", 0) > 1 for record in requests) / len(requests), 4),
+            "total_tokens": sum(tokens),
+            "context_tokens": summarize([record["context_tokens"] for record in requests
+                                         if record.get("context_tokens") is not None]),
+            "timings": {stage: summarize(values) for stage, values in sorted(stages.items())},
+        }
+    if attempts:
+        statuses = Counter(record.get("status") for record in attempts)
+        errors = sum(count for status, count in statuses.items() if status not in OK_STATUSES)
+        report["llm_attempts"] = {
+            "count": len(attempts),
+            "statuses": dict(statuses),
+            "error_rate": round(errors / len(attempts), 4),
+            "by_attempt": dict(Counter(record.get("attempt", 1) for record in attempts)),
+            "duration_s": summarize([record["duration_s"] for record in attempts if "duration_s" in record]),
+        }
+    return report
+
+
+def print_report(report: dict) -> None:
+    for section, data in report.items():
+        print(f"== {section}: {data['count']} записей, ошибок {data['error_rate']:.1%}")
+        print("   статусы: " + ", ".join(f"{status}={count}" for status, count in data["statuses"].items()))
+        if section == "requests":
+            print(f"   кэш: {data['cache_hit_rate']:.1%}, с ретраями: {data['retried_rate']:.1%}, "
+                  f"токенов: {data['total_tokens']}")
+            if data["context_tokens"]["count"]:
+                print(f"   фрагменты законов в промпте, токенов: p50 {data['context_tokens']['p50']:.0f}, "
+                      f"p95 {data['context_tokens']['p95']:.0f}")
+            timings = data["timings"]
+        else:
+            timings = {"duration_s": data["duration_s"]}
+        print(f"   {'этап':<20}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for stage, stats in timings.items():
+            if stats["count"]:
+                print(f"   {stage:<20}{stats['count']:>7}{stats['p50']:>10.3f}{stats['p95']:>10.3f}"
+                      f"{stats['p99']:>10.3f}{stats['max']:>10.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", type=Path, help="Файлы лога (по умолчанию REQUEST_LOG_PATH)")
+    parser.add_argument("--since", help="Учитывать записи не раньше этой даты (ISO)")
+    parser.add_argument("--json", action="store_true", help="Вывести отчёт в JSON")
+    args = parser.parse_args()
+
+    report = analyze(read_records(args.files or default_files()), args.since)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    elif not report:
+        print("Записей не найдено")
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
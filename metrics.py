@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Tuple
+
+from config import METRICS_BUCKETS
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+    """Счётчики, гистограммы и гейджи процесса в текстовом формате Prometheus.
+
+    inc() и observe() дёшевы и потокобезопасны, их можно звать на горячем пути.
+    Гейджи и счётчики, которые уже ведутся в других объектах (глубина очереди,
+    статистика кэша), регистрируются колбэком и читаются только при выдаче /metrics.
+    """
+
+    def __init__(self, buckets: tuple = METRICS_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._meta = {}  # имя -> (тип, описание)
+        self._counters = defaultdict(float)  # (имя, метки) -> значение
+        self._histograms = {}  # (имя, метки) -> [счётчики корзин..., сумма, количество]
+        self._callbacks: Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            data = self._histograms.get(key)
+            if data is None:
+                data = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def register(self, name: str, kind: str, help_text: str, fn: Callable[[], float]) -> None:
+        """Метрика, значение которой берётся из fn() при каждом чтении"""
+        self.describe(name, kind, help_text)
+        self._callbacks[name] = fn
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(data) for key, data in self._histograms.items()}
+        histogram_names = {name for name, _ in histograms}
+        for name in sorted({name for name, _ in counters} | histogram_names | set(self._callbacks)):
+            kind, help_text = self._meta.get(name, ("histogram" if name in histogram_names else "counter", ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if name in self._callbacks:
+                try:
+                    lines.append(f"{name} {_format_value(self._callbacks[name]())}")
+                except Exception as e:
+                    print(f"Ошибка метрики {name}: {e}")
+                continue
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for (metric, labels), data in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(self.buckets, data):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {data[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(data[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {data[-1]}")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host: str, port: int) -> None:
+        """Отдаёт GET /metrics на host:port"""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        print(f"Метрики: http://{host}:{port}/metrics")
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            method, path = head.decode("latin-1").split(" ")[:2]
+            if method == "GET" and path.split("?")[0] == "/metrics":
+                body = self.render().encode("utf-8")
+                status = b"200 OK"
+            else:
+                body, status = b"not found\n", b"404 Not Found"
+            writer.write(b"HTTP/1.1 %s\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         b"Content-Length: %d\r\nConnection: close\r\n\r\n%s" % (status, len(body), body))
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
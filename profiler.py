@@ -0,0 +1,112 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Tuple
+
+from config import BASE_DIR, PROFILE_DIR, PROFILE_INTERVAL
+
+PROFILE_MODES = ("sample", "cprofile")
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер всех потоков процесса.
+
+    Раз в interval секунд фоновый поток снимает стеки через sys._current_frames()
+    и считает одинаковые. Накладные расходы почти не зависят от нагрузки,
+    поэтому его можно включать в проде. Результат пишется в формате collapsed
+    («a;b;c 12» на строку), как у py-spy record -f raw: его понимают
+    flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update((thread.ident, thread.name) for thread in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def dump(self, path: Path) -> None:
+        with open(path, "w", encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, limit: int = 15) -> List[Tuple[str, float]]:
+        """Функции проекта по доле сэмплов, в которых они были на стеке"""
+        own_files = {path.name for path in BASE_DIR.glob("*.py")}
+        inclusive = Counter()
+        for stack, count in self.stacks.items():
+            frames = {frame for frame in stack.split(";")[1:]
+                      if frame.rsplit("(", 1)[-1].split(":")[0] in own_files}
+            for frame in frames:
+                inclusive[frame] += count
+        total = max(1, self.samples)
+        return [(frame, count / total) for frame, count in inclusive.most_common(limit)]
+
+
+async def run_profile(seconds: float, mode: str = "sample", directory: Path = PROFILE_DIR) -> Tuple[Path, str]:
+    """Профилирует процесс seconds секунд; возвращает (файл дампа, краткую сводку).
+
+    sample — стеки всех потоков (включая asyncio.to_thread) в формате collapsed;
+    cprofile — детерминированный cProfile потока цикла событий, дамп .pstats
+    (python -m pstats, snakeviz).
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if mode == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+        path = directory / f"profile-{stamp}.pstats"
+        profile.dump_stats(str(path))
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(15)
+        return path, out.getvalue()
+
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await asyncio.to_thread(profiler.stop)
+    path = directory / f"profile-{stamp}.collapsed"
+    profiler.dump(path)
+    lines = [f"{share:6.1%}  {frame}" for frame, share in profiler.top()]
+    return path, f"Сэмплов: {profiler.samples}\n" + "\n".join(lines)
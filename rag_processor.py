@@ -1,170 +1,456 @@
+import asyncio
+import hashlib
+import json
 import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings  # Новый импорт
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import TextLoader, UnstructuredMarkdownLoader
-from config import DATA_DIR, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDINGS_MODEL, VECTOR_DB_PATH
+import numpy as np
+from document_loaders import split_files
+from embedding_pipeline import EmbeddingPipeline
+from index_store import IndexStore, MemoryIndexStore
+from reranker import CrossEncoderReranker, deduplicate, pack
+from lexical_index import LexicalIndex, normalize_question, parse_article_refs, reciprocal_rank_fusion
+from config import (
+    DATA_DIR, ARTICLE_MAX_CHARS, CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDINGS_MODEL, VECTOR_DB_PATH,
+    HYBRID_FETCH_K, QUERY_EMBEDDING_CACHE_SIZE, INGEST_WORKERS,
+    VECTOR_INDEX_FACTORY, VECTOR_INDEX_NPROBE, VECTOR_INDEX_EF_SEARCH,
+    RETRIEVAL_FETCH_K, RETRIEVAL_MAX_DOCS, RETRIEVAL_TOKEN_BUDGET, RERANK_MODEL
+)
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 3
 
 
 class RAGProcessor:
-    def __init__(self):
-        # Инициализация с новой версией HuggingFaceEmbeddings
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=EMBEDDINGS_MODEL,
-            model_kwargs={'device': 'cpu'},  # или 'cuda'
-            encode_kwargs={'normalize_embeddings': True}  # Улучшает качество
-        )
-        self.vector_db = None
+    def __init__(self, db_path: Path = VECTOR_DB_PATH):
+        self.db_path = Path(db_path)
+        # Модель эмбеддингов (torch + sentence-transformers) грузится лениво,
+        # при первом обращении к self.embeddings или в load_embeddings()
+        self._embeddings = None
+        self._embeddings_lock = threading.Lock()
+        self.store = None
+        self.lexical_index = LexicalIndex()
+        # LRU эмбеддингов запросов: нормализованный текст -> вектор
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self.reranker = CrossEncoderReranker(RERANK_MODEL) if RERANK_MODEL else None
+        self.stats = {"embed_hits": 0, "embed_misses": 0, "embed_s": 0.0, "lookup_s": 0.0,
+                      "vector_search_s": 0.0, "lexical_search_s": 0.0, "dedupe_s": 0.0,
+                      "rerank_s": 0.0, "pack_s": 0.0, "retrievals": 0}
+        self.startup_timings = {}
+
+    @property
+    def embeddings(self):
+        """Модель эмбеддингов; при первом обращении загружается"""
+        if self._embeddings is None:
+            self.load_embeddings()
+        return self._embeddings
+
+    @property
+    def embeddings_ready(self) -> bool:
+        return self._embeddings is not None
+
+    def load_embeddings(self) -> None:
+        """Загружает и прогревает модель эмбеддингов (потокобезопасно)"""
+        with self._embeddings_lock:
+            if self._embeddings is not None:
+                return
+            start = time.perf_counter()
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            embeddings = HuggingFaceEmbeddings(
+                model_name=EMBEDDINGS_MODEL,
+                model_kwargs={'device': 'cpu'},  # или 'cuda'
+                encode_kwargs={'normalize_embeddings': True}  # Улучшает качество
+            )
+            self.startup_timings["model_load_s"] = time.perf_counter() - start
+            start = time.perf_counter()
+            embeddings.embed_query("прогрев")
+            self.startup_timings["model_warmup_s"] = time.perf_counter() - start
+            self._embeddings = embeddings
 
     def _ensure_vector_db_dir(self):
         """Создаёт папку для векторной БД"""
-        os.makedirs(VECTOR_DB_PATH, exist_ok=True)
-        return VECTOR_DB_PATH
+        os.makedirs(self.db_path, exist_ok=True)
+        return self.db_path
+
+    @staticmethod
+    def _index_settings() -> dict:
+        """Параметры, при изменении которых индекс строится заново"""
+        return {
+            "version": MANIFEST_VERSION,
+            "embeddings_model": EMBEDDINGS_MODEL,
+            "article_max_chars": ARTICLE_MAX_CHARS,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+        }
+
+    def _load_manifest(self, db_path: Path) -> dict:
+        """Читает манифест хешей; при несовпадении настроек возвращает пустой"""
+        try:
+            with open(db_path / MANIFEST_FILE, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("settings") != self._index_settings():
+            print("Настройки индекса изменились. Индекс будет перестроен.")
+            return {}
+        return manifest
+
+    def _save_manifest(self, db_path: Path, files: dict) -> None:
+        manifest = {"settings": self._index_settings(), "files": files}
+        tmp_path = db_path / (MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, db_path / MANIFEST_FILE)
+
+    @staticmethod
+    def _file_hash(file_path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _scan_data_dir(self) -> dict:
+        """Возвращает {относительный путь: путь} для всех файлов в DATA_DIR"""
+        files = {}
+        for root, _, names in os.walk(DATA_DIR):
+            for name in names:
+                file_path = Path(root) / name
+                files[file_path.relative_to(DATA_DIR).as_posix()] = file_path
+        return files
 
     def load_and_process_documents(self):
-        """Загружает и обрабатывает документы"""
+        """Загружает индекс и переэмбеддит только новые и изменённые чанки"""
+        start = time.perf_counter()
+        try:
+            self._load_and_process_documents()
+        finally:
+            self.startup_timings["index_load_s"] = time.perf_counter() - start
+
+    def _load_and_process_documents(self):
         if not os.path.exists(DATA_DIR):
             os.makedirs(DATA_DIR, exist_ok=True)
             print(f"Папка {DATA_DIR} создана. Добавьте документы.")
             return
 
         db_path = self._ensure_vector_db_dir()
+        manifest = self._load_manifest(db_path)
 
-        # Пробуем загрузить существующую БД с новым параметром безопасности
-        try:
-            if os.path.exists(db_path / "index.faiss"):
-                self.vector_db = FAISS.load_local(
-                    db_path,
-                    self.embeddings,
-                    allow_dangerous_deserialization=True  # Разрешаем загрузку pickle
-                )
-                return
-        except Exception as e:
-            print(f"Ошибка загрузки БД: {e}. Создаём новую.")
+        # Индекс открывается через mmap, тексты чанков читаются из SQLite по требованию
+        old_store = IndexStore.open(db_path) if manifest else None
+        if manifest and old_store is None:
+            print("Индекс не найден или повреждён. Создаём новый.")
+        old_files = manifest.get("files", {}) if old_store else {}
 
-        # Обработка документов
-        documents = []
-        for root, _, files in os.walk(DATA_DIR):
-            for file in files:
-                file_path = Path(root) / file
-                try:
-                    if file.endswith('.md'):
-                        loader = UnstructuredMarkdownLoader(str(file_path))
-                    else:
-                        loader = TextLoader(str(file_path), encoding='utf-8')
-                    documents.extend(loader.load())
-                except Exception as e:
-                    print(f"Ошибка загрузки {file_path}: {e}")
-                    continue
-
-        if not documents:
+        # Сравниваем хеши файлов с манифестом
+        new_files = {}
+        changed = []
+        for rel_path, file_path in sorted(self._scan_data_dir().items()):
+            try:
+                file_hash = self._file_hash(file_path)
+            except Exception as e:
+                print(f"Ошибка загрузки {file_path}: {e}")
+                if rel_path in old_files:
+                    new_files[rel_path] = old_files[rel_path]
+                continue
+            old_entry = old_files.get(rel_path)
+            if old_entry and old_entry["hash"] == file_hash:
+                new_files[rel_path] = old_entry
+                continue
+            new_files[rel_path] = {"hash": file_hash, "chunks": []}
+            changed.append((rel_path, file_path))
+
+        # Новые и изменённые файлы разбираются параллельно, каждый со своей обработкой ошибок
+        added = {}
+        removed_ids = []
+        for rel_path, file_path, chunks in split_files(changed, INGEST_WORKERS):
+            old_entry = old_files.get(rel_path)
+            if isinstance(chunks, Exception):
+                print(f"Ошибка загрузки {file_path}: {chunks}")
+                # Оставляем прежние векторы файла, если они были
+                if old_entry:
+                    new_files[rel_path] = old_entry
+                else:
+                    del new_files[rel_path]
+                continue
+
+            old_ids = set(old_entry["chunks"]) if old_entry else set()
+            removed_ids.extend(old_ids - chunks.keys())
+            added.update({cid: doc for cid, doc in chunks.items() if cid not in old_ids})
+            new_files[rel_path]["chunks"] = list(chunks)
+
+        for rel_path in old_files.keys() - new_files.keys():
+            removed_ids.extend(old_files[rel_path]["chunks"])
+
+        if not new_files:
             print("Нет документов для обработки.")
             return
 
-        # Разделение на чанки
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP
-        )
-        chunks = text_splitter.split_documents(documents)
+        if not (added or removed_ids) and old_store:
+            if new_files != old_files:
+                # Хеш файла сменился, а чанки нет (например, правка пробелов): без нового
+                # манифеста файл разбирался бы заново при каждом запуске
+                try:
+                    self._save_manifest(db_path, new_files)
+                except OSError as e:
+                    print(f"Ошибка сохранения манифеста: {e}")
+            self.store = self._ensure_ann(old_store)
+            self.lexical_index = (LexicalIndex.load(db_path, self._generation())
+                                  or self._build_lexical_index(db_path))
+            return
+
+        print(f"Обновление индекса: +{len(added)} / -{len(removed_ids)} чанков")
+        pipeline = None
+        new_vectors = {}
+        if added:
+            # Модель грузится лениво: при EMBED_WORKERS > 1 её копии есть только в процессах пула
+            pipeline = EmbeddingPipeline(lambda: self.embeddings, db_path, self._index_settings())
+            new_vectors = self._embed_chunks(pipeline, added)
+            print(pipeline.report())
+
+        # Собираем новое поколение: сохранённые векторы из старого индекса + новые
+        order = [cid for entry in new_files.values() for cid in entry["chunks"]]
+        if not order:
+            print("В документах не найдено текста для индексации.")
+            return
+        old_positions = old_store.positions() if old_store else {}
+        old_docs = {}
+        if old_store:
+            kept = set(order) - added.keys()
+            old_docs = {doc_id: (text, metadata)
+                        for doc_id, text, metadata in old_store.iter_documents() if doc_id in kept}
+        dim = old_store.vectors.shape[1] if old_store else len(next(iter(new_vectors.values())))
+        vectors = np.empty((len(order), dim), dtype=np.float32)
+        docs = []
+        for pos, cid in enumerate(order):
+            if cid in added:
+                vectors[pos] = new_vectors[cid]
+                docs.append((cid, added[cid].page_content, added[cid].metadata))
+            else:
+                vectors[pos] = old_store.vectors[old_positions[cid]]
+                docs.append((cid, *old_docs[cid]))
 
-        # Создание и сохранение БД
+        # Сохранение БД и манифеста
         try:
-            self.vector_db = FAISS.from_documents(chunks, self.embeddings)
-            self.vector_db.save_local(db_path)
+            self.store = IndexStore.write(db_path, vectors, docs, self._index_settings(), VECTOR_INDEX_FACTORY)
+            self.store.tune(VECTOR_INDEX_NPROBE, VECTOR_INDEX_EF_SEARCH)
+            self._save_manifest(db_path, new_files)
+            if pipeline:
+                pipeline.clear_checkpoint()
+            self._remove_legacy_index(db_path)
             print(f"Данные сохранены в {db_path}")
         except Exception as e:
-            print(f"Ошибка сохранения: {e}")
-            self.vector_db = FAISS.from_documents(chunks, self.embeddings)
+            # Свежие векторы работают из памяти до перезапуска, а на диске остаются
+            # в чекпоинте, так что следующий запуск не будет считать их заново
+            print(f"Ошибка сохранения индекса, он будет работать из памяти до перезапуска: {e}")
+            self.store = MemoryIndexStore(vectors, docs, self._index_settings())
+
+        if old_store is not None and old_store is not self.store:
+            old_store.close()
+        self.lexical_index = self._build_lexical_index(db_path)
+
+    @staticmethod
+    def _ensure_ann(store: IndexStore) -> IndexStore:
+        """Перестраивает приближённый индекс, если в config.py сменили фабрику"""
+        if store.ann_factory != VECTOR_INDEX_FACTORY:
+            print(f"Перестройка векторного индекса: {store.ann_factory} -> {VECTOR_INDEX_FACTORY}")
+            try:
+                new_store = store.with_ann(VECTOR_INDEX_FACTORY)
+                store.close()
+                store = new_store
+            except Exception as e:
+                print(f"Ошибка построения индекса {VECTOR_INDEX_FACTORY}: {e}")
+        store.tune(VECTOR_INDEX_NPROBE, VECTOR_INDEX_EF_SEARCH)
+        return store
+
+    def _generation(self) -> str:
+        """Поколение индекса, под которое построен BM25"""
+        return self.store.header["chunks_file"] if self.store else ""
+
+    @staticmethod
+    def _remove_legacy_index(db_path: Path) -> None:
+        """Удаляет индекс старого формата LangChain (index.faiss + pickle)"""
+        for name in ("index.faiss", "index.pkl", "lexical.json"):
+            try:
+                (db_path / name).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _build_lexical_index(self, db_path: Path) -> LexicalIndex:
+        """Строит BM25 и словарь статей по всем чанкам индекса"""
+        index = LexicalIndex.build(self.store.iter_documents(), self._generation())
+        self.lexical_index.close()
+        try:
+            index.save(db_path)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Ошибка сохранения BM25-индекса: {e}")
+        return index
+
+    def _embed_chunks(self, pipeline: EmbeddingPipeline, chunks: dict) -> dict:
+        """Считает эмбеддинги чанков батчами, возвращает {id: вектор}"""
+        ids = list(chunks)
+        vectors = {}
+        for batch_ids, batch_vectors in pipeline.run(ids, [chunks[cid].page_content for cid in ids]):
+            vectors.update(zip(batch_ids, batch_vectors))
+        return vectors
+
+    @staticmethod
+    def format_snippet(doc) -> str:
+        """Фрагмент для промпта со ссылкой на закон и статью"""
+        citation = doc.metadata.get("citation")
+        return f"[{citation}]\n{doc.page_content}" if citation else doc.page_content
+
+    def _get_documents(self, ids: list) -> list:
+        return self.store.get(ids)
+
+    def embed_query(self, query: str, timings: dict = None) -> list:
+        """Эмбеддинг запроса с LRU-кэшем по нормализованному тексту"""
+        key = normalize_question(query)
+        start = time.perf_counter()
+        with self._query_cache_lock:
+            vector = self._query_cache.get(key)
+            if vector is not None:
+                self._query_cache.move_to_end(key)
+                self.stats["embed_hits"] += 1
+        if vector is None:
+            vector = self.embeddings.embed_query(query)
+            self._cache_query_vectors({key: vector})
+        self._record(timings, "embed_s", start)
+        return vector
+
+    def embed_queries(self, queries: list, timings: dict = None) -> list:
+        """Эмбеддинги нескольких запросов одним проходом модели, через тот же LRU-кэш.
+
+        Для модели без инструкций запроса embed_documents даёт те же векторы,
+        что и embed_query, но кодирует весь батч сразу.
+        """
+        keys = [normalize_question(query) for query in queries]
+        start = time.perf_counter()
+        vectors = {}
+        with self._query_cache_lock:
+            for key in keys:
+                vector = self._query_cache.get(key)
+                if vector is not None:
+                    self._query_cache.move_to_end(key)
+                    vectors[key] = vector
+        missing = {key: query for key, query in zip(keys, queries) if key not in vectors}
+        with self._query_cache_lock:
+            # Повтор вопроса внутри батча тоже попадание: модель считает его один раз
+            self.stats["embed_hits"] += len(keys) - len(missing)
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+            self._cache_query_vectors(computed)
+            vectors.update(computed)
+        self._record(timings, "embed_s", start)
+        return [vectors[key] for key in keys]
+
+    def _cache_query_vectors(self, vectors: dict) -> None:
+        with self._query_cache_lock:
+            for key, vector in vectors.items():
+                self._query_cache[key] = vector
+                self.stats["embed_misses"] += 1
+            while len(self._query_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+
+    def _record(self, timings: dict, stage: str, start: float) -> None:
+        """Добавляет длительность этапа в общую статистику и в timings запроса"""
+        elapsed = time.perf_counter() - start
+        self.stats[stage] += elapsed
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+    def retrieve(self, query: str, k: int = 3, timings: dict = None,
+                 budget: int = None, query_vector: list = None) -> tuple:
+        """Гибридный поиск: точные ссылки на статьи, BM25 и векторы (RRF).
+
+        Возвращает (документы, эмбеддинг запроса); эмбеддинг равен None,
+        если ответ найден по точной ссылке без кодирования запроса.
+        Длительности этапов добавляются в timings, если он передан.
+        Пока модель эмбеддингов не загружена, поиск идёт только по BM25.
+        Если задан budget, кандидаты отбираются с запасом и проходят
+        через _select_passages: не больше k фрагментов в пределах budget токенов.
+        query_vector — эмбеддинг, уже посчитанный вызывающим (батч embed_queries).
+        """
+        if not self.store:
+            return [], None
+        self.stats["retrievals"] += 1
+        fetch_n = max(k, RETRIEVAL_FETCH_K) if budget else k
+
+        # Явная ссылка "ст. 158 УК" — отвечаем из словаря без эмбеддинга запроса
+        start = time.perf_counter()
+        exact = self.lexical_index.lookup_articles(parse_article_refs(query))
+        self._record(timings, "lookup_s", start)
+        if exact:
+            # Порядок статей задан вопросом — без переранжирования
+            return self._select_passages(query, exact[:fetch_n], k, budget, timings, rerank=False), None
+
+        fetch_k = max(fetch_n, HYBRID_FETCH_K)
+        if not self.embeddings_ready and self.lexical_index:
+            # Модель ещё загружается (быстрый старт) — отвечаем по BM25
+            start = time.perf_counter()
+            lexical_ids = self.lexical_index.search(query, fetch_n)
+            self._record(timings, "lexical_search_s", start)
+            return self._select_passages(query, lexical_ids, k, budget, timings), None
+
+        if query_vector is None:
+            query_vector = self.embed_query(query, timings)
+        start = time.perf_counter()
+        vector_ids = [doc_id for doc_id, _ in self.store.search(query_vector, fetch_k)]
+        self._record(timings, "vector_search_s", start)
+        if not self.lexical_index:
+            return self._select_passages(query, vector_ids[:fetch_n], k, budget, timings), query_vector
+
+        start = time.perf_counter()
+        lexical_ids = self.lexical_index.search(query, fetch_k)
+        self._record(timings, "lexical_search_s", start)
+        fused = reciprocal_rank_fusion([vector_ids, lexical_ids])[:fetch_n]
+        return self._select_passages(query, fused, k, budget, timings), query_vector
+
+    def _select_passages(self, query: str, ids: list, k: int, budget: int = None,
+                         timings: dict = None, rerank: bool = True) -> list:
+        """Дедупликация, переранжирование cross-encoder и упаковка в бюджет токенов"""
+        docs = self._get_documents(ids)
+        if not budget:
+            return docs[:k]
+        start = time.perf_counter()
+        docs = deduplicate(docs)
+        self._record(timings, "dedupe_s", start)
+        if rerank and self.reranker is not None:
+            start = time.perf_counter()
+            docs = self.reranker.rerank(query, docs)
+            self._record(timings, "rerank_s", start)
+        start = time.perf_counter()
+        docs = pack(docs, budget, k)
+        self._record(timings, "pack_s", start)
+        return docs
+
+    async def aretrieve(self, query: str, k: int = RETRIEVAL_MAX_DOCS, timings: dict = None,
+                        budget: int = RETRIEVAL_TOKEN_BUDGET) -> tuple:
+        """Отбор фрагментов для промпта в отдельном потоке, чтобы не блокировать цикл событий бота"""
+        return await asyncio.to_thread(self.retrieve, query, k, timings, budget)
+
+    def search(self, query: str, k: int = 3) -> list:
+        """Документы гибридного поиска"""
+        return self.retrieve(query, k)[0]
 
     def search_relevant_documents(self, query: str, k: int = 3):
         """Поиск релевантных документов"""
-        return [doc.page_content for doc in self.vector_db.similarity_search(query, k=k)] if self.vector_db else []
-
-
-# import re
-# from typing import List, Dict
-# from langchain.docstore.document import Document
-
-
-# class LawTextProcessor:
-#     @staticmethod
-#     def split_by_articles(text: str, law_name: str) -> List[Dict]:
-#         """Разбивает текст закона на статьи с сохранением метаданных"""
-#         pattern = r"(Статья \d+\.?\s*.+?)(?=(Статья \d+|$))"
-#         articles = re.findall(pattern, text, re.DOTALL)
-
-#         result = []
-#         for article in articles:
-#             article_text = article[0].strip()
-#             article_num = re.search(r"Статья (\d+\.?\d*)", article_text).group(1)
-#             result.append({
-#                 "text": article_text,
-#                 "metadata": {
-#                     "law": law_name,
-#                     "article": article_num,
-#                     "source": f"{law_name} Ст. {article_num}"
-#                 }
-#             })
-#         return result
-
-# class RAGProcessor:
-#     def __init__(self):
-#         self.embeddings = HuggingFaceEmbeddings(model_name=EMBEDDINGS_MODEL)
-#         self.vector_db = None
-
-#     def load_and_process_documents(self):
-#         """Обрабатывает юридические документы с разделением по статьям"""
-#         if not os.path.exists(DATA_DIR):
-#             os.makedirs(DATA_DIR)
-#             return
-
-#         documents = []
-#         for file in os.listdir(DATA_DIR):
-#             file_path = os.path.join(DATA_DIR, file)
-#             try:
-#                 with open(file_path, 'r', encoding='utf-8') as f:
-#                     text = f.read()
-
-#                 # Извлекаем название закона из имени файла
-#                 law_name = os.path.splitext(file)[0]
-
-#                 # Разбиваем текст на статьи
-#                 articles = LawTextProcessor.split_by_articles(text, law_name)
-
-#                 for article in articles:
-#                     doc = Document(
-#                         page_content=article["text"],
-#                         metadata=article["metadata"]
-#                     )
-#                     documents.append(doc)
-
-#             except Exception as e:
-#                 print(f"Ошибка обработки файла {file}: {str(e)}")
-
-#         if documents:
-#             text_splitter = RecursiveCharacterTextSplitter(
-#                 chunk_size=CHUNK_SIZE,
-#                 chunk_overlap=CHUNK_OVERLAP
-#             )
-#             chunks = text_splitter.split_documents(documents)
-#             self.vector_db = FAISS.from_documents(chunks, self.embeddings)
-#             self.vector_db.save_local(VECTOR_DB_PATH)
-
-#     def search_relevant_documents(self, query: str, k: int = 3) -> List[str]:
-#         if not self.vector_db:
-#             return []
-
-#         docs = self.vector_db.similarity_search(query, k=k)
-
-#         results = []
-#         for doc in docs:
-#             law = doc.metadata.get("law", "Закон")
-#             article = doc.metadata.get("article", "N/A")
-#             results.append(
-#                 f"📖 {law}\n"
-#                 f"📝 Статья {article}\n"
-#                 f"📄 {doc.page_content[:300]}..."
-#             )
-#         return results
+        return [self.format_snippet(doc) for doc in self.search(query, k)]
+
+    def startup_report(self) -> str:
+        """Длительности этапов запуска"""
+        names = {"index_load_s": "индекс", "model_load_s": "модель", "model_warmup_s": "прогрев"}
+        return ", ".join(f"{names[key]} {self.startup_timings[key]:.2f} с"
+                         for key in names if key in self.startup_timings)
+
+
+if __name__ == "__main__":
+    # Сборка/обновление индекса без запуска бота: python rag_processor.py
+    rag = RAGProcessor()
+    rag.load_and_process_documents()
+    print(f"Запуск: {rag.startup_report()}")
@@ -0,0 +1,85 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from config import (
+    REQUEST_LOG_PATH, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE
+)
+
+
+class RequestLogger:
+    """Фоновая запись структурированного лога запросов в JSONL.
+
+    log() только кладёт запись в очередь и не блокирует цикл событий.
+    Отдельный поток сбрасывает записи пачками — при накоплении LOG_BATCH_SIZE
+    записей или раз в LOG_FLUSH_INTERVAL секунд — и ротирует файл по размеру.
+    """
+
+    def __init__(self, path: Path = REQUEST_LOG_PATH, batch_size: int = LOG_BATCH_SIZE,
+                 flush_interval: float = LOG_FLUSH_INTERVAL, max_bytes: int = LOG_MAX_BYTES,
+                 backup_count: int = LOG_BACKUP_COUNT):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-log", daemon=True)
+        self._thread.start()
+
+    def log(self, record: dict) -> None:
+        """Ставит запись в очередь; при переполнении запись отбрасывается"""
+        record.setdefault("ts", datetime.now().isoformat())
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Дописывает очередь и останавливает поток"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline or self._stop.is_set():
+                if batch:
+                    self._write(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch: list) -> None:
+        lines = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in batch)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.path.exists() and self.path.stat().st_size + len(lines) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "a", encoding='utf-8') as f:
+                f.write(lines)
+        except OSError as e:
+            print(f"Ошибка записи лога: {e}")
+
+    def _rotate(self) -> None:
+        """logs.jsonl -> logs.jsonl.1 -> ... -> logs.jsonl.N"""
+        for index in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
@@ -0,0 +1,130 @@
+import re
+import threading
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from config import RERANK_MODEL, RERANK_BATCH_SIZE, DEDUP_OVERLAP, CHUNK_OVERLAP
+from context_store import estimate_tokens
+
+SHINGLE_SIZE = 4  # Слов в шингле для поиска почти одинаковых чанков
+MIN_OVERLAP_CHARS = 40  # Короче — совпадение краёв чанков считаем случайным
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _shingles(text: str) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _edge_overlap(head: str, tail: str) -> int:
+    """Длина конца head, с которого начинается tail (перекрытие соседних чанков сплиттера)"""
+    probe = tail[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    pos = head.find(probe, max(0, len(head) - CHUNK_OVERLAP * 2))
+    while pos != -1:
+        if tail.startswith(head[pos:]):
+            return len(head) - pos
+        pos = head.find(probe, pos + 1)
+    return 0
+
+
+def deduplicate(docs: List[Document], threshold: float = DEDUP_OVERLAP) -> List[Document]:
+    """Убирает дубли и почти дубли, у соседних чанков вырезает общий перекрывающийся текст.
+
+    Порядок (ранг) сохраняется: из похожих чанков остаётся тот, что выше.
+    """
+    kept = []
+    kept_shingles = []
+    for doc in docs:
+        if any(doc.id is not None and doc.id == other.id for other in kept):
+            continue
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / max(1, min(len(shingles), len(other))) >= threshold
+               for other in kept_shingles):
+            continue
+        text = doc.page_content
+        for other in kept:
+            if other.metadata.get("source") != doc.metadata.get("source"):
+                continue
+            # Перекрытие с уже взятым чанком: оставляем только новый текст
+            cut = _edge_overlap(other.page_content, text)
+            if cut:
+                text = text[cut:].lstrip()
+            cut = _edge_overlap(text, other.page_content)
+            if cut:
+                text = text[:-cut].rstrip()
+        if not text.strip():
+            continue
+        if text != doc.page_content:
+            doc = Document(id=doc.id, page_content=text, metadata=doc.metadata)
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def pack(docs: List[Document], budget: int, max_docs: int) -> List[Document]:
+    """Берёт лучшие фрагменты по порядку, пока они влезают в бюджет токенов.
+
+    Фрагмент, не влезающий целиком, пропускается в пользу следующих; если
+    не влез ни один, первый обрезается под бюджет.
+    """
+    packed = []
+    for doc in docs:
+        if len(packed) >= max_docs:
+            break
+        tokens = estimate_tokens(doc.page_content)
+        if tokens <= budget:
+            packed.append(doc)
+            budget -= tokens
+    if not packed and docs and budget > 0:
+        doc = docs[0]
+        chars = budget * len(doc.page_content) // estimate_tokens(doc.page_content)
+        packed.append(Document(id=doc.id, page_content=doc.page_content[:chars].rstrip() + "…",
+                               metadata=doc.metadata))
+    return packed
+
+
+class CrossEncoderReranker:
+    """Переранжирование кандидатов небольшим cross-encoder на CPU.
+
+    Модель грузится лениво при первом вызове (или заранее через load()).
+    Пары (вопрос, фрагмент) оцениваются батчами; вызывать из рабочего потока,
+    не из цикла событий. Без sentence-transformers этап отключается.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL, batch_size: int = RERANK_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    def load(self) -> Optional[object]:
+        with self._lock:
+            if self._model is None and not self._failed:
+                try:
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+                except Exception as e:
+                    self._failed = True
+                    print(f"Переранжирование отключено, модель {self.model_name} не загружена: {e}")
+        return self._model
+
+    def rerank(self, query: str, docs: List[Document]) -> List[Document]:
+        """Документы по убыванию оценки cross-encoder (без модели — в исходном порядке)"""
+        model = self.load()
+        if model is None or len(docs) < 2:
+            return docs
+        scores = model.predict([(query, doc.page_content) for doc in docs], batch_size=self.batch_size)
+        order = sorted(range(len(docs)), key=lambda i: -float(scores[i]))
+        return [docs[i] for i in order]
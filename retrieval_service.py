@@ -0,0 +1,288 @@
+"""Локальный сервис поиска: один прогретый индекс и одна модель на несколько процессов бота.
+
+    python retrieval_service.py [--listen http://127.0.0.1:8765 | unix:///путь/к/сокету]
+
+Протокол — HTTP/1.1 с JSON:
+    POST /retrieve {"query": ..., "k": 4, "budget": 1000} -> {"docs": [...], "vector": [...], "timings": {...}}
+    GET /health -> {"ready": ..., "embeddings_ready": ..., "stats": {...}}
+Одновременные вопросы собираются в батч, и их эмбеддинги считаются одним проходом модели.
+Бот ходит в сервис через RetrievalClient, если задан RETRIEVAL_SERVICE_URL.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+from langchain_core.documents import Document
+
+from lexical_index import parse_article_refs
+from rag_processor import RAGProcessor
+from config import (
+    RETRIEVAL_SERVICE_URL, RETRIEVAL_SERVICE_TIMEOUT, RETRIEVAL_BATCH_SIZE, RETRIEVAL_BATCH_WINDOW,
+    RETRIEVAL_MAX_DOCS, RETRIEVAL_TOKEN_BUDGET
+)
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+MAX_BODY = 1 << 20  # Вопросы длиннее мегабайта не принимаем
+
+
+class RetrievalError(Exception):
+    """Сервис поиска недоступен или вернул ошибку"""
+
+
+def parse_address(url: str) -> tuple:
+    """(путь к unix-сокету или None, хост, порт) из http://хост:порт или unix:///путь"""
+    parts = urlsplit(url)
+    if parts.scheme == "unix":
+        return parts.path, None, None
+    return None, parts.hostname or "127.0.0.1", parts.port or 80
+
+
+class QueryBatcher:
+    """Собирает одновременные вопросы в батч и обрабатывает его в рабочем потоке.
+
+    Пока идёт один батч, следующие вопросы копятся в очереди, поэтому
+    под нагрузкой батчи сами становятся крупнее. Эмбеддинги вопросов
+    считаются одним вызовом модели, дальше поиск идёт по кэшу эмбеддингов.
+    """
+
+    def __init__(self, rag: RAGProcessor, max_batch: int = RETRIEVAL_BATCH_SIZE,
+                 window: float = RETRIEVAL_BATCH_WINDOW):
+        self.rag = rag
+        self.max_batch = max_batch
+        self.window = window
+        self._pending = []  # (вопрос, k, бюджет, future)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.stats = {"batches": 0, "queries": 0, "embedded": 0, "max_batch": 0, "errors": 0}
+
+    async def submit(self, query: str, k: int, budget: Optional[int]) -> tuple:
+        """(документы, эмбеддинг вопроса, длительности этапов)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((query, k, budget, future))
+        self._wakeup.set()
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if len(self._pending) < self.max_batch:
+                await asyncio.sleep(self.window)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            if not self._pending:
+                self._wakeup.clear()
+            batch = [item for item in batch if not item[3].cancelled()]
+            if not batch:
+                continue
+            try:
+                results = await asyncio.to_thread(self._process, [item[:3] for item in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for (*_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _process(self, batch: list) -> list:
+        """Рабочий поток: общий проход модели по вопросам батча, затем поиск по каждому"""
+        self.stats["batches"] += 1
+        self.stats["queries"] += len(batch)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        # Вопросы со ссылкой на статью обычно находятся по словарю без эмбеддинга
+        to_embed = [query for query, _, _ in batch if not parse_article_refs(query)]
+        embed_timings = {}
+        vectors = {}
+        if to_embed and self.rag.embeddings_ready:
+            # Попадания и промахи кэша считает embed_queries; retrieve получает готовый вектор
+            vectors = dict(zip(to_embed, self.rag.embed_queries(to_embed, embed_timings)))
+            self.stats["embedded"] += len(to_embed)
+
+        results = []
+        for query, k, budget in batch:
+            timings = dict(embed_timings)
+            try:
+                docs, vector = self.rag.retrieve(query, k, timings, budget, vectors.get(query))
+                results.append((docs, vector, timings))
+            except Exception as e:
+                self.stats["errors"] += 1
+                results.append(e)
+        return results
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+class RetrievalService:
+    """HTTP-сервер поверх RAGProcessor (TCP или unix-сокет)"""
+
+    def __init__(self, rag: RAGProcessor = None, url: str = DEFAULT_URL):
+        self.rag = rag or RAGProcessor()
+        self.url = url
+        self.batcher = QueryBatcher(self.rag)
+        self._server = None
+
+    async def start(self) -> None:
+        """Загружает индекс и открывает сокет; модель догружается в фоне"""
+        await asyncio.to_thread(self.rag.load_and_process_documents)
+        path, host, port = parse_address(self.url)
+        if path:
+            self._server = await asyncio.start_unix_server(self._handle, path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        print(f"Сервис поиска слушает {self.url}")
+        # До загрузки модели поиск идёт по BM25 и точным ссылкам, как в боте при быстром старте
+        await asyncio.to_thread(self.rag.load_embeddings)
+        if self.rag.reranker is not None:
+            await asyncio.to_thread(self.rag.reranker.load)
+        print(f"Поиск готов: {self.rag.startup_report()}")
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        await self.batcher.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path = lines[0].split(" ")[:2]
+                headers = dict(line.lower().split(": ", 1) for line in lines[1:] if ": " in line)
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    await self._send(writer, 413, {"error": "слишком большой запрос"})
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._route(method, path, body)
+                await self._send(writer, status, payload)
+                if headers.get("connection") == "close":
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes) -> tuple:
+        if method == "GET" and path == "/health":
+            return 200, {"ready": self.rag.store is not None, "embeddings_ready": self.rag.embeddings_ready,
+                         "stats": {**self.batcher.stats, **self.rag.stats}}
+        if method != "POST" or path != "/retrieve":
+            return 404, {"error": f"нет метода {method} {path}"}
+        try:
+            request = json.loads(body)
+            query = str(request["query"])
+            k = int(request.get("k", RETRIEVAL_MAX_DOCS))
+            budget = request.get("budget", RETRIEVAL_TOKEN_BUDGET)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"некорректный запрос: {e}"}
+        try:
+            docs, vector, timings = await self.batcher.submit(query, k, budget)
+        except Exception as e:
+            print(f"Ошибка поиска: {e}")
+            return 500, {"error": str(e)}
+        return 200, {
+            "docs": [{"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata} for doc in docs],
+            "vector": [float(x) for x in vector] if vector is not None else None,
+            "timings": timings,
+        }
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                     % (status, b"OK" if status == 200 else b"Error", len(body), body))
+        await writer.drain()
+
+
+class RetrievalClient:
+    """Тонкий асинхронный клиент сервиса поиска с интерфейсом RAGProcessor.aretrieve"""
+
+    format_snippet = staticmethod(RAGProcessor.format_snippet)
+
+    def __init__(self, url: str = RETRIEVAL_SERVICE_URL, timeout: float = RETRIEVAL_SERVICE_TIMEOUT):
+        path, _, _ = parse_address(url)
+        if path:
+            self._client = httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(uds=path),
+                                             base_url="http://retrieval", timeout=timeout)
+        else:
+            self._client = httpx.AsyncClient(base_url=url, timeout=timeout)
+        self.url = url
+
+    async def _request(self, method: str, path: str, **kwargs) -> dict:
+        try:
+            response = await self._client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            raise RetrievalError(f"сервис поиска {self.url} недоступен: {e}") from e
+        if response.status_code != 200:
+            raise RetrievalError(f"сервис поиска вернул {response.status_code}: {response.text}")
+        return response.json()
+
+    async def aretrieve(self, query: str, k: int = RETRIEVAL_MAX_DOCS, timings: dict = None,
+                        budget: int = RETRIEVAL_TOKEN_BUDGET) -> tuple:
+        """(документы, эмбеддинг запроса) — как у RAGProcessor.aretrieve"""
+        data = await self._request("POST", "/retrieve", json={"query": query, "k": k, "budget": budget})
+        if timings is not None:
+            for stage, value in data.get("timings", {}).items():
+                timings[stage] = timings.get(stage, 0.0) + value
+        docs = [Document(id=doc["id"], page_content=doc["page_content"], metadata=doc["metadata"])
+                for doc in data["docs"]]
+        return docs, data.get("vector")
+
+    async def health(self) -> dict:
+        return await self._request("GET", "/health")
+
+    async def wait_ready(self, timeout: float, interval: float = 0.5) -> bool:
+        """Ждёт, пока сервис поднимется и загрузит индекс"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if (await self.health()).get("ready"):
+                    return True
+            except RetrievalError:
+                pass
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(interval)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+async def _serve(url: str) -> None:
+    service = RetrievalService(url=url)
+    try:
+        await service.serve_forever()
+    finally:
+        await service.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listen", default=RETRIEVAL_SERVICE_URL or DEFAULT_URL,
+                        help="http://хост:порт или unix:///путь/к/сокету")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args.listen))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
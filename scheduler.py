@@ -0,0 +1,141 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import Message
+
+from config import SCHEDULER_DEBOUNCE, SCHEDULER_MAX_ACTIVE, SCHEDULER_MAX_QUEUE
+
+# Обработчик вопроса: (user_id, сообщение для ответа, текст вопроса)
+Handler = Callable[[int, Message, str], Awaitable[None]]
+
+
+class UserState:
+    __slots__ = ("pending", "batch", "timer", "job", "queued")
+
+    def __init__(self):
+        self.pending: List[Tuple[Message, str]] = []  # Ещё не отправленные в работу сообщения
+        self.batch: List[Tuple[Message, str]] = []  # Сообщения, которые обрабатываются сейчас
+        self.timer: Optional[asyncio.Task] = None
+        self.job: Optional[asyncio.Task] = None
+        self.queued = False
+
+
+class RequestScheduler:
+    """Планировщик вопросов: по одному запросу на пользователя, общая очередь с честной долей.
+
+    - Сообщения, пришедшие подряд в пределах debounce, склеиваются в один вопрос.
+    - Новое сообщение отменяет ещё не завершённый ответ пользователю: его вопрос
+      объединяется с новым и обрабатывается заново.
+    - Одновременно обрабатывается не больше max_active вопросов; остальные ждут
+      в очереди, где у каждого пользователя не больше одного места, поэтому
+      активный пользователь не задерживает остальных. Позиция в очереди
+      сообщается пользователю, при переполнении очереди вопрос отклоняется.
+    """
+
+    def __init__(self, handler: Handler, max_active: int = SCHEDULER_MAX_ACTIVE,
+                 max_queue: int = SCHEDULER_MAX_QUEUE, debounce: float = SCHEDULER_DEBOUNCE):
+        self.handler = handler
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.debounce = debounce
+        self._users: Dict[int, UserState] = {}
+        self._ready = deque()  # user_id в порядке очереди
+        self._active = 0
+        self._closed = False  # После close() новые вопросы не принимаются и не запускаются
+        self.stats = {"submitted": 0, "coalesced": 0, "cancelled": 0, "queued": 0, "rejected": 0}
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._ready)
+
+    async def submit(self, user_id: int, message: Message, text: str) -> None:
+        """Принимает сообщение пользователя; ответ будет дан позже"""
+        if self._closed:
+            return
+        self.stats["submitted"] += 1
+        state = self._users.setdefault(user_id, UserState())
+        if state.pending or state.batch:
+            self.stats["coalesced"] += 1
+        state.pending.append((message, text))
+
+        if state.job is not None and not state.job.done() and state.batch:
+            # Вопрос устарел: отвечаем сразу на всё, что пользователь успел написать
+            state.pending = state.batch + state.pending
+            state.batch = []
+            state.job.cancel()
+            self.stats["cancelled"] += 1
+
+        if state.queued:
+            return  # Уже в очереди: новые сообщения уйдут вместе с остальными
+        if state.timer is not None:
+            state.timer.cancel()
+        state.timer = asyncio.create_task(self._debounce(user_id, state))
+
+    async def _debounce(self, user_id: int, state: UserState) -> None:
+        await asyncio.sleep(self.debounce)
+        state.timer = None
+        if state.job is None:  # Иначе поставим в очередь по завершении текущего ответа
+            await self._enqueue(user_id, state)
+
+    async def _enqueue(self, user_id: int, state: UserState) -> None:
+        if self._closed or not state.pending:
+            return
+        message = state.pending[-1][0]
+        if len(self._ready) >= self.max_queue:
+            self.stats["rejected"] += 1
+            state.pending = []
+            self._users.pop(user_id, None)
+            await message.reply_text("Сейчас слишком много вопросов. Пожалуйста, повторите через пару минут.")
+            return
+        state.queued = True
+        self._ready.append(user_id)
+        position = len(self._ready) if self._active >= self.max_active else 0
+        self._dispatch()
+        if position:
+            self.stats["queued"] += 1
+            await message.reply_text(f"Бот сейчас занят, вы {position}-й в очереди. Ответ придёт автоматически.")
+
+    def _dispatch(self) -> None:
+        while not self._closed and self._active < self.max_active and self._ready:
+            user_id = self._ready.popleft()
+            state = self._users[user_id]
+            state.queued = False
+            state.batch, state.pending = state.pending, []
+            self._active += 1
+            state.job = asyncio.create_task(self._run(user_id, state))
+
+    async def _run(self, user_id: int, state: UserState) -> None:
+        batch = state.batch
+        text = "\n".join(text for _, text in batch)
+        try:
+            await self.handler(user_id, batch[-1][0], text)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Ошибка обработки вопроса: {e}")
+        finally:
+            self._active -= 1
+            state.job = None
+            state.batch = []
+            if state.pending and state.timer is None:
+                # В конец очереди: остальные пользователи не ждут, пока этот допишет
+                await self._enqueue(user_id, state)
+            elif not state.pending and state.timer is None:
+                self._users.pop(user_id, None)
+            self._dispatch()
+
+    async def close(self) -> None:
+        """Отменяет ожидающие и выполняющиеся вопросы"""
+        # Отменённые ответы в finally не должны запускать вопросы из очереди
+        self._closed = True
+        self._ready.clear()
+        tasks = [task for state in self._users.values() for task in (state.timer, state.job) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._users.clear()
@@ -0,0 +1,82 @@
+"""Замер времени запуска бота: импорт модулей и этапы загрузки поиска.
+
+    python startup_benchmark.py [--runs 3] [--top 15]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+
+
+def measure_import(module: str, runs: int) -> dict:
+    """Время импорта модуля в чистом интерпретаторе и самые тяжёлые зависимости"""
+    walls = []
+    heaviest = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=BASE_DIR, capture_output=True, text=True
+        )
+        walls.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            if depth == 1:  # Прямые зависимости замеряемого модуля
+                heaviest[name.strip()] = max(heaviest.get(name.strip(), 0), int(cumulative) / 1e6)
+    return {"module": module, "wall_s": round(min(walls), 3), "heaviest": heaviest}
+
+
+def measure_phases() -> dict:
+    """Этапы запуска RAGProcessor в текущем процессе"""
+    from rag_processor import RAGProcessor
+
+    phases = {}
+    start = time.perf_counter()
+    rag = RAGProcessor()
+    phases["construct_s"] = time.perf_counter() - start
+    rag.load_and_process_documents()
+    start = time.perf_counter()
+    rag.search("ст. 81 ТК РФ")
+    phases["first_exact_lookup_s"] = time.perf_counter() - start
+    start = time.perf_counter()
+    rag.search("увольнение по инициативе работодателя")
+    phases["first_bm25_search_s"] = time.perf_counter() - start
+    rag.load_embeddings()
+    start = time.perf_counter()
+    rag.search("срок исковой давности по договору займа")
+    phases["first_vector_search_s"] = time.perf_counter() - start
+    phases.update(rag.startup_timings)
+    return {key: round(value, 4) for key, value in phases.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Повторов замера импорта")
+    parser.add_argument("--top", type=int, default=15, help="Сколько тяжёлых импортов показать")
+    parser.add_argument("--skip-phases", action="store_true", help="Не загружать индекс и модель")
+    args = parser.parse_args()
+
+    report = {"imports": []}
+    for module in ("rag_processor", "app"):
+        imported = measure_import(module, args.runs)
+        top = sorted(imported.pop("heaviest").items(), key=lambda item: item[1], reverse=True)
+        imported["heaviest"] = [{"package": name, "cumulative_s": round(value, 3)}
+                                for name, value in top[:args.top]]
+        report["imports"].append(imported)
+    if not args.skip_phases:
+        report["phases"] = measure_phases()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from typing import Optional
+
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter
+
+from config import STREAM_EDIT_INTERVAL, STREAM_EMPTY_ANSWER, TELEGRAM_MAX_MESSAGE_LENGTH
+
+
+class StreamingReply:
+    """Выводит ответ LLM по мере генерации, редактируя сообщение в Telegram.
+
+    Первое сообщение отправляется сразу с первым фрагментом, дальше текст
+    дописывается правками не чаще раза в STREAM_EDIT_INTERVAL секунд.
+    Последняя правка уходит сразу и ждёт, только если Telegram ответил RetryAfter.
+    При переполнении лимита Telegram ответ продолжается новым сообщением
+    (с тем же ожиданием при RetryAfter). Пустой ответ заменяется empty_text.
+    """
+
+    def __init__(self, origin: Message, edit_interval: float = STREAM_EDIT_INTERVAL,
+                 max_length: int = TELEGRAM_MAX_MESSAGE_LENGTH, empty_text: str = STREAM_EMPTY_ANSWER):
+        self.origin = origin
+        self.edit_interval = edit_interval
+        self.max_length = max_length
+        self.empty_text = empty_text
+        self.messages = []  # Все отправленные сообщения ответа
+        self._current: Optional[Message] = None
+        self._text = ""  # Текст текущего сообщения
+        self._shown = ""  # Текст, который уже виден пользователю
+        self._next_edit = 0.0
+        self._retry_until = 0.0  # До этого момента Telegram запретил правки (RetryAfter)
+        self.send_time = 0.0  # Суммарное время вызовов Telegram API, сек
+
+    @property
+    def started(self) -> bool:
+        return bool(self.messages)
+
+    def _split_point(self, text: str) -> int:
+        """Ищет место разрыва не дальше лимита: абзац, строка, пробел"""
+        for sep in ("\n\n", "\n", " "):
+            pos = text.rfind(sep, 0, self.max_length)
+            if pos > self.max_length // 2:
+                return pos + len(sep)
+        return self.max_length
+
+    async def push(self, delta: str) -> None:
+        """Добавляет фрагмент ответа"""
+        self._text += delta
+
+        while len(self._text) > self.max_length:
+            cut = self._split_point(self._text)
+            head, self._text = self._text[:cut], self._text[cut:]
+            await self._flush(head, force=True)
+            self._current = None
+            self._shown = ""
+
+        await self._flush(self._text)
+
+    async def finish(self) -> None:
+        """Дописывает остаток ответа; если ответ пуст, отправляет empty_text"""
+        text = self._text if self._text.strip() or self.started else self.empty_text
+        await self._flush(text, force=True)
+
+    async def _flush(self, text: str, force: bool = False) -> None:
+        if not text.strip() or text == self._shown:
+            return
+
+        now = time.monotonic()
+        if not force and (now < self._retry_until or (self._current is not None and now < self._next_edit)):
+            return
+        if force and now < self._retry_until:
+            await asyncio.sleep(self._retry_until - now)
+
+        try:
+            if self._current is None:
+                await self._send(text)
+            else:
+                await self._edit(text)
+            self._shown = text
+        except RetryAfter as e:
+            self._retry_until = self._next_edit = time.monotonic() + float(e.retry_after)
+            if force:
+                await self._flush(text, force=True)
+            return
+        except BadRequest as e:
+            # Текст не изменился — не ошибка
+            if "not modified" not in str(e).lower():
+                raise
+        self._next_edit = time.monotonic() + self.edit_interval
+
+    async def _send(self, text: str) -> None:
+        start = time.perf_counter()
+        try:
+            self._current = await self.origin.reply_text(text)
+        finally:
+            self.send_time += time.perf_counter() - start
+        self.messages.append(self._current)
+
+    async def _edit(self, text: str) -> None:
+        start = time.perf_counter()
+        try:
+            await self._current.edit_text(text)
+        finally:
+            self.send_time += time.perf_counter() - start
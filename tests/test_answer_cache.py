@@ -0,0 +1,74 @@
+"""Кэш ответов: ответ, написанный с учётом истории диалога, не достаётся другому пользователю"""
+import asyncio
+
+from answer_cache import AnswerCache
+from app import AIChatBot
+from context_store import MemoryContextStore
+from metrics import Metrics
+
+QUESTION = "А какой штраф?"
+
+
+class FakeDoc:
+    id = "koap:5.27"
+    page_content = "Нарушение трудового законодательства влечёт штраф"
+    metadata = {"citation": "КоАП РФ, ст. 5.27"}
+
+
+class FakeRAG:
+    format_snippet = staticmethod(lambda doc: doc.page_content)
+
+    async def aretrieve(self, query, timings=None):
+        return [FakeDoc()], [1.0, 0.0]
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = []
+
+    async def chat(self, messages, on_attempt=None, temperature=0.6, max_tokens=3000):
+        self.calls.append(messages)
+        history = [m["content"] for m in messages[1:-1]]
+        return f"ответ с учётом: {history}"
+
+
+class FakeLog:
+    def log(self, record: dict) -> None:
+        pass
+
+
+def make_bot() -> AIChatBot:
+    bot = object.__new__(AIChatBot)
+    bot.rag = FakeRAG()
+    bot.contexts = MemoryContextStore()
+    bot.llm = FakeLLM()
+    bot.answer_cache = AnswerCache(path=None)
+    bot.metrics = Metrics()
+    bot.request_log = FakeLog()
+    return bot
+
+
+def test_users_with_different_histories_do_not_share_answers():
+    bot = make_bot()
+    bot.contexts.append(1, "user", "Меня уволили без предупреждения")
+    bot.contexts.append(2, "user", "Магазин не принимает возврат товара")
+
+    async def run():
+        return [await bot._call_deepseek(user_id, QUESTION) for user_id in (1, 2)]
+
+    first, second = asyncio.run(run())
+    assert len(bot.llm.calls) == 2
+    assert "уволили" in first and "возврат" in second
+    assert bot.answer_cache.stats["puts"] == 0
+
+
+def test_questions_without_history_use_cache():
+    bot = make_bot()
+
+    async def run():
+        return [await bot._call_deepseek(user_id, QUESTION) for user_id in (1, 2)]
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert len(bot.llm.calls) == 1
+    assert bot.answer_cache.stats["exact_hits"] == 1
@@ -0,0 +1,81 @@
+"""Общее хранилище контекстов в Redis: экземпляры бота видят реплики друг друга"""
+import json
+
+from context_store import RedisContextStore
+
+
+class FakeRedis:
+    """Хеши и списки в памяти — ровно те команды, что вызывает RedisContextStore"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttl = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update({field: str(value) for field, value in mapping.items()})
+
+    def lrange(self, key, start, end):
+        items = self.data.get(key, [])
+        return items[start:len(items) + end + 1 if end < 0 else end + 1]
+
+    def rpush(self, key, value):
+        self.data.setdefault(key, []).append(value)
+
+    def ltrim(self, key, start, end):
+        self.data[key] = self.lrange(key, start, end)
+
+    def expire(self, key, seconds):
+        self.ttl[key] = seconds
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def close(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def test_instances_share_dialog_through_redis():
+    redis = FakeRedis()
+    first, second = RedisContextStore(client=redis), RedisContextStore(client=redis)
+
+    first.append(1, "user", "Меня уволили")
+    second.append(1, "assistant", "Статья 81 ТК РФ")
+    first.set_summary(1, "Увольнение")
+
+    assert [m["content"] for m in second.history(1, 10 ** 6)] == [
+        "Краткое содержание предыдущего диалога: Увольнение", "Меня уволили", "Статья 81 ТК РФ"]
+    assert redis.ttl["yurbot:messages:1"] == first.idle_ttl
+
+    second.reset(1)
+    assert first.history(1, 10 ** 6) == []
+
+
+def test_redis_keeps_ring_buffer_and_overflow():
+    redis = FakeRedis()
+    store = RedisContextStore(client=redis, max_messages=3)
+    for n in range(5):
+        store.append(1, "user", f"q{n}")
+    assert [json.loads(item)[1] for item in redis.data["yurbot:messages:1"]] == ["q2", "q3", "q4"]
+
+    removed = store.overflow(1, 1)
+    assert removed == [("user", "q2"), ("user", "q3")]
+    assert [m["content"] for m in RedisContextStore(client=redis).history(1, 10 ** 6)] == ["q4"]
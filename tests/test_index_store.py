@@ -0,0 +1,34 @@
+"""Векторный индекс: соединения SQLite рабочих потоков закрываются вместе с индексом"""
+import asyncio
+import sqlite3
+
+import numpy as np
+import pytest
+
+from index_store import IndexStore, MemoryIndexStore
+
+DOCS = [(f"id{n}", f"текст {n}", {"article": str(n)}) for n in range(4)]
+
+
+def search_from_threads(store: IndexStore, threads: int = 4) -> list:
+    async def run():
+        return await asyncio.gather(*(asyncio.to_thread(store.get, ["id1"]) for _ in range(threads)))
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("kind", ["disk", "memory"])
+def test_close_closes_connections_of_all_threads(tmp_path, kind):
+    vectors = np.eye(4, dtype=np.float32)
+    store = (IndexStore.write(tmp_path, vectors, DOCS, {}) if kind == "disk"
+             else MemoryIndexStore(vectors, DOCS, {}))
+    store.get(["id0"])
+    assert all(docs[0].id == "id1" for docs in search_from_threads(store))
+    conns = list(store._conns)
+    assert len(conns) >= 2
+
+    store.close()
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    assert store._conns == []
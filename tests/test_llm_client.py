@@ -0,0 +1,119 @@
+"""Асинхронный клиент DeepSeek против локального мока на httpx.MockTransport"""
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from llm_client import DeepSeekClient, LLMError
+
+DELAY = 0.2
+
+
+def make_client(handler, **kwargs) -> DeepSeekClient:
+    client = DeepSeekClient(api_url="http://deepseek.test/v1/chat/completions", **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def answer(text: str) -> dict:
+    return {"choices": [{"message": {"content": text}}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4}}
+
+
+def test_concurrent_users_take_about_one_call():
+    users = 20
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(DELAY)
+        return httpx.Response(200, json=answer(json.loads(request.content)["messages"][0]["content"]))
+
+    async def run():
+        client = make_client(handler, max_concurrency=users)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(client.chat([{"role": "user", "content": f"q{n}"}])
+                                         for n in range(users)))
+        wall = time.perf_counter() - start
+        await client.close()
+        return results, wall
+
+    results, wall = asyncio.run(run())
+    assert results == [f"q{n}" for n in range(users)]
+    assert wall < DELAY * 3, f"{users} пользователей ждали {wall:.2f} с — запросы идут последовательно"
+
+
+def test_concurrency_limit_queues_requests():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(DELAY)
+        return httpx.Response(200, json=answer("ok"))
+
+    async def run():
+        client = make_client(handler, max_concurrency=2)
+        start = time.perf_counter()
+        await asyncio.gather(*(client.chat([{"role": "user", "content": "q"}]) for _ in range(4)))
+        await client.close()
+        return time.perf_counter() - start
+
+    assert asyncio.run(run()) >= DELAY * 2
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retries_wait_backoff(status):
+    arrivals = []
+    backoffs = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        arrivals.append(time.monotonic())
+        if len(arrivals) < 3:
+            return httpx.Response(status, text="busy")
+        return httpx.Response(200, json=answer("ok"))
+
+    async def run():
+        client = make_client(handler)
+
+        def backoff(attempt: int) -> float:
+            backoffs.append(attempt)
+            return 0.05 * (attempt + 1)
+
+        client._backoff = backoff
+        attempts = []
+
+        async def on_attempt(status, start_time, response, attempt, usage=None, provider=None):
+            attempts.append((status, attempt, provider))
+
+        result = await client.chat([{"role": "user", "content": "q"}], on_attempt=on_attempt)
+        await client.close()
+        return result, attempts
+
+    result, attempts = asyncio.run(run())
+    assert result == "ok"
+    assert backoffs == [0, 1]
+    assert [status for status, _, _ in attempts] == [f"ERROR_{status}", f"ERROR_{status}", "SUCCESS"]
+    assert all(provider == "deepseek" for _, _, provider in attempts)
+    assert arrivals[1] - arrivals[0] >= 0.05
+    assert arrivals[2] - arrivals[1] >= 0.10
+
+
+def test_backoff_is_full_jitter():
+    client = DeepSeekClient()
+    for attempt in range(4):
+        delays = [client._backoff(attempt) for _ in range(200)]
+        assert all(0 <= delay <= client.retry_delay * 2 ** attempt for delay in delays)
+        assert max(delays) > client.retry_delay * 2 ** attempt / 2
+
+
+def test_gives_up_after_max_retries():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(502, text="bad gateway")
+
+    async def run():
+        client = make_client(handler)
+        client._backoff = lambda attempt: 0.0
+        try:
+            await client.chat([{"role": "user", "content": "q"}])
+        finally:
+            await client.close()
+
+    with pytest.raises(LLMError, match="HTTP 502"):
+        asyncio.run(run())
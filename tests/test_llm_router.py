@@ -0,0 +1,156 @@
+"""Маршрутизатор LLM: хеджирование медленного провайдера и предохранитель"""
+import asyncio
+import json
+import time
+
+import httpx
+
+from llm_client import DeepSeekClient
+from llm_router import LLMRouter
+
+MESSAGES = [{"role": "user", "content": "q"}]
+
+
+def make_client(name: str, handler) -> DeepSeekClient:
+    client = DeepSeekClient(api_url=f"http://{name}.test/v1/chat/completions", name=name)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client._backoff = lambda attempt: 0.0
+    return client
+
+
+def answer(text: str) -> dict:
+    return {"choices": [{"message": {"content": text}}], "usage": {}}
+
+
+def test_slow_primary_triggers_hedge():
+    async def slow(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(2.0)
+        return httpx.Response(200, json=answer("primary"))
+
+    async def fast(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=answer("secondary"))
+
+    async def run():
+        router = LLMRouter([make_client("primary", slow), make_client("secondary", fast)], hedge=True)
+        router._hedge_delay = lambda provider, kind: 0.05
+        try:
+            return router, await router.chat(MESSAGES)
+        finally:
+            await router.close()
+
+    router, result = asyncio.run(run())
+    assert result == "secondary"
+    assert router.stats["hedged"] == 1
+    assert router.stats["hedge_wins"] == 1
+
+
+def test_failing_primary_trips_breaker():
+    primary_calls = []
+
+    def failing(request: httpx.Request) -> httpx.Response:
+        primary_calls.append(request)
+        return httpx.Response(503, text="overloaded")
+
+    def healthy(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=answer("secondary"))
+
+    async def run():
+        router = LLMRouter([make_client("primary", failing), make_client("secondary", healthy)], hedge=False)
+        router.providers[0].breaker.threshold = 2
+        try:
+            first = await router.chat(MESSAGES)
+            calls = len(primary_calls)
+            second = await router.chat(MESSAGES)
+            return router, first, second, calls
+        finally:
+            await router.close()
+
+    router, first, second, calls = asyncio.run(run())
+    breaker = router.providers[0].breaker
+    assert first == second == "secondary"
+    assert breaker.trips == 1
+    assert breaker.state == "open"
+    assert router.stats["fallbacks"] == 1
+    assert len(primary_calls) == calls, "открытый предохранитель пропустил запрос к основному"
+
+
+def test_stream_hedge_cancels_slow_primary():
+    cancelled = []
+
+    def sse(*deltas: str) -> bytes:
+        events = [{"choices": [{"delta": {"content": delta}}]} for delta in deltas]
+        return ("".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n").encode()
+
+    async def slow(request: httpx.Request) -> httpx.Response:
+        try:
+            await asyncio.sleep(2.0)
+        except asyncio.CancelledError:
+            cancelled.append(request.url.host)
+            raise
+        return httpx.Response(200, content=sse("primary"))
+
+    def fast(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=sse("secondary ", "answer"))
+
+    async def run():
+        router = LLMRouter([make_client("primary", slow), make_client("secondary", fast)], hedge=True)
+        router._hedge_delay = lambda provider, kind: 0.05
+        start = time.monotonic()
+        try:
+            deltas = [delta async for delta in router.stream_chat(MESSAGES)]
+        finally:
+            await router.close()
+        return router, deltas, time.monotonic() - start
+
+    router, deltas, wall = asyncio.run(run())
+    assert deltas == ["secondary ", "answer"]
+    assert router.stats["hedged"] == 1
+    assert router.stats["hedge_wins"] == 1
+    assert cancelled == ["primary.test"]
+    assert wall < 1.0
+
+
+def test_client_errors_do_not_trip_breaker():
+    def unauthorized(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(401, text="invalid api key")
+
+    def healthy(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=answer("secondary"))
+
+    async def run():
+        router = LLMRouter([make_client("primary", unauthorized), make_client("secondary", healthy)], hedge=False)
+        router.providers[0].breaker.threshold = 2
+        try:
+            return router, [await router.chat(MESSAGES) for _ in range(2)]
+        finally:
+            await router.close()
+
+    router, results = asyncio.run(run())
+    breaker = router.providers[0].breaker
+    assert results == ["secondary", "secondary"]
+    assert breaker.failures == 0
+    assert breaker.state == "closed"
+
+
+def test_timeouts_are_counted_in_latency():
+    async def hanging(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1.0)
+        return httpx.Response(200, json=answer("primary"))
+
+    def healthy(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=answer("secondary"))
+
+    async def run():
+        primary = make_client("primary", hanging)
+        primary.max_retries, primary.deadline = 1, 0.2
+        router = LLMRouter([primary, make_client("secondary", healthy)], hedge=False)
+        try:
+            return router, await router.chat(MESSAGES)
+        finally:
+            await router.close()
+
+    router, result = asyncio.run(run())
+    samples = list(router.providers[0].latency["chat"].samples)
+    assert result == "secondary"
+    assert len(samples) == 1 and samples[0] >= 0.2
+    assert router.providers[0].breaker.failures == 1
@@ -0,0 +1,49 @@
+"""Инкрементальная сборка индекса: манифест хешей и повторный разбор файлов"""
+import json
+
+import numpy as np
+
+import rag_processor
+from rag_processor import MANIFEST_FILE, RAGProcessor
+
+LAW = "### Статья 1. Общие положения\n\n1. Трудовые отношения регулируются настоящим Кодексом.\n"
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts: list) -> list:
+        return [np.random.default_rng(len(text)).random(8).tolist() for text in texts]
+
+
+def test_whitespace_edit_updates_manifest(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    law = data_dir / "Трудовой кодекс Российской Федерации.md"
+    law.write_text(LAW, encoding="utf-8")
+    monkeypatch.setattr(rag_processor, "DATA_DIR", data_dir)
+
+    split_calls = []
+    split_files = rag_processor.split_files
+
+    def counting_split(files, workers):
+        split_calls.append([rel_path for rel_path, _ in files])
+        return split_files(files, workers)
+
+    monkeypatch.setattr(rag_processor, "split_files", counting_split)
+
+    def load() -> dict:
+        rag = RAGProcessor(tmp_path / "vector_db")
+        rag._embeddings = FakeEmbeddings()
+        rag.load_and_process_documents()
+        rag.store.close()
+        with open(tmp_path / "vector_db" / MANIFEST_FILE, encoding="utf-8") as f:
+            return json.load(f)["files"]
+
+    first = load()
+    law.write_text(LAW + "\n\n", encoding="utf-8")
+    second = load()
+    third = load()
+
+    assert second[law.name]["chunks"] == first[law.name]["chunks"]
+    assert second[law.name]["hash"] != first[law.name]["hash"]
+    assert third == second
+    assert split_calls == [[law.name], [law.name], []]
@@ -0,0 +1,59 @@
+"""Очередь вопросов: остановка не должна запускать вопросы из очереди"""
+import asyncio
+
+from scheduler import RequestScheduler
+
+
+class FakeMessage:
+    def __init__(self, text: str):
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text: str) -> None:
+        self.replies.append(text)
+
+
+def test_close_does_not_start_queued_questions():
+    started = []
+
+    async def handler(user_id, message, text):
+        started.append(text)
+        await asyncio.sleep(10)
+
+    async def run():
+        scheduler = RequestScheduler(handler, max_active=1, debounce=0.0)
+        for n in range(1, 4):
+            await scheduler.submit(n, FakeMessage(f"q{n}"), f"q{n}")
+        await asyncio.sleep(0.05)
+        assert started == ["q1"] and scheduler.queue_depth == 2
+        await scheduler.close()
+        await scheduler.submit(4, FakeMessage("q4"), "q4")
+        await asyncio.sleep(0.05)
+        others = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return scheduler, others
+
+    scheduler, others = asyncio.run(run())
+    assert started == ["q1"]
+    assert others == []
+    assert scheduler.active == 0 and scheduler.queue_depth == 0
+
+
+def test_new_message_cancels_and_merges_running_question():
+    answered = []
+
+    async def handler(user_id, message, text):
+        await asyncio.sleep(0.1)
+        answered.append(text)
+
+    async def run():
+        scheduler = RequestScheduler(handler, max_active=2, debounce=0.0)
+        await scheduler.submit(1, FakeMessage("a"), "Как уволить")
+        await asyncio.sleep(0.02)
+        await scheduler.submit(1, FakeMessage("b"), "работника за прогул?")
+        await asyncio.sleep(0.3)
+        await scheduler.close()
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert answered == ["Как уволить\nработника за прогул?"]
+    assert scheduler.stats["cancelled"] == 1
@@ -0,0 +1,245 @@
+"""Потоковый ответ: SSE-заглушка DeepSeek и правки сообщения в фейковом Telegram"""
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from telegram.error import RetryAfter
+
+from llm_client import DeepSeekClient, LLMError
+from telegram_stream import StreamingReply
+
+
+def sse(*deltas: str, usage: dict = None) -> bytes:
+    events = [{"choices": [{"delta": {"content": delta}}]} for delta in deltas]
+    events.append({"choices": [], "usage": usage or {"prompt_tokens": 1, "completion_tokens": len(deltas)}})
+    lines = [f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events]
+    return ("".join(lines) + "data: [DONE]\n\n").encode()
+
+
+def make_client(handler) -> DeepSeekClient:
+    client = DeepSeekClient(api_url="http://deepseek.test/v1/chat/completions")
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client._backoff = lambda attempt: 0.0
+    return client
+
+
+async def collect(client: DeepSeekClient, attempts: list) -> list:
+    async def on_attempt(status, start_time, response, attempt, usage=None, provider=None):
+        attempts.append((status, usage))
+
+    try:
+        return [delta async for delta in client.stream_chat([{"role": "user", "content": "q"}], on_attempt)]
+    finally:
+        await client.close()
+
+
+def test_stream_yields_deltas_and_usage():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, content=sse("Статья ", "81 ", "ТК РФ"),
+                              headers={"Content-Type": "text/event-stream"})
+
+    attempts = []
+    assert asyncio.run(collect(make_client(handler), attempts)) == ["Статья ", "81 ", "ТК РФ"]
+    assert requests[0]["stream"] is True
+    assert attempts == [("SUCCESS", {"prompt_tokens": 1, "completion_tokens": 3})]
+
+
+def test_stream_retries_before_first_token():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503, text="overloaded")
+        return httpx.Response(200, content=sse("ок"))
+
+    attempts = []
+    assert asyncio.run(collect(make_client(handler), attempts)) == ["ок"]
+    assert [status for status, _ in attempts] == ["ERROR_503", "SUCCESS"]
+
+
+def test_stream_does_not_retry_after_first_token():
+    calls = []
+
+    async def broken_body():
+        event = {"choices": [{"delta": {"content": "первый "}}]}
+        yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode()
+        raise httpx.ReadError("обрыв")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, content=broken_body())
+
+    received = []
+
+    async def run():
+        client = make_client(handler)
+        try:
+            async for delta in client.stream_chat([{"role": "user", "content": "q"}]):
+                received.append(delta)
+        finally:
+            await client.close()
+
+    with pytest.raises(LLMError, match="обрыв потока"):
+        asyncio.run(run())
+    assert received == ["первый "]
+    assert len(calls) == 1
+
+
+def test_stream_stops_at_deadline_while_trickling():
+    async def trickling_body():
+        while True:
+            event = {"choices": [{"delta": {"content": "."}}]}
+            yield f"data: {json.dumps(event)}\n\n".encode()
+            await asyncio.sleep(0.05)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=trickling_body())
+
+    async def run():
+        client = make_client(handler)
+        client.deadline = 0.3
+        try:
+            async for _ in client.stream_chat([{"role": "user", "content": "q"}]):
+                pass
+        finally:
+            await client.close()
+
+    start = time.monotonic()
+    with pytest.raises(LLMError, match="Timeout"):
+        asyncio.run(run())
+    assert time.monotonic() - start < 1.0
+
+
+class FakeSent:
+    def __init__(self, log: list, text: str, fail_edits: int = 0):
+        self.log = log
+        self.text = text
+        self.fail_edits = fail_edits
+
+    async def edit_text(self, text: str) -> None:
+        if self.fail_edits:
+            self.fail_edits -= 1
+            raise RetryAfter(1)
+        self.text = text
+        self.log.append(("edit", time.monotonic(), text))
+
+
+class FakeOrigin:
+    def __init__(self, fail_edits: int = 0, fail_sends: tuple = ()):
+        self.log = []
+        self.sent = []
+        self.fail_edits = fail_edits
+        self.fail_sends = set(fail_sends)  # Номера отправок, получающих RetryAfter(1) один раз
+        self.sends = 0
+
+    async def reply_text(self, text: str) -> FakeSent:
+        self.sends += 1
+        if self.sends - 1 in self.fail_sends:
+            self.fail_sends.discard(self.sends - 1)
+            raise RetryAfter(1)
+        self.log.append(("send", time.monotonic(), text))
+        message = FakeSent(self.log, text, self.fail_edits)
+        self.sent.append(message)
+        return message
+
+
+def test_edits_are_throttled():
+    origin = FakeOrigin()
+
+    async def run():
+        reply = StreamingReply(origin, edit_interval=0.3)
+        for n in range(50):
+            await reply.push(f"слово{n} ")
+            await asyncio.sleep(0.01)
+        await reply.finish()
+
+    asyncio.run(run())
+    kinds = [kind for kind, _, _ in origin.log]
+    assert kinds[0] == "send"
+    assert kinds.count("edit") <= 3  # ~0.5 с потока при интервале 0.3 с плюс финальная правка
+    edits = [at for kind, at, _ in origin.log if kind == "edit"][:-1]
+    assert all(later - earlier >= 0.3 for earlier, later in zip(edits, edits[1:]))
+    assert origin.sent[0].text == "".join(f"слово{n} " for n in range(50))
+
+
+def test_final_edit_is_immediate():
+    origin = FakeOrigin()
+
+    async def run():
+        reply = StreamingReply(origin, edit_interval=1.5)
+        await reply.push("Ответ")  # Первое сообщение, следующая правка по интервалу — через 1.5 с
+        await reply.push(" готов")
+        start = time.monotonic()
+        await reply.finish()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 0.1, "финальная правка не должна ждать интервал"
+    assert origin.sent[0].text == "Ответ готов"
+
+
+def test_final_edit_waits_only_after_retry_after():
+    origin = FakeOrigin(fail_edits=1)
+
+    async def run():
+        reply = StreamingReply(origin, edit_interval=0.0)
+        await reply.push("начало")
+        await reply.push(" конец")  # Правка получает RetryAfter(1)
+        start = time.monotonic()
+        await reply.finish()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.9
+    assert origin.sent[0].text == "начало конец"
+
+
+def test_long_answer_is_split_into_messages():
+    origin = FakeOrigin()
+    text = "".join(f"Пункт {n}. Работник вправе расторгнуть договор.\n" for n in range(300))
+
+    async def run():
+        reply = StreamingReply(origin, edit_interval=0.0)
+        for start in range(0, len(text), 100):
+            await reply.push(text[start:start + 100])
+        await reply.finish()
+        return reply
+
+    reply = asyncio.run(run())
+    assert len(reply.messages) > 1
+    assert all(len(message.text) <= 4096 for message in origin.sent)
+    assert "".join(message.text for message in origin.sent) == text
+    assert all(message.text.endswith("\n") for message in origin.sent[:-1])
+
+
+def test_new_message_waits_after_retry_after():
+    origin = FakeOrigin(fail_sends=(1,))
+    text = "".join(f"Пункт {n}. Работник вправе расторгнуть договор.\n" for n in range(10))
+
+    async def run():
+        reply = StreamingReply(origin, edit_interval=0.0, max_length=200)
+        start = time.monotonic()
+        for pos in range(0, len(text), 50):
+            await reply.push(text[pos:pos + 50])
+        await reply.finish()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.9
+    assert "".join(message.text for message in origin.sent) == text
+
+
+def test_empty_answer_sends_fallback():
+    origin = FakeOrigin()
+
+    async def run():
+        reply = StreamingReply(origin)
+        await reply.push("")
+        await reply.finish()
+        return reply
+
+    reply = asyncio.run(run())
+    assert [message.text for message in origin.sent] == [reply.empty_text]